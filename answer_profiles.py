@@ -0,0 +1,121 @@
+# answer_profiles.py
+import json
+import os
+import re
+from config import ANSWERS_DIR
+
+# Saved profiles are files in ANSWERS_DIR named after the profile
+PROFILE_EXTENSIONS = (".json", ".yaml", ".yml")
+PROFILE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]*$')
+
+def _parse(text, path):
+    """Parse an answers file as YAML (by its extension) or JSON."""
+    if path.lower().endswith((".yaml", ".yml")):
+        # Imported here so commands that only read JSON never load PyYAML
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"{path}: reading YAML needs PyYAML (pip install pyyaml); or write the answers as JSON")
+        try:
+            return yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"{path}: invalid YAML ({e})")
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path}: invalid JSON ({e})")
+
+def normalize_answers(data, source="answers"):
+    """
+    Check a parsed answers profile and return it as a {key: answer text} dictionary.
+
+    The profile is a mapping of question keys or topics (e.g. target_platform,
+    team_size, tech_stack) to answers, optionally wrapped in an "answers" object
+    as in batch files. Numbers and booleans become text, lists are joined with
+    commas, and empty answers are dropped. Raises ValueError for anything else.
+    """
+    if isinstance(data, dict) and set(data) == {"answers"}:
+        data = data["answers"]
+    if not isinstance(data, dict):
+        raise ValueError(f"{source}: expected an object mapping question keys to answers")
+    answers = {}
+    for key, value in data.items():
+        if isinstance(value, (list, tuple)):
+            if any(isinstance(item, (dict, list, tuple)) for item in value):
+                raise ValueError(f"{source}: the list answering {key!r} must only hold text or numbers")
+            value = ", ".join(str(item) for item in value if item is not None)
+        elif isinstance(value, dict):
+            raise ValueError(f"{source}: the answer to {key!r} must be text, a number or a list, not an object")
+        elif value is not None:
+            value = str(value)
+        if value and value.strip():
+            answers[str(key).strip()] = value.strip()
+    if not answers:
+        raise ValueError(f"{source}: no answers found")
+    return answers
+
+def load_answers_file(path):
+    """Load and check an answers profile from a JSON or YAML file."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    return normalize_answers(_parse(text, path), path)
+
+def profile_path(name, answers_dir=None):
+    """Return the file of a saved answers profile, or None if there is no such profile."""
+    answers_dir = answers_dir or ANSWERS_DIR
+    if not PROFILE_NAME_PATTERN.match(name):
+        return None
+    for extension in PROFILE_EXTENSIONS:
+        path = os.path.join(answers_dir, name + extension)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def load_answers(reference, answers_dir=None):
+    """
+    Load answers from a JSON/YAML file path or, failing that, a saved profile by name.
+
+    Raises ValueError if the reference is neither, or the profile is malformed.
+    """
+    if os.path.isfile(reference):
+        return load_answers_file(reference)
+    path = profile_path(reference, answers_dir)
+    if path is None:
+        raise ValueError(f"No answers file or saved profile named {reference!r} (saved profiles are in {answers_dir or ANSWERS_DIR})")
+    return load_answers_file(path)
+
+def save_profile(name, answers, answers_dir=None):
+    """Save answers as a named profile for later --answers runs; returns the profile's path."""
+    answers_dir = answers_dir or ANSWERS_DIR
+    if not PROFILE_NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid profile name {name!r}: use letters, digits, '.', '-' and '_'")
+    os.makedirs(answers_dir, exist_ok=True)
+    # A profile saved again replaces the old one, whatever format that was in
+    for extension in PROFILE_EXTENSIONS:
+        old_path = os.path.join(answers_dir, name + extension)
+        if os.path.isfile(old_path):
+            os.remove(old_path)
+    path = os.path.join(answers_dir, name + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(answers, f, indent=2, ensure_ascii=False)
+    return path
+
+def list_profiles(answers_dir=None):
+    """Return every saved profile as {"name", "path", "answers"}, sorted by name; malformed ones have answers None."""
+    answers_dir = answers_dir or ANSWERS_DIR
+    try:
+        names = os.listdir(answers_dir)
+    except OSError:
+        return []
+    profiles = []
+    for file_name in sorted(names):
+        name, extension = os.path.splitext(file_name)
+        if extension.lower() not in PROFILE_EXTENSIONS:
+            continue
+        path = os.path.join(answers_dir, file_name)
+        try:
+            answers = load_answers_file(path)
+        except (OSError, ValueError):
+            answers = None
+        profiles.append({"name": name, "path": path, "answers": answers})
+    return profiles
@@ -1,12 +1,668 @@
 # api_client.py
-import anthropic
-from config import ANTHROPIC_API_KEY, CLAUDE_MODEL, MAX_TOKENS
+import asyncio
+import concurrent.futures
+import threading
+import time
+import telemetry
+from telemetry import StageMetrics
+from connection_pool import get_sync_client, get_async_client
+from rate_limiter import scheduler
+from config import PROFILES, PROFILE, PROMPT_CACHING, PROMPT_TOKEN_BUDGET, PROMPT_OVER_BUDGET, REFLECTION_MODE, REFLECTION_MODES, GENERATION_MODE, GENERATION_MODES
+from roadmap_patch import PatchError, parse_sections, format_outline, parse_patch, apply_patch
+from parallel_roadmap import PHASES, PhaseStitcher, split_skeleton
+from question_stream import QUESTIONS_TOOL, MIN_QUESTIONS, DEFAULT_QUESTIONS, QuestionStreamParser
+from single_flight import NEW_ATTEMPT, flights, async_flights, flight_key
+from prompt_assembly import compact, join, fit_to_budget
 
-class ClaudeClient:
-    def __init__(self):
-        self.client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+# Tools sent with every request that shares the cached idea-and-roadmap context. The API
+# caches the prefix in the order tools, system, messages, so the question calls and the
+# reflection calls only share a cache entry when they send the same tools; the calls
+# that don't use them set tool_choice to none
+CONTEXT_TOOLS = [QUESTIONS_TOOL]
+
+class BaseClaudeClient:
+    """
+    Prompt construction, response parsing and caching shared by the sync and async clients.
+    """
+    def __init__(self, cache=None, ideas=None, profile=None):
+        """
+        Args:
+            cache: Optional ResponseCache used to replay identical requests without calling the API
+            ideas: Optional IdeaIndex; the initial roadmap of a stored similar idea is
+                reused instead of generating a new one, and new roadmaps are added to it
+            profile: Name of the PROFILES entry setting each stage's model, max_tokens
+                and thinking budget; defaults to PROFILE
+        """
+        self.profile = (profile or PROFILE).lower()
+        if self.profile not in PROFILES:
+            raise ValueError(f"Unknown profile '{self.profile}'; choose from {', '.join(PROFILES)}")
+        self.cache = cache
+        self.ideas = ideas
+        self.last_call_cached = False
+        # IdeaMatch whose roadmap the last generate_initial_roadmap call reused, if any
+        self.last_reused_idea = None
+        # Metrics of the last call, and token usage summed over all calls
+        self.last_metrics = None
+        self.usage_totals = {}
+        # Outcome of the last patch-mode reflection: operations applied, or why it fell back
+        self.last_patch_operations = None
+        self.last_patch_fallback = None
+        # Problem found in the last question response that had to be repaired, if any
+        self.last_questions_repair = None
+        # Estimated input tokens prompt compaction saved, by stage, and the
+        # over-budget prompts not reported yet (see pop_budget_warnings)
+        self.prompt_savings = {}
+        self.budget_warnings = []
+    
+    def _build_prompt(self, idea_description, user_answers=None):
+        """
+        Build a prompt for Claude to generate a coding roadmap.
+        
+        With user_answers, the roadmap is customized to them in the same pass (see
+        _build_known_answers).
+        """
+        prompt = compact("""
+        Please generate a very detailed and comprehensive coding roadmap for the following app idea:
+        
+        {idea_description}
+                
+        DO NOT include actual code or scripts in the roadmap. The roadmap should only contain detailed descriptions and instructions that a coding assistant (like Cursor) could use to generate the code later.
+        
+        The roadmap should:
+        1. Break down the development process into clear phases
+        2. Include natural language guidance between technical steps
+        3. Format the output in markdown
+        4. Structure the content so an AI coding assistant can follow it step-by-step
+        5. Include guidance for setting up the environment, implementing core features, and testing
+        6. Be extremely detailed - provide enough information that an AI coding assistant could implement the entire project without additional clarification from the user
+        7. For each component, include specific implementation details and considerations
+        8. Provide rationale for technical decisions and architecture choices
+        
+        For each major feature or component:
+        - Break it down into granular sub-tasks
+        - Describe the data structures or models needed
+        - Explain interfaces and connections to other components
+        - Detail configuration requirements
+        - Include specific testing steps to verify functionality
+        
+        IMPORTANT: Testing should be integrated throughout the roadmap, not just at the end. For each component, include detailed testing instructions that explain:
+        - What to test (specific functionalities, edge cases, etc.)
+        - How to test it (test approaches, tools, and methods)
+        - What expected outcomes should be
+        - How to handle potential errors or edge cases
+        - How to verify that the component integrates properly with the rest of the system
+        
+        Please write the roadmap with natural conversational phrases between steps, as if you're guiding someone through the process. For example: "Now that we have our database set up, let's implement the user authentication..." or "Let's start by installing the necessary packages..."
+        
+        Again, focus on DESCRIBING what code needs to be written rather than writing the actual code scripts.
+        
+        As a guide, ensure your roadmap is extremely detailed and between 6000-8000 tokens in length. This level of detail is necessary for an AI coding assistant to implement the project without further clarification.
+        """, idea_description=idea_description)
+        return join(prompt, self._build_known_answers(user_answers)) if user_answers else prompt
+    
+    def _build_known_answers(self, user_answers):
+        """
+        Build the block that customizes a roadmap to answers known before generation.
+        
+        It takes the place of the question and reflection stages, so it asks for the
+        same customization the reflection prompt does, in the first and only pass.
+        """
+        formatted_answers = "\n".join(f"- {key}: {value}" for key, value in user_answers.items())
+        return compact("""
+        The user has already provided the following information about their project requirements:
+        
+        {formatted_answers}
+        
+        Customize the roadmap to these requirements from the start: choose technologies, platforms and approaches that fit them, adjust the scope and timeline to their team size and experience, and prioritize their must-have features. Where a requirement drives a technical decision, say so. This is the final roadmap; it will not be revised afterwards, so make it complete.
+        """, formatted_answers=formatted_answers)
+    
+    def _build_skeleton_prompt(self, idea_description, user_answers=None):
+        """
+        Build a prompt for the skeleton of a roadmap: title, phases and sub-task headings only.
+        """
+        phase_list = "\n".join(f"## Phase {number}: {name}" for number, name in enumerate(PHASES, 1))
+        
+        prompt = compact("""
+        Please plan a very detailed and comprehensive coding roadmap for the following app idea:
+        
+        {idea_description}
+        
+        Do not write the roadmap yet. Create the skeleton of the roadmap in markdown:
+        
+        - An H1 (# ) project title followed by a 2-3 sentence introduction
+        - Exactly these phases as H2 headings, in this order and with this wording:
+        
+        {phase_list}
+        
+        - Under each phase, 3-6 H3 sub-task headings numbered by phase, like "### 4.2 User Authentication", each followed by a single line summarizing what it covers and the key technical decisions it makes
+        
+        Choose the sub-tasks so that, together, they break down the development process of this specific project into granular steps covering requirements, architecture, environment setup, implementation of every core feature, testing, refactoring and deployment. Each phase will later be written in full detail by a separate writer who sees this skeleton, so make the technology choices and the division of work explicit and consistent.
+        
+        Return ONLY the skeleton, with no detailed steps, no code and no closing remarks.
+        """, idea_description=idea_description, phase_list=phase_list)
+        return join(prompt, self._build_known_answers(user_answers)) if user_answers else prompt
+    
+    def _build_skeleton_context(self, skeleton, idea_description, user_answers=None):
+        """
+        Build the idea-and-skeleton block shared by every phase request of a parallel generation.
+        """
+        context = compact("""
+        I am writing a very detailed and comprehensive coding roadmap for the following app idea:
+        
+        {idea_description}
+        
+        Here is the skeleton of the complete roadmap. Each phase is being written separately:
+        
+        {skeleton}
+        
+        The roadmap must follow these guidelines:
+        - DO NOT include actual code or scripts. Describe what code needs to be written so a coding assistant (like Cursor) could generate it later
+        - Be extremely detailed, with enough information that an AI coding assistant could implement the entire project without additional clarification from the user
+        - For each component, describe the data structures or models needed, interfaces to other components, configuration requirements and the rationale for technical decisions
+        - Integrate testing throughout: what to test, how to test it, expected outcomes, edge cases and integration checks
+        - Write natural conversational phrases between steps, as if guiding someone through the process
+        - Specify clear completion criteria for each phase and step
+        - Have the agent consistently keep track of development progress by maintaining a project progress log that can be referred to throughout development
+        - Use open source solutions whenever possible and prioritize a functional MVP before enhancements
+        """, idea_description=idea_description, skeleton=skeleton)
+        return join(context, self._build_known_answers(user_answers)) if user_answers else context
+    
+    def _build_phase_prompt(self, phase_outline, phase_heading, phase_count):
+        """
+        Build the instructions for writing one phase of a skeleton in full.
+        """
+        return compact("""
+        Write the complete, detailed section for this phase only:
+        
+        {phase_outline}
+        
+        Begin with exactly this heading line: {phase_heading}
+        
+        Then write every H3 sub-task from the skeleton, in the same order and with the same headings, each with detailed numbered steps in markdown. Number the steps from 1; numbering is made sequential across the roadmap when the phases are combined. Stay consistent with the technology choices in the skeleton, and refer to other phases by name where they connect, but do not write their content. Do not add a title, introduction or closing remarks for the roadmap.
+        
+        As a guide, this phase should be about {phase_tokens} tokens long. DO NOT INCLUDE ACTUAL CODE.
+        """, phase_outline=phase_outline, phase_heading=phase_heading, phase_tokens=8000 // max(1, phase_count))
     
-    def generate_initial_roadmap(self, idea_description):
+    def _build_roadmap_context(self, roadmap, idea_description):
+        """
+        Build the idea-and-roadmap block that leads both the question and reflection prompts.
+        
+        Both stages send exactly this text first so it can be served from the prompt cache.
+        """
+        return compact("""
+        I have generated an initial coding roadmap for this app idea:
+        
+        {idea_description}
+        
+        Here is the initial roadmap:
+        
+        {roadmap}
+        """, idea_description=idea_description, roadmap=roadmap)
+    
+    def _split_context_prompt(self, context, instructions):
+        """
+        Arrange a shared context block and stage-specific instructions into a request.
+        
+        With prompt caching enabled the context becomes a system block marked with a
+        cache-control breakpoint, so it is cached across the question and reflection
+        calls (system blocks stay cached even though only reflection uses thinking).
+        Otherwise both parts are sent as a single user message, as before.
+        
+        Returns a (system, prompt) tuple; system is None when prompt caching is disabled.
+        """
+        if not PROMPT_CACHING:
+            return None, join(context, instructions)
+        
+        system = [{
+            "type": "text",
+            "text": context,
+            "cache_control": {"type": "ephemeral"}
+        }]
+        return system, instructions
+    
+    def _context_tools(self, system):
+        """Return the tools to send with a request whose shared context is the cached system block, if any."""
+        return CONTEXT_TOOLS if system else None
+    
+    def _build_reflection_prompt(self, user_answers):
+        """
+        Build the stage-specific instructions that customize the roadmap with the user's answers.
+        """
+        # Format user answers for inclusion in the prompt
+        formatted_answers = "\n".join([f"- {key}: {value}" for key, value in user_answers.items()])
+        
+        return compact("""
+        The user has provided the following additional information about their project requirements:
+        
+        {formatted_answers}
+        
+        Now, I need you to customize and improve this roadmap based on both your analysis and the user's specific requirements. Please:
+        
+        1. Incorporate the user's specific requirements into the roadmap
+        2. Adjust timelines, technologies, and approaches based on their team size and experience
+        3. Prioritize features based on their must-have requirements
+        4. Adapt the technical approach for their target platforms
+        5. Identify any errors, inconsistencies, or logical flaws in the approach
+        6. Find sections that are unclear or need more detailed explanation
+        7. Add any missing steps or considerations that would make the roadmap more comprehensive
+        8. Ensure each testing step is thorough and covers all edge cases
+        9. Make sure the overall structure flows naturally from one step to the next
+        10. Add implementation details where explanations could be more specific
+        11. Include necessary context and rationale for technical decisions
+        
+        VERY IMPORTANT: The final roadmap MUST be extremely detailed and comprehensive but no more than 10000 tokens. Make it extremely detailed and comprehensive, with enough specificity that an AI coding assistant could implement the entire project without additional clarification from the user. DO NOT INCLUDE ACTUAL CODE.
+        
+        Have the agent consistently keep track of development progress by maintaining a project progress log that will be referred to throughout development
+
+        Take your time to think deeply about each aspect of the roadmap. This customization step is critical to creating the highest quality guidance possible for their specific needs.
+        
+        Please provide the complete, revised roadmap with all improvements incorporated. Do not simply list the changes - provide the fully enhanced and customized roadmap.
+        
+        REMEMBER TO USE NATURAL LANGUAGE GUIDANCE AN NO ACTUAL CODE OR SCRIPTS.
+        """, formatted_answers=formatted_answers)
+    
+    def _build_critique_prompt(self):
+        """
+        Build the instructions for one self-critique pass over a roadmap, used when there are no user answers.
+        """
+        return compact("""
+        Critically review this roadmap as an experienced engineer who will have to follow it, then improve it. Please:
+        
+        1. Identify any errors, inconsistencies, or logical flaws in the approach
+        2. Find sections that are unclear or need more detailed explanation
+        3. Add any missing steps or considerations that would make the roadmap more comprehensive
+        4. Ensure each testing step is thorough and covers all edge cases
+        5. Make sure the overall structure flows naturally from one step to the next
+        6. Add implementation details where explanations could be more specific
+        
+        Only change what your review finds lacking: keep the headings, order and wording of sections that are already good exactly as they are. If the roadmap needs no meaningful improvement, return it unchanged.
+        
+        VERY IMPORTANT: The final roadmap MUST be extremely detailed and comprehensive but no more than 10000 tokens. DO NOT INCLUDE ACTUAL CODE.
+        
+        Please provide the complete, revised roadmap with all improvements incorporated. Do not simply list the changes or your review - provide the fully improved roadmap.
+        
+        REMEMBER TO USE NATURAL LANGUAGE GUIDANCE AN NO ACTUAL CODE OR SCRIPTS.
+        """)
+    
+    def _build_patch_reflection_prompt(self, user_answers, sections):
+        """
+        Build instructions that ask for section-level edits to the roadmap instead of a full rewrite.
+        """
+        formatted_answers = "\n".join([f"- {key}: {value}" for key, value in user_answers.items()])
+        
+        return compact("""
+        The user has provided the following additional information about their project requirements:
+        
+        {formatted_answers}
+        
+        Customize and improve the roadmap above based on both your analysis and the user's specific requirements: incorporate their requirements, adjust timelines, technologies and approaches to their team and platforms, fix errors or unclear explanations, and add missing steps or considerations. Keep the roadmap extremely detailed, no more than 10000 tokens in total, and DO NOT INCLUDE ACTUAL CODE.
+        
+        Do NOT rewrite the whole roadmap. Only change the sections that need it. The roadmap's sections are:
+        
+        {outline}
+        
+        Return ONLY a JSON object in the following format WITHOUT any explanations or additional text:
+        {{"operations": [
+            {{"op": "replace", "section": "S3", "content": "## Heading\\n\\nComplete new markdown for the section"}},
+            {{"op": "insert_after", "section": "S5", "content": "### New Heading\\n\\nMarkdown for a new section"}},
+            {{"op": "delete", "section": "S7"}}
+        ]}}
+        
+        Rules:
+        - "section" must be one of the ids listed above
+        - "replace" content is the complete new text of that section, starting with its heading line
+        - "insert_after" adds a new section right after the given one; start its content with a heading
+        - Each section may be replaced or deleted at most once
+        - If inserting or deleting a phase or step changes the numbering of later ones, replace those sections too so the numbering stays consecutive
+        - Sections you don't mention are kept exactly as they are
+        
+        REMEMBER TO USE NATURAL LANGUAGE GUIDANCE AN NO ACTUAL CODE OR SCRIPTS.
+        """, formatted_answers=formatted_answers, outline=format_outline(sections))
+    
+    def _prepare_patch_reflection(self, initial_roadmap, idea_description, user_answers):
+        """Return (sections, system, prompt) for a patch-mode reflection request."""
+        sections = parse_sections(initial_roadmap)
+        system, prompt = self._split_context_prompt(
+            self._build_roadmap_context(initial_roadmap, idea_description),
+            self._build_patch_reflection_prompt(user_answers, sections)
+        )
+        return sections, system, prompt
+    
+    def _apply_reflection_patch(self, sections, response_text):
+        """
+        Apply the model's section patch; returns the patched roadmap, or None if it can't be applied.
+        
+        The reason for a failure is kept in last_patch_fallback.
+        """
+        try:
+            operations = parse_patch(response_text)
+            patched = apply_patch(sections, operations)
+        except PatchError as e:
+            self.last_patch_fallback = str(e)
+            return None
+        self.last_patch_operations = len(operations)
+        return patched
+    
+    def _build_questions_prompt(self):
+        """
+        Build the stage-specific instructions that ask for roadmap-specific customization questions.
+        """
+        return compact("""
+        Based on this specific roadmap, generate 5-10 questions that would help clarify and customize the roadmap for this particular project. 
+        
+        Analyze the roadmap carefully and identify areas where additional user input would significantly improve the roadmap's specificity and relevance. Focus on:
+        - Technical decisions that are unclear or could have multiple valid approaches
+        - Features that might need prioritization or clarification
+        - Resource or timeline considerations specific to this project
+        - Domain-specific questions that would help tailor the roadmap better
+        - Design or architecture choices that would benefit from user preferences
+        
+        Each question should be directly related to specific content in the roadmap, not generic questions that could apply to any project.
+        
+        Call the {tool_name} tool with your questions, without any explanations or additional text. Give each question a brief slug-like key related to its content. Put the most important question first: the user starts answering while the later questions are still being written.
+        """, tool_name=QUESTIONS_TOOL["name"])
+    
+    def _build_questions_repair_prompt(self, questions_prompt, problem, response_text, questions):
+        """
+        Build a follow-up request that fixes a malformed or incomplete question response.
+        
+        The model gets back its own output and what was wrong with it. Questions that
+        were already parsed (and may already be in front of the user) are listed so
+        only the missing ones are written.
+        
+        Args:
+            questions_prompt: The instructions of the original question request
+            problem: Description of what was wrong, from QuestionStreamParser.problem()
+            response_text: The malformed response
+            questions: Dictionary of the questions already parsed from it
+        """
+        kept = "\n".join(f"- {key}: {question}" for key, question in questions.items()) or "(none)"
+        return compact("""
+        {questions_prompt}
+        
+        You already answered this request, but the answer could not be used: {problem}. This is what you returned:
+        
+        <previous_answer>
+        {response_text}
+        </previous_answer>
+        
+        These questions were read correctly and are already being asked, so keep them and do not repeat them:
+        {kept}
+        
+        Call the {tool_name} tool again with only the additional questions needed to reach {min_questions}-10 questions in total, as valid and complete JSON.
+        """, questions_prompt=questions_prompt, problem=problem, response_text=response_text, kept=kept,
+           tool_name=QUESTIONS_TOOL["name"], min_questions=MIN_QUESTIONS)
+    
+    def _stage_settings(self, stage):
+        """
+        Return the profile's {"model", "max_tokens", "thinking_budget"} settings for a stage.
+        
+        The skeleton and phase calls of parallel generation count as "initial",
+        patch-mode reflection and refinement passes as "reflection" and question
+        repairs as "questions".
+        """
+        settings = PROFILES[self.profile]
+        for name in settings:
+            # Stage variants such as reflection_patch and questions_repair share their stage's settings
+            if stage and stage.startswith(name):
+                return settings[name]
+        return settings["initial"]
+    
+    @staticmethod
+    def _choose_mode(mode, default, modes, setting):
+        """Return mode, or default when it is None; raises ValueError if it isn't one of modes."""
+        mode = mode or default
+        if mode not in modes:
+            raise ValueError(f"unknown {setting} {mode!r}; choose from {', '.join(modes)}")
+        return mode
+    
+    def _thinking_budget(self, stage):
+        return self._stage_settings(stage)["thinking_budget"]
+    
+    def _build_request(self, prompt, thinking_budget=None, system=None, stage=None, tools=None):
+        """
+        Build the keyword arguments for a streaming messages.create call.
+        
+        Args:
+            prompt: The fully built prompt
+            thinking_budget: Extended thinking budget in tokens, or None to disable thinking
+            system: Optional list of system content blocks sent ahead of the prompt
+            stage: Pipeline stage whose profile settings pick the model and max_tokens
+            tools: Optional tool definitions; the model is asked to call the first one
+                in the question stages, and not to call any in the others
+        """
+        settings = self._stage_settings(stage)
+        request = {
+            "model": settings["model"],
+            "max_tokens": settings["max_tokens"],
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "stream": True
+        }
+        if system:
+            request["system"] = system
+        if thinking_budget:
+            request["thinking"] = {
+                "type": "enabled",
+                "budget_tokens": thinking_budget
+            }
+        if tools:
+            request["tools"] = tools
+            if stage and not stage.startswith("questions"):
+                # The tools only keep the cached prefix shared with the question calls (see CONTEXT_TOOLS)
+                request["tool_choice"] = {"type": "none"}
+            else:
+                # A specific tool can't be forced together with extended thinking; the prompt asks for it instead
+                request["tool_choice"] = {"type": "auto"} if thinking_budget else {"type": "tool", "name": tools[0]["name"]}
+        return request
+    
+    def _next_request(self, prompt, thinking_budget, system, received, stage=None, tools=None):
+        """
+        Build the request for the next attempt of a streamed call.
+        
+        The first attempt, and any retry before text arrived, sends the original
+        request. Once text has been received, a retry continues the stream instead:
+        the received text goes back as a prefilled assistant turn so the model picks
+        up where it stopped. Prefill can't be combined with extended thinking, so the
+        continuation runs without it, and the API rejects a prefill that ends in
+        whitespace, so that is stripped and later skipped if the model repeats it.
+        A tool call can't be prefilled either, so the continuation of a tool request
+        is asked for as plain text, picking up the tool input's JSON where it stopped;
+        the tools are still sent, with tool_choice none, to keep the cached prefix.
+        
+        Returns (request, whitespace_to_skip).
+        """
+        if not received:
+            return self._build_request(prompt, thinking_budget, system, stage, tools), 0
+        
+        partial_text = "".join(received)
+        prefill = partial_text.rstrip()
+        request = self._build_request(prompt, None, system, stage, tools)
+        if tools:
+            request["tool_choice"] = {"type": "none"}
+        request["messages"].append({"role": "assistant", "content": prefill})
+        return request, len(partial_text) - len(prefill)
+    
+    @staticmethod
+    def _skip_whitespace(delta, skip):
+        """Drop up to skip leading whitespace characters from delta; returns (delta, skip left)."""
+        count = 0
+        while count < len(delta) and count < skip and delta[count].isspace():
+            count += 1
+        # Stop skipping as soon as the continuation produces anything else
+        return delta[count:], (skip - count if count == len(delta) else 0)
+    
+    def _cache_lookup(self, prompt, thinking_budget, system=None, stage=None, tools=None):
+        """
+        Look the request up in the response cache.
+        
+        Returns a (cache_key, cached_text) tuple; both are None when caching is disabled
+        and cached_text is None on a miss.
+        """
+        self.last_call_cached = False
+        if self.cache is None:
+            return None, None
+        
+        if system:
+            prompt = {"system": system, "prompt": prompt}
+        if tools:
+            prompt = {"tools": tools, "prompt": prompt}
+        settings = self._stage_settings(stage)
+        cache_key = self.cache.make_key(settings["model"], settings["max_tokens"], thinking_budget, prompt)
+        cached_text = self.cache.get(cache_key)
+        if cached_text is not None:
+            self.last_call_cached = True
+        return cache_key, cached_text
+    
+    def _cache_store(self, cache_key, text):
+        if cache_key is not None:
+            self.cache.put(cache_key, text)
+    
+    def _find_similar_idea(self, idea_description):
+        """Look up a stored idea similar enough to reuse its roadmap; None without an IdeaIndex."""
+        self.last_reused_idea = None
+        if self.ideas is None:
+            return None
+        return self.ideas.find(idea_description, model=self._stage_settings("initial")["model"], profile=self.profile)
+    
+    def _remember_idea(self, idea_description, roadmap):
+        """Add a freshly generated initial roadmap to the IdeaIndex."""
+        if self.ideas is not None and roadmap.strip():
+            self.ideas.add(idea_description, roadmap, model=self._stage_settings("initial")["model"], profile=self.profile)
+    
+    def _start_metrics(self, stage, thinking_budget):
+        """
+        Begin collecting StageMetrics for a call.
+        
+        Returns (metrics, token); the token restores the previous current stage when
+        passed to _finish_metrics.
+        """
+        settings = self._stage_settings(stage)
+        metrics = StageMetrics(stage, settings["model"], settings["max_tokens"], thinking_budget, self.profile)
+        return metrics, telemetry.current_stage.set(metrics)
+    
+    def _finish_metrics(self, metrics, token):
+        """Close out a call's metrics, add its usage to the totals and emit it to the hooks."""
+        metrics.finish()
+        try:
+            telemetry.current_stage.reset(token)
+        except ValueError:
+            # The stream was finalized from a different context; nothing to restore
+            pass
+        
+        # A call that shared its upstream request leaves the usage to the call reporting it
+        if not metrics.coalesced:
+            for field in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+                self.usage_totals[field] = self.usage_totals.get(field, 0) + getattr(metrics, field)
+        self.last_metrics = metrics
+        telemetry.emit(metrics)
+    
+    def merge_usage(self, other):
+        """Add another client's usage totals to this client's, e.g. for a side request."""
+        for field, value in other.usage_totals.items():
+            self.usage_totals[field] = self.usage_totals.get(field, 0) + value
+        for stage, saved in other.prompt_savings.items():
+            self.prompt_savings[stage] = self.prompt_savings.get(stage, 0) + saved
+    
+    def _fit_budget(self, metrics, prompt, system):
+        """
+        Size up a prompt before it is sent; returns (prompt, system) as they are to be sent.
+        
+        The estimated input tokens and what compaction saved go into the call's
+        metrics. A prompt over PROMPT_TOKEN_BUDGET is trimmed to fit when
+        PROMPT_OVER_BUDGET is "trim"; either way it is added to budget_warnings.
+        """
+        saved = getattr(prompt, "saved_tokens", 0) + sum(getattr(block["text"], "saved_tokens", 0) for block in system or [])
+        prompt, system, estimate, trimmed = fit_to_budget(prompt, system, PROMPT_TOKEN_BUDGET, PROMPT_OVER_BUDGET)
+        metrics.prompt_tokens_estimate = estimate - trimmed
+        metrics.prompt_tokens_saved = saved
+        metrics.prompt_tokens_trimmed = trimmed
+        # Parallel generation's phase_1, phase_2, ... add up under "phase"
+        stage = (metrics.stage or "initial").rstrip("0123456789").rstrip("_")
+        self.prompt_savings[stage] = self.prompt_savings.get(stage, 0) + saved
+        if PROMPT_TOKEN_BUDGET and estimate > PROMPT_TOKEN_BUDGET:
+            if trimmed:
+                self.budget_warnings.append(f"{stage} prompt was ~{estimate:,} input tokens, over the {PROMPT_TOKEN_BUDGET:,} token budget; trimmed ~{trimmed:,} from the middle")
+            else:
+                self.budget_warnings.append(f"{stage} prompt is ~{estimate:,} input tokens, over the {PROMPT_TOKEN_BUDGET:,} token budget; sent as is")
+        return prompt, system
+    
+    def pop_budget_warnings(self):
+        """Return the over-budget prompt warnings not reported yet, and forget them."""
+        warnings, self.budget_warnings = self.budget_warnings, []
+        return warnings
+    
+    def prompt_savings_message(self):
+        """Human-readable summary of the input tokens prompt compaction saved per stage, or None."""
+        total = sum(self.prompt_savings.values())
+        if not total:
+            return None
+        stages = ", ".join(f"{stage} {saved:,}" for stage, saved in self.prompt_savings.items() if saved)
+        return f"Prompt compaction: ~{total:,} input tokens saved ({stages})"
+    
+    def prompt_cache_message(self):
+        """Human-readable summary of prompt cache activity, or None if nothing was cached."""
+        read = self.usage_totals.get("cache_read_input_tokens", 0)
+        written = self.usage_totals.get("cache_creation_input_tokens", 0)
+        if not read and not written:
+            return None
+        return f"Prompt cache: {read} input tokens read, {written} written"
+    
+    @staticmethod
+    def _observe_usage(usage, chunk):
+        """Track an upstream stream's token usage without reporting its deltas to progress listeners."""
+        if getattr(chunk, 'type', None) != "content_block_delta":
+            usage.observe(chunk)
+    
+    def _follow(self, metrics, item):
+        """Record one published flight item in a caller's metrics; returns the text delta it carries, if any."""
+        if item is NEW_ATTEMPT:
+            metrics.new_attempt()
+            return None
+        chunk, delta = item
+        metrics.observe(chunk)
+        return delta
+    
+    @staticmethod
+    def _delta_text(chunk):
+        """Return the text (or tool input JSON) carried by a stream event, or None for other events."""
+        if hasattr(chunk, 'type') and chunk.type == "content_block_delta":
+            if hasattr(chunk.delta, 'text'):
+                return chunk.delta.text
+            if hasattr(chunk.delta, 'partial_json'):
+                return chunk.delta.partial_json
+        return None
+
+class ClaudeClient(BaseClaudeClient):
+    def __init__(self, cache=None, anthropic_client=None, ideas=None, profile=None):
+        """
+        Args:
+            cache: Optional ResponseCache used to replay identical requests without calling the API
+            anthropic_client: Optional anthropic.Anthropic instance; defaults to the shared,
+                process-wide client so every stage reuses the same connection pool
+            ideas: Optional IdeaIndex of previously generated ideas to reuse roadmaps from
+            profile: Name of the model profile to use; defaults to PROFILE
+        """
+        super().__init__(cache, ideas, profile)
+        self.client = anthropic_client or get_sync_client()
+    
+    def reuse_similar_roadmap(self, idea_description, on_text=None):
+        """
+        Return the initial roadmap of a stored idea similar to this one, or None.
+        
+        The match is offered through the IdeaIndex's confirm callback, if it has one,
+        and recorded in last_reused_idea when it is reused.
+        """
+        match = self._find_similar_idea(idea_description)
+        if match is None or not self.ideas.accept(match):
+            return None
+        self.last_reused_idea = match
+        if on_text:
+            on_text(match.roadmap)
+        return match.roadmap
+    
+    def generate_initial_roadmap(self, idea_description, on_text=None, mode=None, reuse_similar=True):
         """
         Comprehensive Software Project Roadmap Generator
         You are tasked with creating a detailed, step-by-step roadmap for developing a software application based on the user's description. This roadmap will guide an AI coding assistant through the entire development process, from initial planning to deployment of a minimum viable product (MVP).
@@ -109,226 +765,637 @@ class ClaudeClient:
 
         Now, analyze the user's idea and create a comprehensive, step-by-step roadmap following these guidelines.
         """
-        prompt = self._build_prompt(idea_description)
-        
-        response = self.client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=MAX_TOKENS,
-            thinking={
-                "type": "enabled",
-                "budget_tokens": 10000
-            },
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            stream=True
-        )
+        if reuse_similar:
+            roadmap = self.reuse_similar_roadmap(idea_description, on_text)
+            if roadmap is not None:
+                return roadmap
         
-        # Access the text content from the streamed response
-        initial_roadmap = ""
-        for chunk in response:
-            if hasattr(chunk, 'type') and chunk.type == "content_block_delta":
-                if hasattr(chunk.delta, 'text'):
-                    initial_roadmap += chunk.delta.text
+        roadmap = None
+        if self._choose_mode(mode, GENERATION_MODE, GENERATION_MODES, "generation mode") == "parallel":
+            roadmap = self._generate_roadmap_in_parallel(idea_description, on_text)
+        if roadmap is None:
+            prompt = self._build_prompt(idea_description)
+            roadmap = self._stream_text(prompt, thinking_budget=self._thinking_budget("initial"), on_text=on_text, stage="initial")
         
-        return initial_roadmap
+        self._remember_idea(idea_description, roadmap)
+        return roadmap
     
-    def reflect_on_roadmap_with_answers(self, initial_roadmap, idea_description, user_answers):
+    def generate_customized_roadmap(self, idea_description, user_answers, on_text=None, mode=None):
         """
-        Take the initial roadmap and user answers to customize and improve the roadmap.
+        Generate the final roadmap in a single pass from answers known up front.
+        
+        The answers are folded into the generation prompt, so there is no question
+        or reflection request: the run costs one call instead of three (or the
+        skeleton and phase calls of parallel generation). Roadmaps of similar ideas
+        are neither reused nor remembered, since they aren't customized.
         
         Args:
-            initial_roadmap: The initial roadmap text
-            idea_description: Original idea description
-            user_answers: Dictionary of user answers to customization questions
+            idea_description: Description of the app idea
+            user_answers: Dictionary of the answers, keyed by question key or topic
+            on_text: Optional callback receiving each text delta as it streams in
+            mode: "single" or "parallel"; defaults to GENERATION_MODE
         """
-        # Format user answers for inclusion in the prompt
-        formatted_answers = "\n".join([f"- {key}: {value}" for key, value in user_answers.items()])
+        roadmap = None
+        if self._choose_mode(mode, GENERATION_MODE, GENERATION_MODES, "generation mode") == "parallel":
+            roadmap = self._generate_roadmap_in_parallel(idea_description, on_text, user_answers)
+        if roadmap is None:
+            prompt = self._build_prompt(idea_description, user_answers)
+            roadmap = self._stream_text(prompt, thinking_budget=self._thinking_budget("initial"), on_text=on_text, stage="initial")
+        return roadmap
+    
+    def _generate_roadmap_in_parallel(self, idea_description, on_text=None, user_answers=None):
+        """
+        Generate the roadmap as a skeleton followed by all phases in parallel.
         
-        reflection_prompt = f"""
-        I have generated an initial coding roadmap for this app idea:
+        The skeleton (title, phases and sub-task headings) is generated first with
+        extended thinking, since it carries the planning. Each phase is then written
+        by its own request, without thinking, sharing the idea and skeleton as a
+        prompt-cached prefix, and the phases are stitched together in order with
+        sequential step numbering. A cache entry can only be read once the response
+        that writes it has started, so with prompt caching the first phase starts
+        alone and the others follow its first delta, reading the prefix it wrote.
+        Phase text streams to on_text in document order: the first unfinished phase
+        live, later phases as soon as they are reached. If one phase fails, the others
+        close their streams at their next delta and the error is raised at once.
         
-        {idea_description}
+        With user_answers, both the skeleton and the phases are customized to them.
         
-        Here is the initial roadmap:
-        
-        {initial_roadmap}
+        Returns None if the skeleton has no phases, so the caller can fall back to
+        generating the roadmap in one stream.
+        """
+        skeleton_text = self._stream_text(self._build_skeleton_prompt(idea_description, user_answers), thinking_budget=self._thinking_budget("skeleton"), stage="skeleton")
+        skeleton = split_skeleton(skeleton_text)
+        if not skeleton.phases:
+            return None
+        skeleton_cached = self.last_call_cached
         
-        The user has provided the following additional information about their project requirements:
+        context = self._build_skeleton_context(skeleton_text, idea_description, user_answers)
+        stitcher = PhaseStitcher(skeleton.header, len(skeleton.phases), on_text)
         
-        {formatted_answers}
+        # Every phase runs on its own client so per-call state doesn't interleave
+        phase_clients = [ClaudeClient(cache=self.cache, anthropic_client=self.client, profile=self.profile) for _ in skeleton.phases]
         
-        Now, I need you to customize and improve this roadmap based on both your analysis and the user's specific requirements. Please:
+        # Set once the first phase's response has started (or failed)
+        first_delta = threading.Event()
+        # Set once any phase has failed; the others then close their streams at their next delta
+        failed = threading.Event()
         
-        1. Incorporate the user's specific requirements into the roadmap
-        2. Adjust timelines, technologies, and approaches based on their team size and experience
-        3. Prioritize features based on their must-have requirements
-        4. Adapt the technical approach for their target platforms
-        5. Identify any errors, inconsistencies, or logical flaws in the approach
-        6. Find sections that are unclear or need more detailed explanation
-        7. Add any missing steps or considerations that would make the roadmap more comprehensive
-        8. Ensure each testing step is thorough and covers all edge cases
-        9. Make sure the overall structure flows naturally from one step to the next
-        10. Add implementation details where explanations could be more specific
-        11. Include necessary context and rationale for technical decisions
-        
-        VERY IMPORTANT: The final roadmap MUST be extremely detailed and comprehensive but no more than 10000 tokens. Make it extremely detailed and comprehensive, with enough specificity that an AI coding assistant could implement the entire project without additional clarification from the user. DO NOT INCLUDE ACTUAL CODE.
+        def generate_phase(index, heading, outline):
+            client = phase_clients[index]
+            system, prompt = client._split_context_prompt(context, client._build_phase_prompt(outline, heading, len(skeleton.phases)))
+            stream = client.stream_text(prompt, system=system, stage=f"phase_{index + 1}")
+            try:
+                for delta in stream:
+                    first_delta.set()
+                    if failed.is_set():
+                        return
+                    stitcher.feed(index, delta)
+                stitcher.finish(index)
+            except BaseException:
+                failed.set()
+                raise
+            finally:
+                stream.close()
+                first_delta.set()
         
-        Have the agent consistently keep track of development progress by maintaining a project progress log that will be referred to throughout development
-
-        Take your time to think deeply about each aspect of the roadmap. This customization step is critical to creating the highest quality guidance possible for their specific needs.
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(skeleton.phases))
+        futures = []
+        try:
+            futures.append(executor.submit(generate_phase, 0, *skeleton.phases[0]))
+            if PROMPT_CACHING:
+                first_delta.wait()
+            if not failed.is_set():
+                futures += [executor.submit(generate_phase, index, heading, outline) for index, (heading, outline) in enumerate(skeleton.phases) if index]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+        except BaseException:
+            # One failed phase fails the roadmap; don't leave the others streaming or wait for them
+            failed.set()
+            raise
+        finally:
+            executor.shutdown(wait=not failed.is_set(), cancel_futures=True)
         
-        Please provide the complete, revised roadmap with all improvements incorporated. Do not simply list the changes - provide the fully enhanced and customized roadmap.
+        for client in phase_clients:
+            self.merge_usage(client)
+        self.last_call_cached = skeleton_cached and all(client.last_call_cached for client in phase_clients)
+        return stitcher.text()
+    
+    def reflect_on_roadmap_with_answers(self, initial_roadmap, idea_description, user_answers, on_text=None, mode=None):
+        """
+        Take the initial roadmap and user answers to customize and improve the roadmap.
         
-        REMEMBER TO USE NATURAL LANGUAGE GUIDANCE AN NO ACTUAL CODE OR SCRIPTS.
+        Args:
+            initial_roadmap: The initial roadmap text
+            idea_description: Original idea description
+            user_answers: Dictionary of user answers to customization questions
+            on_text: Optional callback receiving each text delta as it streams in
+            mode: "full" to regenerate the whole roadmap, or "patch" to request only
+                section-level edits and apply them locally (falling back to "full" if
+                the patch can't be applied); defaults to REFLECTION_MODE
         """
+        self.last_patch_operations = None
+        self.last_patch_fallback = None
+        if self._choose_mode(mode, REFLECTION_MODE, REFLECTION_MODES, "reflection mode") == "patch":
+            sections, system, patch_prompt = self._prepare_patch_reflection(initial_roadmap, idea_description, user_answers)
+            response_text = self._stream_text(patch_prompt, thinking_budget=self._thinking_budget("reflection_patch"), system=system, stage="reflection_patch", tools=self._context_tools(system))
+            patched = self._apply_reflection_patch(sections, response_text)
+            if patched is not None:
+                if on_text:
+                    on_text(patched)
+                return patched
         
-        response = self.client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=MAX_TOKENS,
-            thinking={
-                "type": "enabled",
-                "budget_tokens": 10000
-            },
-            messages=[
-                {"role": "user", "content": reflection_prompt}
-            ],
-            stream=True
+        system, reflection_prompt = self._split_context_prompt(
+            self._build_roadmap_context(initial_roadmap, idea_description),
+            self._build_reflection_prompt(user_answers)
         )
         
-        # Access the text content from the streamed response
-        customized_roadmap = ""
-        for chunk in response:
-            if hasattr(chunk, 'type') and chunk.type == "content_block_delta":
-                if hasattr(chunk.delta, 'text'):
-                    customized_roadmap += chunk.delta.text
-        
-        return customized_roadmap
+        return self._stream_text(reflection_prompt, thinking_budget=self._thinking_budget("reflection"), on_text=on_text, system=system, stage="reflection", tools=self._context_tools(system))
     
-    def _build_prompt(self, idea_description):
-        """
-        Build a prompt for Claude to generate a coding roadmap.
+    def refine_roadmap(self, roadmap, idea_description, on_text=None, pass_number=1):
         """
-        return f"""
-        Please generate a very detailed and comprehensive coding roadmap for the following app idea:
-        
-        {idea_description}
-                
-        DO NOT include actual code or scripts in the roadmap. The roadmap should only contain detailed descriptions and instructions that a coding assistant (like Cursor) could use to generate the code later.
+        Run one self-critique pass over a roadmap and return the revised roadmap.
         
-        The roadmap should:
-        1. Break down the development process into clear phases
-        2. Include natural language guidance between technical steps
-        3. Format the output in markdown
-        4. Structure the content so an AI coding assistant can follow it step-by-step
-        5. Include guidance for setting up the environment, implementing core features, and testing
-        6. Be extremely detailed - provide enough information that an AI coding assistant could implement the entire project without additional clarification from the user
-        7. For each component, include specific implementation details and considerations
-        8. Provide rationale for technical decisions and architecture choices
-        
-        For each major feature or component:
-        - Break it down into granular sub-tasks
-        - Describe the data structures or models needed
-        - Explain interfaces and connections to other components
-        - Detail configuration requirements
-        - Include specific testing steps to verify functionality
-        
-        IMPORTANT: Testing should be integrated throughout the roadmap, not just at the end. For each component, include detailed testing instructions that explain:
-        - What to test (specific functionalities, edge cases, etc.)
-        - How to test it (test approaches, tools, and methods)
-        - What expected outcomes should be
-        - How to handle potential errors or edge cases
-        - How to verify that the component integrates properly with the rest of the system
-        
-        Please write the roadmap with natural conversational phrases between steps, as if you're guiding someone through the process. For example: "Now that we have our database set up, let's implement the user authentication..." or "Let's start by installing the necessary packages..."
-        
-        Again, focus on DESCRIBING what code needs to be written rather than writing the actual code scripts.
-        
-        As a guide, ensure your roadmap is extremely detailed and between 6000-8000 tokens in length. This level of detail is necessary for an AI coding assistant to implement the project without further clarification.
+        Args:
+            roadmap: The roadmap to review, e.g. the initial roadmap or the previous pass's result
+            idea_description: Original idea description
+            on_text: Optional callback receiving each text delta as it streams in
+            pass_number: Number of the pass, recorded in the metrics stage name
         """
+        # Every pass reviews a different roadmap, so its context is never read back from the
+        # prompt cache; it goes in the user message rather than paying for a cache write
+        critique_prompt = join(self._build_roadmap_context(roadmap, idea_description), self._build_critique_prompt())
         
-    def generate_questions_for_roadmap(self, roadmap, idea_description):
+        return self._stream_text(critique_prompt, thinking_budget=self._thinking_budget("reflection"), on_text=on_text, stage=f"reflection_refine_{pass_number}")
+    
+    def generate_questions_for_roadmap(self, roadmap, idea_description, on_text=None):
         """
         Generate specific questions based on the roadmap content.
         
         Args:
             roadmap: The initial roadmap text
             idea_description: Original idea description
+            on_text: Optional callback receiving each text delta as it streams in
         
         Returns:
             Dictionary of question_key: question_text pairs
         """
-        questions_prompt = f"""
-        I have generated an initial coding roadmap for this app idea:
+        return dict(self.stream_questions(roadmap, idea_description, on_text))
+    
+    def stream_questions(self, roadmap, idea_description, on_text=None):
+        """
+        Generate questions based on the roadmap, yielding each (key, question) pair as soon as it is complete.
         
-        {idea_description}
+        The questions are requested as the input of the QUESTIONS_TOOL and picked out
+        of the stream by a QuestionStreamParser, so the first question can be asked
+        while the rest are still being written. If the response is malformed or cut
+        off with fewer than MIN_QUESTIONS questions, one repair request sends the
+        model its output and the problem and asks only for the missing questions; the
+        problem is kept in last_questions_repair. DEFAULT_QUESTIONS are only used if
+        no question could be read at all.
         
-        Here is the initial roadmap:
+        Args:
+            roadmap: The initial roadmap text
+            idea_description: Original idea description
+            on_text: Optional callback receiving each text delta as it streams in
+        """
+        self.last_questions_repair = None
+        system, questions_prompt = self._split_context_prompt(
+            self._build_roadmap_context(roadmap, idea_description),
+            self._build_questions_prompt()
+        )
+        parser = QuestionStreamParser()
+        for delta in self.stream_text(questions_prompt, self._thinking_budget("questions"), system, "questions", tools=CONTEXT_TOOLS):
+            if on_text:
+                on_text(delta)
+            yield from parser.feed(delta)
         
-        {roadmap}
+        problem = parser.problem()
+        if problem is None or len(parser.questions) >= MIN_QUESTIONS:
+            return
+        self.last_questions_repair = problem
+        repair_prompt = self._build_questions_repair_prompt(questions_prompt, problem, parser.text, parser.questions)
+        parser.restart()
+        for delta in self.stream_text(repair_prompt, self._thinking_budget("questions"), system, "questions_repair", tools=CONTEXT_TOOLS):
+            yield from parser.feed(delta)
         
-        Based on this specific roadmap, generate 5-10 questions that would help clarify and customize the roadmap for this particular project. 
+        if not parser.questions:
+            yield from DEFAULT_QUESTIONS.items()
+    
+    def stream_text(self, prompt, thinking_budget=None, system=None, stage=None, tools=None):
+        """
+        Send a prompt to Claude and yield the text deltas as they stream in.
         
-        Analyze the roadmap carefully and identify areas where additional user input would significantly improve the roadmap's specificity and relevance. Focus on:
-        - Technical decisions that are unclear or could have multiple valid approaches
-        - Features that might need prioritization or clarification
-        - Resource or timeline considerations specific to this project
-        - Domain-specific questions that would help tailor the roadmap better
-        - Design or architecture choices that would benefit from user preferences
+        Identical requests are answered from the response cache when one is configured;
+        a cache hit yields the whole cached text as a single delta. Identical requests
+        made at the same time, from any thread, share one upstream stream (see
+        single_flight): every caller gets all of its deltas as they arrive, and the
+        request is only aborted once the last caller stops reading. StageMetrics for
+        the call are emitted to the telemetry hooks when the stream ends.
         
-        Each question should be directly related to specific content in the roadmap, not generic questions that could apply to any project.
+        Args:
+            prompt: The fully built prompt
+            thinking_budget: Extended thinking budget in tokens, or None to disable thinking
+            system: Optional list of system content blocks sent ahead of the prompt
+            stage: Pipeline stage name recorded in the metrics
+            tools: Optional tool definitions; in the question stages the model is made
+                to call the first one, and its input JSON is yielded as the text
+        """
+        metrics, token = self._start_metrics(stage, thinking_budget)
+        prompt, system = self._fit_budget(metrics, prompt, system)
+        flight = None
+        try:
+            cache_key, cached_text = self._cache_lookup(prompt, thinking_budget, system, stage, tools)
+            if cached_text is not None:
+                metrics.cache_hit = True
+                metrics.text_received(cached_text)
+                yield cached_text
+                return
+            
+            flight, leader = flights.join(flight_key(self.client, self._build_request(prompt, thinking_budget, system, stage, tools)))
+            if leader:
+                producer = threading.Thread(
+                    target=self._produce, args=(flight, prompt, thinking_budget, system, stage, tools, cache_key),
+                    name="roadmap-stream", daemon=True
+                )
+                producer.start()
+            for item in flight.follow():
+                delta = self._follow(metrics, item)
+                if delta:
+                    yield delta
+        except Exception as e:
+            metrics.error = f"{type(e).__name__}: {e}"
+            raise
+        except BaseException:
+            metrics.error = "cancelled"
+            raise
+        finally:
+            if flight is not None:
+                # Every caller saw the whole stream; only the last one to finish reports its usage
+                metrics.coalesced = not flights.leave(flight)
+            self._finish_metrics(metrics, token)
+    
+    def _produce(self, flight, prompt, thinking_budget, system, stage, tools, cache_key):
+        """
+        Run a flight's upstream request in its own thread, publishing every stream event.
         
-        Return your response in the following JSON format WITHOUT any explanations or additional text:
-        {{"question_key_1": "Specific question text 1?", "question_key_2": "Specific question text 2?", ...}}
+        The producer is independent of the callers reading the flight, so the stream
+        keeps going for the others when one of them stops. A broken stream is retried,
+        or continued from the text received so far, and the complete response is
+        stored in the response cache.
+        """
+        # The upstream usage, kept only for the rate limiter; every caller has its own metrics
+        usage = StageMetrics(stage, None, 0, thinking_budget)
+        # Text published so far, kept so a broken stream can be continued without repeating it
+        received = []
+        attempt = 0
+        error = None
+        try:
+            while not flight.abandoned:
+                attempt += 1
+                request, skip = self._next_request(prompt, thinking_budget, system, received, stage, tools)
+                estimate = scheduler.estimate_tokens(request)
+                used_before = usage.billed_tokens
+                try:
+                    time.sleep(scheduler.reserve(estimate))
+                    response = self.client.messages.create(**request)
+                    flight.response = response
+                    try:
+                        for chunk in response:
+                            self._observe_usage(usage, chunk)
+                            delta = self._delta_text(chunk)
+                            if delta and skip:
+                                delta, skip = self._skip_whitespace(delta, skip)
+                            if delta:
+                                received.append(delta)
+                            flight.publish((chunk, delta))
+                            if flight.abandoned:
+                                break
+                    finally:
+                        flight.response = None
+                        response.close()
+                    break
+                except Exception as e:
+                    # An abandoned flight's response was closed under it; that is no reason to retry
+                    delay = None if flight.abandoned else scheduler.retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    usage.new_attempt()
+                    flight.publish(NEW_ATTEMPT)
+                    time.sleep(delay)
+                finally:
+                    scheduler.settle(estimate, usage.billed_tokens - used_before)
+            
+            if cache_key is not None and not flight.abandoned:
+                self._cache_store(cache_key, "".join(received))
+        except Exception as e:
+            error = e
+        finally:
+            flights.finish(flight, error)
+    
+    def _stream_text(self, prompt, thinking_budget=None, on_text=None, system=None, stage=None, tools=None):
+        """
+        Send a prompt to Claude and collect the streamed text response.
         
-        The question keys should be brief slug-like identifiers related to the question content.
+        Args:
+            prompt: The fully built prompt
+            thinking_budget: Extended thinking budget in tokens, or None to disable thinking
+            on_text: Optional callback receiving each text delta as it streams in
+            system: Optional list of system content blocks sent ahead of the prompt
+            stage: Pipeline stage name recorded in the metrics
+            tools: Optional tool definitions, as for stream_text
         """
+        chunks = []
+        for delta in self.stream_text(prompt, thinking_budget, system, stage, tools):
+            chunks.append(delta)
+            if on_text:
+                on_text(delta)
+        return "".join(chunks)
+
+class AsyncClaudeClient(BaseClaudeClient):
+    """
+    Asynchronous Claude client built on anthropic.AsyncAnthropic.
+    
+    Streams are consumed with async for, so the event loop stays free while a
+    generation is running and one process can drive many generations at once.
+    """
+    def __init__(self, cache=None, anthropic_client=None, ideas=None, profile=None):
+        """
+        Args:
+            cache: Optional ResponseCache used to replay identical requests without calling the API
+            anthropic_client: Optional anthropic.AsyncAnthropic instance; defaults to the shared
+                client for the running event loop
+            ideas: Optional IdeaIndex of previously generated ideas to reuse roadmaps from
+            profile: Name of the model profile to use; defaults to PROFILE
+        """
+        super().__init__(cache, ideas, profile)
+        self.client = anthropic_client or get_async_client()
+    
+    async def reuse_similar_roadmap(self, idea_description, on_text=None):
+        """Async version of ClaudeClient.reuse_similar_roadmap."""
+        match = self._find_similar_idea(idea_description)
+        # The confirm callback may prompt the user, so it runs off the event loop
+        if match is None or not await asyncio.to_thread(self.ideas.accept, match):
+            return None
+        self.last_reused_idea = match
+        if on_text:
+            on_text(match.roadmap)
+        return match.roadmap
+    
+    async def generate_initial_roadmap(self, idea_description, on_text=None, mode=None, reuse_similar=True):
+        """Async version of ClaudeClient.generate_initial_roadmap."""
+        if reuse_similar:
+            roadmap = await self.reuse_similar_roadmap(idea_description, on_text)
+            if roadmap is not None:
+                return roadmap
         
-        response = self.client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=MAX_TOKENS,
-            messages=[
-                {"role": "user", "content": questions_prompt}
-            ],
-            stream=True
-        )
+        roadmap = None
+        if self._choose_mode(mode, GENERATION_MODE, GENERATION_MODES, "generation mode") == "parallel":
+            roadmap = await self._generate_roadmap_in_parallel(idea_description, on_text)
+        if roadmap is None:
+            prompt = self._build_prompt(idea_description)
+            roadmap = await self._stream_text(prompt, thinking_budget=self._thinking_budget("initial"), on_text=on_text, stage="initial")
+        
+        self._remember_idea(idea_description, roadmap)
+        return roadmap
+    
+    async def generate_customized_roadmap(self, idea_description, user_answers, on_text=None, mode=None):
+        """Async version of ClaudeClient.generate_customized_roadmap."""
+        roadmap = None
+        if self._choose_mode(mode, GENERATION_MODE, GENERATION_MODES, "generation mode") == "parallel":
+            roadmap = await self._generate_roadmap_in_parallel(idea_description, on_text, user_answers)
+        if roadmap is None:
+            prompt = self._build_prompt(idea_description, user_answers)
+            roadmap = await self._stream_text(prompt, thinking_budget=self._thinking_budget("initial"), on_text=on_text, stage="initial")
+        return roadmap
+    
+    async def _generate_roadmap_in_parallel(self, idea_description, on_text=None, user_answers=None):
+        """Async version of ClaudeClient._generate_roadmap_in_parallel."""
+        skeleton_text = await self._stream_text(self._build_skeleton_prompt(idea_description, user_answers), thinking_budget=self._thinking_budget("skeleton"), stage="skeleton")
+        skeleton = split_skeleton(skeleton_text)
+        if not skeleton.phases:
+            return None
+        skeleton_cached = self.last_call_cached
         
-        # Extract the JSON dictionary from the streamed response
-        response_text = ""
-        for chunk in response:
-            if hasattr(chunk, 'type') and chunk.type == "content_block_delta":
-                if hasattr(chunk.delta, 'text'):
-                    response_text += chunk.delta.text
+        context = self._build_skeleton_context(skeleton_text, idea_description, user_answers)
+        stitcher = PhaseStitcher(skeleton.header, len(skeleton.phases), on_text)
         
-        # The response might include markdown code block formatting, so we need to clean it
-        import json
-        import re
+        phase_clients = [AsyncClaudeClient(cache=self.cache, anthropic_client=self.client, profile=self.profile) for _ in skeleton.phases]
         
-        # Try to extract JSON content if wrapped in code blocks or has extra text
-        json_pattern = r'```(?:json)?\s*({.*?})\s*```|({.*})'
-        match = re.search(json_pattern, response_text, re.DOTALL)
+        # Set once the first phase's response has started (or failed)
+        first_delta = asyncio.Event()
         
-        if match:
-            json_str = match.group(1) or match.group(2)
+        async def generate_phase(index, heading, outline):
+            client = phase_clients[index]
+            system, prompt = client._split_context_prompt(context, client._build_phase_prompt(outline, heading, len(skeleton.phases)))
             try:
-                return json.loads(json_str)
-            except json.JSONDecodeError:
-                pass
+                async for delta in client.stream_text(prompt, system=system, stage=f"phase_{index + 1}"):
+                    first_delta.set()
+                    stitcher.feed(index, delta)
+                stitcher.finish(index)
+            finally:
+                first_delta.set()
         
-        # If the above doesn't work, try parsing the whole response as JSON
+        tasks = [asyncio.create_task(generate_phase(0, *skeleton.phases[0]))]
         try:
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            # Fallback to default questions if parsing fails
-            return {
-                "target_platform": "What are your target platforms/environments?",
-                "timeline": "What is your expected timeline for this project?",
-                "team_size": "What is your team size and composition?",
-                "must_have_features": "What features do you consider must-haves for your MVP?",
-                "tech_stack": "Do you have preferred technologies or frameworks?",
-                "budget": "Do you have budget constraints that would impact the roadmap?",
-                "prior_experience": "What is your team's prior experience with similar projects?",
-                "deployment": "What are your deployment or distribution requirements?",
-                "scaling": "What are your scaling expectations (users, data volume, etc.)?",
-                "integration": "Are there existing systems you need to integrate with?"
-            }
\ No newline at end of file
+            if PROMPT_CACHING:
+                await first_delta.wait()
+            tasks += [asyncio.create_task(generate_phase(index, heading, outline)) for index, (heading, outline) in enumerate(skeleton.phases) if index]
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # One failed phase fails the roadmap; don't leave the others streaming
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        for client in phase_clients:
+            self.merge_usage(client)
+        self.last_call_cached = skeleton_cached and all(client.last_call_cached for client in phase_clients)
+        return stitcher.text()
+    
+    async def reflect_on_roadmap_with_answers(self, initial_roadmap, idea_description, user_answers, on_text=None, mode=None):
+        """Async version of ClaudeClient.reflect_on_roadmap_with_answers."""
+        self.last_patch_operations = None
+        self.last_patch_fallback = None
+        if self._choose_mode(mode, REFLECTION_MODE, REFLECTION_MODES, "reflection mode") == "patch":
+            sections, system, patch_prompt = self._prepare_patch_reflection(initial_roadmap, idea_description, user_answers)
+            response_text = await self._stream_text(patch_prompt, thinking_budget=self._thinking_budget("reflection_patch"), system=system, stage="reflection_patch", tools=self._context_tools(system))
+            patched = self._apply_reflection_patch(sections, response_text)
+            if patched is not None:
+                if on_text:
+                    on_text(patched)
+                return patched
+        
+        system, reflection_prompt = self._split_context_prompt(
+            self._build_roadmap_context(initial_roadmap, idea_description),
+            self._build_reflection_prompt(user_answers)
+        )
+        
+        return await self._stream_text(reflection_prompt, thinking_budget=self._thinking_budget("reflection"), on_text=on_text, system=system, stage="reflection", tools=self._context_tools(system))
+    
+    async def refine_roadmap(self, roadmap, idea_description, on_text=None, pass_number=1):
+        """Async version of ClaudeClient.refine_roadmap."""
+        critique_prompt = join(self._build_roadmap_context(roadmap, idea_description), self._build_critique_prompt())
+        
+        return await self._stream_text(critique_prompt, thinking_budget=self._thinking_budget("reflection"), on_text=on_text, stage=f"reflection_refine_{pass_number}")
+    
+    async def generate_questions_for_roadmap(self, roadmap, idea_description, on_text=None):
+        """Async version of ClaudeClient.generate_questions_for_roadmap."""
+        return {key: question async for key, question in self.stream_questions(roadmap, idea_description, on_text)}
+    
+    async def stream_questions(self, roadmap, idea_description, on_text=None):
+        """Async generator version of ClaudeClient.stream_questions."""
+        self.last_questions_repair = None
+        system, questions_prompt = self._split_context_prompt(
+            self._build_roadmap_context(roadmap, idea_description),
+            self._build_questions_prompt()
+        )
+        parser = QuestionStreamParser()
+        async for delta in self.stream_text(questions_prompt, self._thinking_budget("questions"), system, "questions", tools=CONTEXT_TOOLS):
+            if on_text:
+                on_text(delta)
+            for question in parser.feed(delta):
+                yield question
+        
+        problem = parser.problem()
+        if problem is None or len(parser.questions) >= MIN_QUESTIONS:
+            return
+        self.last_questions_repair = problem
+        repair_prompt = self._build_questions_repair_prompt(questions_prompt, problem, parser.text, parser.questions)
+        parser.restart()
+        async for delta in self.stream_text(repair_prompt, self._thinking_budget("questions"), system, "questions_repair", tools=CONTEXT_TOOLS):
+            for question in parser.feed(delta):
+                yield question
+        
+        if not parser.questions:
+            for question in DEFAULT_QUESTIONS.items():
+                yield question
+    
+    async def warm_up(self, initial_roadmap, idea_description):
+        """
+        Prepare for the reflection request before the user's answers are known.
+        
+        With prompt caching enabled, a one-token request writes the shared
+        idea-and-roadmap block to the prompt cache so the reflection call reads it
+        instead of processing it again. Otherwise the tokens of the reflection prompt
+        are counted. Either way the request opens (and keeps alive) the HTTP connection
+        the reflection call will reuse. Failures are ignored since warming is only an
+        optimization.
+        
+        Returns the input token count of the prompt prefix, or None if unavailable.
+        """
+        system, prompt = self._split_context_prompt(
+            self._build_roadmap_context(initial_roadmap, idea_description),
+            self._build_reflection_prompt({})
+        )
+        try:
+            if system:
+                request = {
+                    "model": self._stage_settings("reflection")["model"],
+                    "max_tokens": 1,
+                    "tools": CONTEXT_TOOLS,
+                    "tool_choice": {"type": "none"},
+                    "system": system,
+                    "messages": [{"role": "user", "content": "Reply with OK."}]
+                }
+                await asyncio.sleep(scheduler.reserve(scheduler.estimate_tokens(request)))
+                response = await self.client.messages.create(**request)
+                usage = response.usage
+                for field in ("cache_creation_input_tokens", "cache_read_input_tokens"):
+                    self.usage_totals[field] = self.usage_totals.get(field, 0) + (getattr(usage, field, None) or 0)
+                return (getattr(usage, "cache_creation_input_tokens", None) or 0) + (getattr(usage, "cache_read_input_tokens", None) or 0)
+            
+            count_tokens = getattr(self.client.messages, "count_tokens", None)
+            if count_tokens is None:
+                return None
+            result = await count_tokens(
+                model=self._stage_settings("reflection")["model"],
+                messages=[{"role": "user", "content": prompt}]
+            )
+        except Exception:
+            return None
+        return getattr(result, "input_tokens", None)
+    
+    async def stream_text(self, prompt, thinking_budget=None, system=None, stage=None, tools=None):
+        """Async generator version of ClaudeClient.stream_text; requests are shared between tasks of the same event loop."""
+        metrics, token = self._start_metrics(stage, thinking_budget)
+        prompt, system = self._fit_budget(metrics, prompt, system)
+        flight = None
+        try:
+            cache_key, cached_text = self._cache_lookup(prompt, thinking_budget, system, stage, tools)
+            if cached_text is not None:
+                metrics.cache_hit = True
+                metrics.text_received(cached_text)
+                yield cached_text
+                return
+            
+            # The anthropic client in the key is per event loop, so a flight never spans two loops
+            flight, leader = async_flights.join(flight_key(self.client, self._build_request(prompt, thinking_budget, system, stage, tools)))
+            if leader:
+                flight.task = asyncio.create_task(self._produce(flight, prompt, thinking_budget, system, stage, tools, cache_key))
+            async for item in flight.follow():
+                delta = self._follow(metrics, item)
+                if delta:
+                    yield delta
+        except Exception as e:
+            metrics.error = f"{type(e).__name__}: {e}"
+            raise
+        except BaseException:
+            metrics.error = "cancelled"
+            raise
+        finally:
+            if flight is not None:
+                metrics.coalesced = not async_flights.leave(flight)
+            self._finish_metrics(metrics, token)
+    
+    async def _produce(self, flight, prompt, thinking_budget, system, stage, tools, cache_key):
+        """Async version of ClaudeClient._produce, run as a task that is cancelled when the flight is abandoned."""
+        usage = StageMetrics(stage, None, 0, thinking_budget)
+        received = []
+        attempt = 0
+        error = None
+        try:
+            while True:
+                attempt += 1
+                request, skip = self._next_request(prompt, thinking_budget, system, received, stage, tools)
+                estimate = scheduler.estimate_tokens(request)
+                used_before = usage.billed_tokens
+                try:
+                    await asyncio.sleep(scheduler.reserve(estimate))
+                    response = await self.client.messages.create(**request)
+                    try:
+                        async for chunk in response:
+                            self._observe_usage(usage, chunk)
+                            delta = self._delta_text(chunk)
+                            if delta and skip:
+                                delta, skip = self._skip_whitespace(delta, skip)
+                            if delta:
+                                received.append(delta)
+                            flight.publish((chunk, delta))
+                    finally:
+                        await response.close()
+                    break
+                except Exception as e:
+                    delay = scheduler.retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    usage.new_attempt()
+                    flight.publish(NEW_ATTEMPT)
+                    await asyncio.sleep(delay)
+                finally:
+                    scheduler.settle(estimate, usage.billed_tokens - used_before)
+            
+            if cache_key is not None:
+                self._cache_store(cache_key, "".join(received))
+        except Exception as e:
+            error = e
+        finally:
+            async_flights.finish(flight, error)
+    
+    async def _stream_text(self, prompt, thinking_budget=None, on_text=None, system=None, stage=None, tools=None):
+        """Async version of ClaudeClient._stream_text."""
+        chunks = []
+        async for delta in self.stream_text(prompt, thinking_budget, system, stage, tools):
+            chunks.append(delta)
+            if on_text:
+                on_text(delta)
+        return "".join(chunks)
@@ -0,0 +1,157 @@
+# batch.py
+import asyncio
+import csv
+import json
+import os
+import re
+import time
+from api_client import AsyncClaudeClient
+from config import PROFILE
+import telemetry
+
+def load_batch_file(path):
+    """
+    Load ideas for a batch run from a JSONL or CSV file.
+    
+    JSONL lines are objects with an "idea" field and optional "output_file",
+    "profile" (a model profile name) and "answers" (an object of question_key:
+    answer) fields. CSV files need an "idea" column; "output_file" and "profile"
+    columns, an "answers" column holding a JSON object, and "answer_<key>" columns
+    are also recognised. An "output_file" must be a plain file name, written inside
+    the output directory.
+    
+    Returns a list of dictionaries with "idea", "output_file", "profile" and "answers" keys.
+    Raises ValueError naming the line or entry of any malformed input.
+    """
+    items = []
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row_number, row in enumerate(csv.DictReader(f), 2):
+                try:
+                    answers = json.loads(row["answers"]) if row.get("answers") else {}
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{row_number}: invalid JSON in the answers column ({e})")
+                if not isinstance(answers, dict):
+                    raise ValueError(f"{path}:{row_number}: the answers column must hold a JSON object")
+                for column, value in row.items():
+                    if column and column.startswith("answer_") and value:
+                        answers[column[len("answer_"):]] = value
+                items.append(_make_item(row, answers))
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{line_number}: invalid JSON ({e})")
+                if not isinstance(row, dict):
+                    raise ValueError(f"{path}:{line_number}: expected a JSON object with an idea field")
+                if not isinstance(row.get("answers") or {}, dict):
+                    raise ValueError(f"{path}:{line_number}: answers must be an object of question_key: answer")
+                items.append(_make_item(row, row.get("answers") or {}))
+    
+    for index, item in enumerate(items, 1):
+        if not item["idea"]:
+            raise ValueError(f"{path}: entry {index} has no idea")
+        if item["output_file"] is not None and not _is_plain_file_name(item["output_file"]):
+            raise ValueError(f"{path}: entry {index}: output_file {item['output_file']!r} must be a file name, without directories")
+    return items
+
+def _is_plain_file_name(name):
+    """Whether name is a bare file name, so joining it to the output directory stays inside it."""
+    return (isinstance(name, str) and name not in (".", "..")
+            and not os.path.isabs(name) and "/" not in name and "\\" not in name)
+
+def _make_item(row, answers):
+    return {
+        "idea": (row.get("idea") or "").strip(),
+        "output_file": row.get("output_file") or None,
+        "profile": row.get("profile") or None,
+        "answers": answers
+    }
+
+def slugify(text, max_length=50):
+    """Turn an idea description into a short file-name-safe slug."""
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug[:max_length].rstrip("-") or "roadmap"
+
+async def _generate_one(idea, answers, cache, ideas, profile, store):
+    """
+    Run the non-interactive pipeline for a single idea.
+    
+    Answers from the batch file are folded into the generation request, so the
+    roadmap is customized in a single pass; without answers the question stage is
+    skipped and the initial roadmap is the result.
+    
+    Returns (roadmap, cached, reused): whether every call was replayed from the
+    response cache, and whether the initial roadmap came from a similar idea.
+    With a RoadmapStore, the roadmap is stored as a version of the idea.
+    """
+    telemetry.start_run()
+    client = AsyncClaudeClient(cache=cache, ideas=ideas, profile=profile)
+    if answers:
+        roadmap = await client.generate_customized_roadmap(idea, answers)
+        if store:
+            store.commit(idea, roadmap, "reflected", profile=client.profile)
+        return roadmap, client.last_call_cached, False
+    roadmap = await client.generate_initial_roadmap(idea)
+    reused = client.last_reused_idea is not None
+    if store:
+        store.commit(idea, roadmap, "initial", profile=client.profile)
+    return roadmap, client.last_call_cached and not reused, reused
+
+async def run_batch(items, concurrency=4, output_dir="roadmaps", cache=None, on_result=None, ideas=None, profile=None, store=None):
+    """
+    Generate roadmaps for many ideas concurrently.
+    
+    Args:
+        items: Entries as returned by load_batch_file
+        concurrency: Maximum number of pipelines running at once
+        output_dir: Directory each finished roadmap is written to
+        cache: Optional ResponseCache shared by all pipelines
+        on_result: Optional callback receiving each result dictionary as it finishes
+        ideas: Optional IdeaIndex; ideas similar to earlier ones reuse their initial roadmap
+        profile: Model profile for entries that don't name their own; defaults to PROFILE
+        store: Optional RoadmapStore every generated roadmap is recorded in
+    
+    Returns a list of result dictionaries in input order, each with "idea", "status"
+    ("ok" or "failed"), "latency", "file", "profile", "cached", "reused" and "error" keys.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    # Reserve output paths up front so two ideas with the same slug never collide
+    used_names = set()
+    file_paths = []
+    for item in items:
+        name = item["output_file"] or f"{slugify(item['idea'])}.md"
+        base, ext = os.path.splitext(name)
+        suffix = 2
+        while name in used_names:
+            name = f"{base}-{suffix}{ext}"
+            suffix += 1
+        used_names.add(name)
+        file_paths.append(os.path.join(output_dir, name))
+    
+    async def worker(item, file_path):
+        async with semaphore:
+            start = time.perf_counter()
+            item_profile = item.get("profile") or profile or PROFILE
+            result = {"idea": item["idea"], "file": None, "profile": item_profile, "cached": False, "reused": False, "error": None}
+            try:
+                roadmap, cached, reused = await _generate_one(item["idea"], item["answers"], cache, ideas, item_profile, store)
+                with open(file_path, "w", encoding="utf-8") as f:
+                    f.write(roadmap)
+                result.update(status="ok", file=file_path, cached=cached, reused=reused)
+            except Exception as e:
+                result.update(status="failed", error=str(e))
+            result["latency"] = time.perf_counter() - start
+        
+        if on_result:
+            on_result(result)
+        return result
+    
+    return await asyncio.gather(*(worker(item, path) for item, path in zip(items, file_paths)))
@@ -0,0 +1,340 @@
+# benchmarks/fake_server.py
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from benchmarks.record import read_recording, text_to_events
+from roadmap_patch import parse_sections
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+
+class FakeAnthropicServer:
+    """
+    Local stand-in for the Anthropic Messages API.
+    
+    Streaming requests are answered by replaying a recorded SSE stream (initial,
+    questions, reflection or patch reflection, chosen from the prompt) at a
+    configurable token rate after a configurable time-to-first-byte; requests with
+    tools get the recorded text back as the input of a call to the first tool. Errors can be injected as
+    429/529 responses before the stream starts, as overloaded_error events half way through
+    a stream, or as connections dropped mid-stream.
+    Point the SDK at it with ANTHROPIC_BASE_URL=server.base_url.
+    """
+    def __init__(self, tokens_per_second=2000, latency=0.3, error_rate=0.0, disconnect_rate=0.0,
+                 stream_error_rate=0.0, recordings_dir=RECORDINGS_DIR, seed=None, host="127.0.0.1", port=0):
+        """
+        Args:
+            tokens_per_second: Rate at which recorded deltas are replayed (about 4 characters per token)
+            latency: Seconds to wait before the first byte of each response
+            error_rate: Probability that a request is rejected with a 429 or 529 error
+            disconnect_rate: Probability that a stream is cut off half way through
+            stream_error_rate: Probability that a stream ends half way through with an
+                overloaded_error event, as the API sends when it is overloaded mid-response
+            recordings_dir: Directory holding initial.sse, questions.sse, reflection.sse
+                and reflection_patch.sse
+            seed: Optional random seed so error injection is reproducible
+        """
+        self.tokens_per_second = tokens_per_second
+        self.latency = latency
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.stream_error_rate = stream_error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recordings = {
+            name: read_recording(os.path.join(recordings_dir, f"{name}.sse"))
+            for name in ("initial", "questions", "reflection", "reflection_patch")
+        }
+        # Parallel generation's skeleton and per-phase streams are cut from the initial roadmap
+        self.recordings.update(_derived_recordings(self.recordings["initial"]))
+        self.cached_prefixes = set()
+        self.stats = {"requests": 0, "errors_injected": 0, "disconnects_injected": 0, "stream_errors_injected": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+    
+    def select_recording(self, body):
+        """Pick the recording that matches the pipeline stage the request belongs to."""
+        text = _request_text(body)
+        if "generate 5-10 questions" in text:
+            return "questions"
+        if "Create the skeleton of the roadmap" in text:
+            return "skeleton"
+        phase = re.search(r"Begin with exactly this heading line: ## Phase (\d+)", text)
+        if phase:
+            return f"phase_{phase.group(1)}" if f"phase_{phase.group(1)}" in self.recordings else "initial"
+        if "Do NOT rewrite the whole roadmap" in text:
+            return "reflection_patch"
+        if "customize and improve this roadmap" in text or "Critically review this roadmap" in text:
+            return "reflection"
+        return "initial"
+    
+    def _roll(self, probability):
+        with self.lock:
+            return self.random.random() < probability
+    
+    def _cache_usage(self, body):
+        """
+        Report prompt cache writes the first time a cached system prefix is seen and reads after that.
+        
+        As in the API, the prefix covers the tools sent ahead of the system blocks, so
+        requests with different tools don't share a cache entry.
+        """
+        system = body.get("system")
+        if not isinstance(system, list) or not any(block.get("cache_control") for block in system):
+            return 0, 0
+        prefix = json.dumps({"tools": body.get("tools"), "system": system}, sort_keys=True)
+        tokens = len(prefix) // 4
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        with self.lock:
+            if key in self.cached_prefixes:
+                return 0, tokens
+            self.cached_prefixes.add(key)
+        return tokens, 0
+    
+    def _make_handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def do_HEAD(self):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server.lock:
+                    server.stats["requests"] += 1
+                time.sleep(server.latency)
+                
+                if self.path.startswith("/v1/messages/count_tokens"):
+                    return self._send_json(200, {"input_tokens": len(_request_text(body)) // 4})
+                
+                if server._roll(server.error_rate):
+                    with server.lock:
+                        server.stats["errors_injected"] += 1
+                    if server._roll(0.5):
+                        return self._send_json(429, _error("rate_limit_error", "Rate limited"), {"retry-after": "1"})
+                    return self._send_json(529, _error("overloaded_error", "Overloaded"))
+                
+                events = server.recordings[server.select_recording(body)]
+                messages = body.get("messages", [])
+                if messages and messages[-1].get("role") == "assistant":
+                    events = _continue_after(events, messages[-1].get("content") or "")
+                elif body.get("tools"):
+                    events = _as_tool_call(events, body["tools"][0]["name"])
+                cache_write, cache_read = server._cache_usage(body)
+                if body.get("stream"):
+                    self._stream(events, cache_write, cache_read)
+                else:
+                    self._send_json(200, _final_message(events, body, cache_write, cache_read))
+            
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def _write_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            
+            def _stream(self, events, cache_write, cache_read):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                
+                disconnect_at = len(events) // 2 if server._roll(server.disconnect_rate) else None
+                error_at = len(events) // 2 if disconnect_at is None and server._roll(server.stream_error_rate) else None
+                start = time.perf_counter()
+                tokens_sent = 0.0
+                for index, (name, data) in enumerate(events):
+                    if index == disconnect_at:
+                        with server.lock:
+                            server.stats["disconnects_injected"] += 1
+                        # Drop the connection without the terminating chunk
+                        self.close_connection = True
+                        return
+                    if index == error_at:
+                        with server.lock:
+                            server.stats["stream_errors_injected"] += 1
+                        # The API reports an error after the 200 response has begun as an SSE error event
+                        self._write_chunk(f"event: error\ndata: {json.dumps(_error('overloaded_error', 'Overloaded'))}\n\n".encode("utf-8"))
+                        break
+                    
+                    if name == "message_start":
+                        data = _with_cache_usage(data, cache_write, cache_read)
+                    elif name == "content_block_delta":
+                        # Pace deltas against the configured token rate
+                        delta = json.loads(data)["delta"]
+                        tokens_sent += len(delta.get("text") or delta.get("partial_json") or delta.get("thinking") or "") / 4
+                        delay = start + tokens_sent / server.tokens_per_second - time.perf_counter()
+                        if delay > 0.001:
+                            time.sleep(delay)
+                    self._write_chunk(f"event: {name}\ndata: {data}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                
+                self.wfile.write(b"0\r\n\r\n")
+        
+        return Handler
+
+def _request_text(body):
+    """All prompt text in a request body, system blocks included."""
+    parts = []
+    system = body.get("system")
+    if isinstance(system, str):
+        parts.append(system)
+    elif isinstance(system, list):
+        parts.extend(block.get("text", "") for block in system)
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(block.get("text", "") for block in content if isinstance(block, dict))
+    return "\n".join(parts)
+
+def _derived_recordings(initial_events):
+    """
+    Build skeleton and phase_N recordings from the initial roadmap recording.
+    
+    The skeleton is the title and introduction plus every phase and sub-task heading
+    (and it keeps the recording's thinking); each phase is its H2 section with the
+    H3 sections under it.
+    """
+    text, thinking = [], []
+    for name, data in initial_events:
+        if name == "content_block_delta":
+            delta = json.loads(data)["delta"]
+            text.append(delta.get("text", ""))
+            thinking.append(delta.get("thinking", ""))
+    
+    skeleton = []
+    phases = []
+    for section in parse_sections("".join(text)):
+        if section.level < 2 and not phases:
+            skeleton.append(section.text)
+            continue
+        skeleton.append(section.text.splitlines()[0] + "\n\n")
+        if section.level == 2:
+            phases.append(section.text)
+        elif phases:
+            phases[-1] += section.text
+    
+    def to_recording(events):
+        return [(name, json.dumps(data, separators=(",", ":"))) for name, data in events]
+    
+    recordings = {"skeleton": to_recording(text_to_events("".join(skeleton), thinking_text="".join(thinking)))}
+    for number, phase in enumerate(phases, 1):
+        recordings[f"phase_{number}"] = to_recording(text_to_events(phase))
+    return recordings
+
+def _continue_after(events, prefill):
+    """
+    Continue a recording from a prefilled assistant turn, like the API does.
+    
+    Thinking blocks are dropped (prefill can't be combined with thinking) and the
+    text deltas resume right after the prefilled characters.
+    """
+    if isinstance(prefill, list):
+        prefill = "".join(block.get("text", "") for block in prefill if isinstance(block, dict))
+    continued = []
+    thinking_blocks = set()
+    position = 0
+    for name, data in events:
+        event = json.loads(data)
+        if name == "content_block_start" and event["content_block"]["type"] != "text":
+            thinking_blocks.add(event["index"])
+        if event.get("index") in thinking_blocks:
+            continue
+        if name == "content_block_delta":
+            text = event["delta"].get("text", "")
+            remaining = text[max(0, len(prefill) - position):]
+            position += len(text)
+            if not remaining:
+                continue
+            event["delta"]["text"] = remaining
+            data = json.dumps(event, separators=(",", ":"))
+        continued.append((name, data))
+    return continued
+
+def _as_tool_call(events, tool_name):
+    """
+    Turn a recording's text into the input of a call to tool_name, like a tool-use response.
+    
+    The recorded text must be the tool input's JSON; its deltas become input_json_delta events.
+    """
+    converted = []
+    for name, data in events:
+        event = json.loads(data)
+        if name == "content_block_start" and event["content_block"]["type"] == "text":
+            event["content_block"] = {"type": "tool_use", "id": "toolu_recorded", "name": tool_name, "input": {}}
+        elif name == "content_block_delta" and event["delta"].get("type") == "text_delta":
+            event["delta"] = {"type": "input_json_delta", "partial_json": event["delta"]["text"]}
+        elif name == "message_delta":
+            event["delta"]["stop_reason"] = "tool_use"
+        converted.append((name, json.dumps(event, separators=(",", ":"))))
+    return converted
+
+def _error(error_type, message):
+    return {"type": "error", "error": {"type": error_type, "message": message}}
+
+def _with_cache_usage(data, cache_write, cache_read):
+    event = json.loads(data)
+    usage = event["message"]["usage"]
+    usage["cache_creation_input_tokens"] = cache_write
+    usage["cache_read_input_tokens"] = cache_read
+    return json.dumps(event, separators=(",", ":"))
+
+def _final_message(events, body, cache_write, cache_read):
+    """Collapse a recording into a non-streaming response, truncated to max_tokens."""
+    start = json.loads(events[0][1])["message"]
+    text = "".join(
+        event["delta"].get("text", "")
+        for event in (json.loads(data) for name, data in events if name == "content_block_delta")
+    )
+    text = text[:body.get("max_tokens", len(text)) * 4]
+    start.update({
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn" if len(text) // 4 < body.get("max_tokens", 0) else "max_tokens"
+    })
+    start["usage"].update({
+        "output_tokens": max(1, len(text) // 4),
+        "cache_creation_input_tokens": cache_write,
+        "cache_read_input_tokens": cache_read
+    })
+    return start
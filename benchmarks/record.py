@@ -0,0 +1,105 @@
+# benchmarks/record.py
+import argparse
+import json
+import re
+
+def split_deltas(text, max_chars=16):
+    """
+    Split text into delta-sized pieces the way the API streams it.
+    
+    Pieces break on word boundaries and stay around max_chars long, which roughly
+    matches the handful of tokens carried by each content_block_delta event.
+    """
+    deltas = []
+    current = ""
+    for piece in re.findall(r"\S+\s*|\s+", text):
+        if current and len(current) + len(piece) > max_chars:
+            deltas.append(current)
+            current = ""
+        current += piece
+    if current:
+        deltas.append(current)
+    return deltas
+
+def text_to_events(text, thinking_text=None, input_tokens=1000, model="claude-3-7-sonnet-20250219"):
+    """
+    Build the list of stream events for a response consisting of text (and optional thinking).
+    
+    Returns a list of (event_name, data_dict) tuples in the order the API sends them.
+    """
+    output_tokens = max(1, len(text) // 4) + (len(thinking_text) // 4 if thinking_text else 0)
+    events = [("message_start", {
+        "type": "message_start",
+        "message": {
+            "id": "msg_recorded", "type": "message", "role": "assistant", "model": model,
+            "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": 1,
+                      "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        }
+    })]
+    
+    index = 0
+    if thinking_text:
+        events.append(("content_block_start", {"type": "content_block_start", "index": index,
+                                               "content_block": {"type": "thinking", "thinking": "", "signature": ""}}))
+        for delta in split_deltas(thinking_text):
+            events.append(("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                   "delta": {"type": "thinking_delta", "thinking": delta}}))
+        events.append(("content_block_delta", {"type": "content_block_delta", "index": index,
+                                               "delta": {"type": "signature_delta", "signature": "recorded-signature"}}))
+        events.append(("content_block_stop", {"type": "content_block_stop", "index": index}))
+        index += 1
+    
+    events.append(("content_block_start", {"type": "content_block_start", "index": index,
+                                           "content_block": {"type": "text", "text": ""}}))
+    for delta in split_deltas(text):
+        events.append(("content_block_delta", {"type": "content_block_delta", "index": index,
+                                               "delta": {"type": "text_delta", "text": delta}}))
+    events.append(("content_block_stop", {"type": "content_block_stop", "index": index}))
+    events.append(("message_delta", {"type": "message_delta",
+                                     "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                     "usage": {"output_tokens": output_tokens}}))
+    events.append(("message_stop", {"type": "message_stop"}))
+    return events
+
+def write_recording(path, events):
+    """Write events as a server-sent events file."""
+    with open(path, "w", encoding="utf-8") as f:
+        for name, data in events:
+            f.write(f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n")
+
+def read_recording(path):
+    """Read a server-sent events file back into (event_name, data_string) tuples."""
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for block in f.read().split("\n\n"):
+            name, data = None, []
+            for line in block.splitlines():
+                if line.startswith("event: "):
+                    name = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data.append(line[len("data: "):])
+            if name:
+                events.append((name, "\n".join(data)))
+    return events
+
+def main():
+    parser = argparse.ArgumentParser(description='Turn a captured response into an SSE recording for the fake server')
+    parser.add_argument('text_file', help='File containing the response text')
+    parser.add_argument('output', help='Path of the .sse recording to write')
+    parser.add_argument('--thinking-file', help='Optional file containing the thinking text')
+    parser.add_argument('--input-tokens', type=int, default=1000, help='Input token count to report in message_start')
+    args = parser.parse_args()
+    
+    with open(args.text_file, encoding="utf-8") as f:
+        text = f.read()
+    thinking_text = None
+    if args.thinking_file:
+        with open(args.thinking_file, encoding="utf-8") as f:
+            thinking_text = f.read()
+    
+    write_recording(args.output, text_to_events(text, thinking_text, args.input_tokens))
+    print(f"Recording written to {args.output}")
+
+if __name__ == "__main__":
+    main()
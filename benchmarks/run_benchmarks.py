@@ -0,0 +1,214 @@
+# benchmarks/run_benchmarks.py
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.fake_server import FakeAnthropicServer
+
+IDEA = "A task manager web app with categories, due dates and email reminders"
+ANSWERS = "Two developers, web first, Python backend"
+
+def _summarize(values):
+    """Mean/median/min/max of a list of measurements."""
+    if not values:
+        return None
+    return {
+        "mean": statistics.mean(values),
+        "median": statistics.median(values),
+        "min": min(values),
+        "max": max(values),
+        "samples": len(values)
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+@contextlib.contextmanager
+def _quiet_interactive_session():
+    """Answer every question with a canned reply and hide animations and prompts."""
+    original_input = builtins.input
+    builtins.input = lambda prompt="": ANSWERS
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        builtins.input = original_input
+
+async def _timed_stage(call):
+    """
+    Run one client call and measure time-to-first-token and end-to-end latency.
+    
+    call receives an on_text callback and returns an awaitable.
+    """
+    start = time.perf_counter()
+    first_token = None
+    characters = 0
+    
+    def on_text(delta):
+        nonlocal first_token, characters
+        if first_token is None:
+            first_token = time.perf_counter()
+        characters += len(delta)
+    
+    result = await call(on_text)
+    total = time.perf_counter() - start
+    return result, {
+        "ttft": (first_token or time.perf_counter()) - start,
+        "total": total,
+        # About 4 characters per token
+        "tokens_per_second": characters / 4 / total if total else 0.0
+    }
+
+async def bench_stages(runs):
+    """Time each stage of the interactive pipeline, called in pipeline order."""
+    from api_client import AsyncClaudeClient
+    
+    samples = {"initial": [], "initial_parallel": [], "questions": [], "reflection": [], "reflection_patch": []}
+    failures = {stage: 0 for stage in samples}
+    for _ in range(runs):
+        client = AsyncClaudeClient()
+        stage = "initial"
+        try:
+            roadmap, metrics = await _timed_stage(lambda on_text: client.generate_initial_roadmap(IDEA, on_text=on_text, mode="single"))
+            samples[stage].append(metrics)
+            stage = "initial_parallel"
+            _, metrics = await _timed_stage(lambda on_text: client.generate_initial_roadmap(IDEA, on_text=on_text, mode="parallel"))
+            samples[stage].append(metrics)
+            stage = "questions"
+            questions, metrics = await _timed_stage(lambda on_text: client.generate_questions_for_roadmap(roadmap, IDEA, on_text=on_text))
+            samples[stage].append(metrics)
+            stage = "reflection"
+            answers = {key: ANSWERS for key in questions}
+            _, metrics = await _timed_stage(lambda on_text: client.reflect_on_roadmap_with_answers(roadmap, IDEA, answers, on_text=on_text, mode="full"))
+            samples[stage].append(metrics)
+            stage = "reflection_patch"
+            _, metrics = await _timed_stage(lambda on_text: client.reflect_on_roadmap_with_answers(roadmap, IDEA, answers, on_text=on_text, mode="patch"))
+            if client.last_patch_fallback:
+                raise RuntimeError(client.last_patch_fallback)
+            samples[stage].append(metrics)
+        except Exception:
+            # A failed stage ends this run; later stages have nothing to work from
+            failures[stage] += 1
+    
+    report = {}
+    for stage, stage_samples in samples.items():
+        report[stage] = {field: _summarize([sample[field] for sample in stage_samples]) for field in ("ttft", "total", "tokens_per_second")}
+        report[stage]["failures"] = failures[stage]
+    return report
+
+async def bench_pipeline(runs, pipelined):
+    """End-to-end wall time of generate_roadmap_with_questions with canned answers."""
+    from roadmap_generator import generate_roadmap_with_questions
+    
+    totals = []
+    failures = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            with _quiet_interactive_session():
+                await generate_roadmap_with_questions(IDEA, pipelined=pipelined)
+        except Exception:
+            failures += 1
+            continue
+        totals.append(time.perf_counter() - start)
+    return {"total": _summarize(totals), "failures": failures}
+
+async def bench_batch(size, concurrency):
+    """Throughput of the batch runner over distinct ideas."""
+    from batch import run_batch
+    
+    items = [{"idea": f"{IDEA} (variant {i})", "output_file": None, "answers": {}} for i in range(size)]
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        results = await run_batch(items, concurrency, output_dir)
+        total = time.perf_counter() - start
+    
+    failures = sum(1 for result in results if result["status"] != "ok")
+    return {
+        "ideas": size,
+        "concurrency": concurrency,
+        "total": total,
+        "ideas_per_minute": size / total * 60 if total else 0.0,
+        "latency": _summarize([result["latency"] for result in results]),
+        "failures": failures
+    }
+
+def _peak_memory(run, coroutine):
+    """Peak traced Python memory, in bytes, while running coroutine."""
+    tracemalloc.start()
+    try:
+        run(coroutine)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks against a local fake Anthropic streaming server')
+    parser.add_argument('--token-rate', type=float, default=2000, help='Tokens per second the fake server streams')
+    parser.add_argument('--latency', type=float, default=0.3, help='Seconds before the first byte of each response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of a 429/529 response per request')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help='Probability of a stream being cut off mid-way')
+    parser.add_argument('--stream-error-rate', type=float, default=0.0, help='Probability of an overloaded_error event mid-way through a stream')
+    parser.add_argument('--runs', type=int, default=3, help='Repetitions of the stage and pipeline benchmarks')
+    parser.add_argument('--batch-size', type=int, default=8, help='Number of ideas in the batch benchmark')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrency of the batch benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for error injection')
+    parser.add_argument('--output', type=str, help='Write the JSON report to this file as well as stdout')
+    args = parser.parse_args()
+    
+    server = FakeAnthropicServer(
+        tokens_per_second=args.token_rate, latency=args.latency, error_rate=args.error_rate,
+        disconnect_rate=args.disconnect_rate, stream_error_rate=args.stream_error_rate, seed=args.seed
+    ).start()
+    
+    # The SDK picks these up when the shared clients are created
+    os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+    os.environ["ANTHROPIC_API_KEY"] = "benchmark"
+    from connection_pool import run, stats
+    
+    try:
+        results = {
+            "stages": run(bench_stages(args.runs)),
+            "pipeline": run(bench_pipeline(args.runs, pipelined=False)),
+            "pipeline_pipelined": run(bench_pipeline(args.runs, pipelined=True)),
+            "batch": run(bench_batch(args.batch_size, args.concurrency)),
+            "peak_memory_bytes": {
+                "pipeline": _peak_memory(run, bench_pipeline(1, pipelined=False)),
+                "batch": _peak_memory(run, bench_batch(args.batch_size, args.concurrency))
+            }
+        }
+    finally:
+        server.stop()
+    
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "server": server.stats,
+        "connections": {"requests": stats.requests, "connections": stats.connections, "reused": stats.reused},
+        "results": results
+    }
+    
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    sys.exit(main())
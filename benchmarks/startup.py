@@ -0,0 +1,151 @@
+# benchmarks/startup.py
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.run_benchmarks import _summarize, _git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules that must never be imported just to parse arguments or run the local commands
+HEAVY_MODULES = ("anthropic", "httpx")
+SAMPLE_ROADMAP = """# Task Manager
+
+## Phase 1: Project Analysis & Requirements Engineering
+
+### 1.1 Requirements
+
+1. List the core features: tasks, categories and reminders
+"""
+
+def _command_names():
+    """Names of every CLI command, as typed on the command line."""
+    sys.path.insert(0, ROOT)
+    import main
+    return [command.name or command.callback.__name__.replace("_", "-") for command in main.app.registered_commands]
+
+def _cases(work_dir):
+    """
+    (name, argv, checks_heavy_imports) for every startup case.
+    
+    Every command is measured with --help, which is what argument parsing costs.
+    The local commands also run for real on empty or tiny data. pipeline_import is
+    the extra import cost the API commands pay before their first request.
+    """
+    main_py = os.path.join(ROOT, "main.py")
+    cases = [("--help", [main_py, "--help"], True)]
+    for name in _command_names():
+        cases.append((f"{name} --help", [main_py, name, "--help"], True))
+    cases += [
+        ("runs", [main_py, "runs"], True),
+        ("search", [main_py, "search", "reminders", "--dir", work_dir], True),
+        ("show", [main_py, "show", "roadmap.md", "--dir", work_dir], True),
+        ("history", [main_py, "history", "sample"], True),
+        ("checkout", [main_py, "checkout", "sample", "1"], True),
+        ("pipeline_import", ["-c", "import roadmap_generator"], False)
+    ]
+    return cases
+
+def _run(argv, env, import_time=False):
+    """Run the interpreter with argv; returns (wall seconds, stderr)."""
+    command = [sys.executable] + (["-X", "importtime"] if import_time else []) + argv
+    start = time.perf_counter()
+    completed = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    return time.perf_counter() - start, completed.stderr
+
+def _parse_import_time(stderr):
+    """
+    Parse -X importtime output.
+    
+    Returns (total import ms, the five slowest top-level imports, every imported module name).
+    """
+    total_us = 0
+    top_level = []
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        modules.add(name.strip())
+        # Nested imports are indented beyond the single separating space
+        if not name[1:].startswith(" "):
+            top_level.append((int(cumulative_us), name.strip()))
+    top_level.sort(reverse=True)
+    return total_us / 1000, [{"module": name, "ms": us / 1000} for us, name in top_level[:5]], modules
+
+def bench_startup(runs):
+    """Median wall time, import time and slowest imports for every startup case."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        with open(os.path.join(work_dir, "roadmap.md"), "w", encoding="utf-8") as f:
+            f.write(SAMPLE_ROADMAP)
+        env = dict(os.environ, ROADMAP_RUNS_DIR=os.path.join(work_dir, "runs"), ROADMAP_STORE_DIR=os.path.join(work_dir, "store"))
+        sys.path.insert(0, ROOT)
+        from roadmap_store import RoadmapStore
+        RoadmapStore(env["ROADMAP_STORE_DIR"]).commit("sample", SAMPLE_ROADMAP, "initial")
+    
+        results = {}
+        for name, argv, checks_heavy_imports in _cases(work_dir):
+            # One untimed run first, so every case starts with warm file system caches
+            _run(argv, env)
+            wall = [_run(argv, env)[0] * 1000 for _ in range(runs)]
+            _, stderr = _run(argv, env, import_time=True)
+            import_ms, slowest, modules = _parse_import_time(stderr)
+            results[name] = {
+                "wall_ms": _summarize(wall),
+                "import_ms": import_ms,
+                "slowest_imports": slowest,
+                "heavy_imports": sorted(module for module in HEAVY_MODULES if module in modules) if checks_heavy_imports else None
+            }
+    return results
+
+def compare(results, baseline, max_regression):
+    """List the cases whose median wall time grew by more than max_regression (a fraction) over baseline."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        before, after = previous["wall_ms"]["median"], result["wall_ms"]["median"]
+        if after > before * (1 + max_regression):
+            regressions.append(f"{name}: {before:.0f} ms -> {after:.0f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure CLI startup time for --help and every command')
+    parser.add_argument('--runs', type=int, default=10, help='Timed runs per case')
+    parser.add_argument('--baseline', type=str, help='Earlier report to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='Allowed growth of a median over the baseline, as a fraction')
+    parser.add_argument('--output', type=str, help='Write the JSON report to this file as well as stdout')
+    args = parser.parse_args()
+    
+    results = bench_startup(args.runs)
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "baseline_interpreter_ms": _summarize([_run(["-c", "pass"], os.environ)[0] * 1000 for _ in range(args.runs)]),
+        "results": results
+    }
+    
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    
+    # Fail when a command that shouldn't need the SDK imports it, or startup got slower
+    failures = [f"{name} imports {', '.join(result['heavy_imports'])}" for name, result in results.items() if result["heavy_imports"]]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare(results, json.load(f), args.max_regression)
+    for failure in failures:
+        print(f"Startup regression: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
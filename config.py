@@ -1,9 +1,23 @@
 # config.py
 import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+def _find_dotenv():
+    """Find .env the way load_dotenv() does: in this file's directory or the nearest parent that has one."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+# Load environment variables; python-dotenv is only imported when there is a .env file to read
+_dotenv_path = _find_dotenv()
+if _dotenv_path:
+    from dotenv import load_dotenv
+    load_dotenv(_dotenv_path)
 
 # API settings
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
@@ -12,4 +26,113 @@ CLAUDE_MODEL = "claude-3-7-sonnet-20250219"  # Latest Claude model
 # App settings
 APP_NAME = "Roadmap Generator"
 APP_VERSION = "1.0.0"
-MAX_TOKENS = 10000  # Increased to ensure we can get 6000-8000 token roadmaps
\ No newline at end of file
+MAX_TOKENS = 10000  # Increased to ensure we can get 6000-8000 token roadmaps
+THINKING_BUDGET_TOKENS = 10000  # Extended thinking budget for roadmap generation and reflection
+FAST_MODEL = os.getenv("ROADMAP_FAST_MODEL", "claude-3-5-haiku-20241022")  # Used for the questions in the fast profile
+
+# Named profiles trading quality for latency: the model, max_tokens and thinking budget (None
+# disables thinking) of each stage. Parallel skeleton and phase calls use the "initial" settings
+# and patch-mode reflection the "reflection" ones. The thinking budget must stay below max_tokens.
+# Select one with --profile or ROADMAP_PROFILE
+PROFILES = {
+    "fast": {
+        "initial": {"model": CLAUDE_MODEL, "max_tokens": 10000, "thinking_budget": None},
+        "questions": {"model": FAST_MODEL, "max_tokens": 1024, "thinking_budget": None},
+        "reflection": {"model": CLAUDE_MODEL, "max_tokens": 10000, "thinking_budget": None}
+    },
+    "balanced": {
+        "initial": {"model": CLAUDE_MODEL, "max_tokens": 16000, "thinking_budget": 6000},
+        "questions": {"model": CLAUDE_MODEL, "max_tokens": 2048, "thinking_budget": None},
+        "reflection": {"model": CLAUDE_MODEL, "max_tokens": 16000, "thinking_budget": 6000}
+    },
+    "thorough": {
+        "initial": {"model": CLAUDE_MODEL, "max_tokens": MAX_TOKENS + THINKING_BUDGET_TOKENS, "thinking_budget": THINKING_BUDGET_TOKENS},
+        "questions": {"model": CLAUDE_MODEL, "max_tokens": 4096, "thinking_budget": 2048},
+        "reflection": {"model": CLAUDE_MODEL, "max_tokens": MAX_TOKENS + THINKING_BUDGET_TOKENS, "thinking_budget": THINKING_BUDGET_TOKENS}
+    }
+}
+PROFILE = os.getenv("ROADMAP_PROFILE", "balanced").lower()
+
+# HTTP connection pool shared by every stage and concurrent job
+HTTP_MAX_CONNECTIONS = int(os.getenv("ROADMAP_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("ROADMAP_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("ROADMAP_HTTP_KEEPALIVE_EXPIRY", "60"))  # seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv("ROADMAP_HTTP_CONNECT_TIMEOUT", "10"))  # seconds
+HTTP_READ_TIMEOUT = float(os.getenv("ROADMAP_HTTP_READ_TIMEOUT", "600"))  # long enough for thinking-enabled streams
+HTTP_PREWARM = os.getenv("ROADMAP_HTTP_PREWARM", "0").lower() in ("1", "true", "yes")
+
+# Client-side request pacing and retries; a per-minute budget of 0 disables that limit
+RATE_LIMIT_REQUESTS_PER_MINUTE = int(os.getenv("ROADMAP_RATE_LIMIT_RPM", "50"))
+RATE_LIMIT_TOKENS_PER_MINUTE = int(os.getenv("ROADMAP_RATE_LIMIT_TPM", "200000"))  # estimated as prompt size + max_tokens
+RETRY_MAX_ATTEMPTS = int(os.getenv("ROADMAP_RETRY_MAX_ATTEMPTS", "6"))
+RETRY_BASE_DELAY = float(os.getenv("ROADMAP_RETRY_BASE_DELAY", "1"))  # seconds, doubled on every retry
+RETRY_MAX_DELAY = float(os.getenv("ROADMAP_RETRY_MAX_DELAY", "60"))  # seconds
+
+# Send the idea and initial roadmap as a cached prefix shared by the question and reflection calls
+PROMPT_CACHING = os.getenv("ROADMAP_PROMPT_CACHING", "1").lower() not in ("0", "false", "no")
+
+# Local check of every request's estimated input size: above the budget, "warn" reports
+# it and sends it anyway, "trim" cuts the middle out of its largest part; 0 disables it
+PROMPT_TOKEN_BUDGET = int(os.getenv("ROADMAP_PROMPT_TOKEN_BUDGET", "150000"))
+PROMPT_OVER_BUDGET_ACTIONS = ("warn", "trim")
+PROMPT_OVER_BUDGET = os.getenv("ROADMAP_PROMPT_OVER_BUDGET", "warn").lower()
+if PROMPT_OVER_BUDGET not in PROMPT_OVER_BUDGET_ACTIONS:
+    raise ValueError(f"ROADMAP_PROMPT_OVER_BUDGET must be one of {', '.join(PROMPT_OVER_BUDGET_ACTIONS)}, not {PROMPT_OVER_BUDGET!r}")
+
+# Initial generation mode: "single" streams the whole roadmap, "parallel" writes a skeleton
+# and then every phase in its own concurrent request
+GENERATION_MODES = ("single", "parallel")
+GENERATION_MODE = os.getenv("ROADMAP_GENERATION_MODE", "single").lower()
+if GENERATION_MODE not in GENERATION_MODES:
+    raise ValueError(f"ROADMAP_GENERATION_MODE must be one of {', '.join(GENERATION_MODES)}, not {GENERATION_MODE!r}")
+
+# Reflection mode: "full" regenerates the whole roadmap, "patch" asks only for section edits
+REFLECTION_MODES = ("full", "patch")
+REFLECTION_MODE = os.getenv("ROADMAP_REFLECTION_MODE", "full").lower()
+if REFLECTION_MODE not in REFLECTION_MODES:
+    raise ValueError(f"ROADMAP_REFLECTION_MODE must be one of {', '.join(REFLECTION_MODES)}, not {REFLECTION_MODE!r}")
+
+# Non-interactive runs (--no-interactive) refine the initial roadmap by self-critique: at most
+# this many passes, stopping early once a pass changes less than this share of the roadmap (0-1)
+REFINE_MAX_PASSES = int(os.getenv("ROADMAP_REFINE_MAX_PASSES", "2"))
+REFINE_MIN_CHANGE = float(os.getenv("ROADMAP_REFINE_MIN_CHANGE", "0.05"))
+
+# Pipelined mode: start question generation once this much of the initial roadmap has streamed in
+PIPELINE_QUESTIONS_AFTER_CHARS = int(os.getenv("ROADMAP_PIPELINE_QUESTIONS_AFTER_CHARS", "12000"))
+
+# Append per-stage telemetry for every run to this JSON lines file (see --metrics-file)
+METRICS_FILE = os.getenv("ROADMAP_METRICS_FILE") or None
+
+# Checkpointed runs: each stage's output is saved here so an interrupted run can be resumed
+RUNS_DIR = os.getenv("ROADMAP_RUNS_DIR", os.path.join(os.path.expanduser("~"), ".local", "share", "roadmap-generator", "runs"))
+RUNS_MAX_AGE_DAYS = float(os.getenv("ROADMAP_RUNS_MAX_AGE_DAYS", "14"))  # default for the prune-runs command
+
+# Local HTTP API (serve command): jobs run at once, jobs allowed to wait before submissions
+# are refused with 503, and how long a job waits for an answer before skipping the question
+SERVE_WORKERS = int(os.getenv("ROADMAP_SERVE_WORKERS", "4"))
+SERVE_MAX_QUEUE = int(os.getenv("ROADMAP_SERVE_MAX_QUEUE", "100"))
+SERVE_ANSWER_TIMEOUT = float(os.getenv("ROADMAP_SERVE_ANSWER_TIMEOUT", "1800"))  # seconds
+JOBS_DIR = os.getenv("ROADMAP_JOBS_DIR", os.path.join(os.path.expanduser("~"), ".local", "share", "roadmap-generator", "jobs"))
+JOBS_MAX_AGE_DAYS = float(os.getenv("ROADMAP_JOBS_MAX_AGE_DAYS", "7"))  # finished jobs are forgotten after this; 0 keeps them
+
+# Reuse the initial roadmap of a previously generated idea when a new idea is this similar (0-1).
+# ROADMAP_IDEA_REUSE is "ask" (offer the match), "auto" (reuse it without asking) or "off"
+IDEA_REUSE_MODES = ("ask", "auto", "off")
+IDEA_REUSE = os.getenv("ROADMAP_IDEA_REUSE", "ask").lower()
+if IDEA_REUSE not in IDEA_REUSE_MODES:
+    raise ValueError(f"ROADMAP_IDEA_REUSE must be one of {', '.join(IDEA_REUSE_MODES)}, not {IDEA_REUSE!r}")
+IDEA_REUSE_THRESHOLD = float(os.getenv("ROADMAP_IDEA_REUSE_THRESHOLD", "0.6"))
+IDEAS_DIR = os.getenv("ROADMAP_IDEAS_DIR", os.path.join(os.path.expanduser("~"), ".local", "share", "roadmap-generator", "ideas"))
+
+# Versioned roadmap store: every initial, customized and regenerated roadmap of an idea,
+# deduplicated by section and delta-compressed (see the history, diff and checkout commands)
+STORE_DIR = os.getenv("ROADMAP_STORE_DIR", os.path.join(os.path.expanduser("~"), ".local", "share", "roadmap-generator", "store"))
+STORE_VERSIONS = os.getenv("ROADMAP_STORE_VERSIONS", "1").lower() not in ("0", "false", "no")
+
+# Saved answer profiles for --answers runs, which fold known answers into a single generation request
+ANSWERS_DIR = os.getenv("ROADMAP_ANSWERS_DIR", os.path.join(os.path.expanduser("~"), ".config", "roadmap-generator", "answers"))
+
+# Response cache settings
+CACHE_DIR = os.getenv("ROADMAP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "roadmap-generator"))
+CACHE_MAX_BYTES = int(os.getenv("ROADMAP_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))  # 200 MB
+CACHE_MAX_AGE_DAYS = float(os.getenv("ROADMAP_CACHE_MAX_AGE_DAYS", "30"))
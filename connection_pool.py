@@ -0,0 +1,150 @@
+# connection_pool.py
+import asyncio
+import threading
+import weakref
+import anthropic
+import httpx
+from config import (
+    ANTHROPIC_API_KEY, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+)
+
+class ConnectionStats:
+    """
+    Count requests and the distinct connections that served them.
+    
+    Every response is tagged with the network stream it arrived on; a stream seen
+    before means the request reused a pooled keep-alive connection.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.seen_streams = weakref.WeakSet()
+    
+    def record(self, response):
+        stream = response.extensions.get("network_stream")
+        with self.lock:
+            self.requests += 1
+            if stream is None:
+                return
+            try:
+                if stream in self.seen_streams:
+                    return
+                self.seen_streams.add(stream)
+            except TypeError:
+                # Streams that can't be weakly referenced are counted as new connections
+                pass
+            self.connections += 1
+    
+    @property
+    def reused(self):
+        return max(0, self.requests - self.connections)
+    
+    def summary(self):
+        return f"HTTP connections: {self.requests} request(s) over {self.connections} connection(s), {self.reused} reused"
+
+stats = ConnectionStats()
+
+# One event loop for the whole process, running in a background thread, so the
+# pre-warmed connection and every stage and job share the same async pool
+_loop = None
+_loop_lock = threading.Lock()
+_sync_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+def _limits():
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+def _timeout():
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+def get_loop():
+    """Return the process-wide event loop, starting its thread on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="roadmap-event-loop", daemon=True)
+            thread.start()
+    return _loop
+
+def run(coroutine):
+    """
+    Run a coroutine on the process-wide event loop and wait for its result.
+    
+    Used instead of asyncio.run so the async connection pool outlives any one command.
+    """
+    future = asyncio.run_coroutine_threadsafe(coroutine, get_loop())
+    try:
+        return future.result()
+    except KeyboardInterrupt:
+        future.cancel()
+        raise
+
+def get_sync_client():
+    """Return the process-wide anthropic.Anthropic client."""
+    global _sync_client
+    with _loop_lock:
+        if _sync_client is None:
+            http_client = httpx.Client(
+                limits=_limits(),
+                timeout=_timeout(),
+                event_hooks={"response": [stats.record]}
+            )
+            # Retries are handled by rate_limiter's scheduler, which also resumes broken streams
+            _sync_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY, http_client=http_client, max_retries=0)
+    return _sync_client
+
+def get_async_client():
+    """
+    Return the anthropic.AsyncAnthropic client for the running event loop.
+    
+    Async connections belong to the loop that opened them, so there is one client per
+    loop; outside a running loop the process-wide loop's client is returned.
+    """
+    return _get_async_clients()[0]
+
+def _get_async_clients():
+    """Return (anthropic client, httpx client) for the running or process-wide loop."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = get_loop()
+    
+    with _loop_lock:
+        clients = _async_clients.get(loop)
+        if clients is None:
+            async def record(response):
+                stats.record(response)
+            
+            http_client = httpx.AsyncClient(
+                limits=_limits(),
+                timeout=_timeout(),
+                event_hooks={"response": [record]}
+            )
+            client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY, http_client=http_client, max_retries=0)
+            clients = (client, http_client)
+            _async_clients[loop] = clients
+    return clients
+
+async def _prewarm():
+    client, http_client = _get_async_clients()
+    try:
+        # Any request opens the TCP/TLS connection; the response itself doesn't matter
+        await http_client.head(str(client.base_url))
+    except Exception:
+        pass
+
+def prewarm():
+    """
+    Open a pooled connection to the API in the background.
+    
+    Returns immediately; the connection is ready for the first real request if the
+    CLI is still busy (printing the banner, parsing input) when the handshake completes.
+    """
+    return asyncio.run_coroutine_threadsafe(_prewarm(), get_loop())
@@ -0,0 +1,216 @@
+# idea_index.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from config import IDEAS_DIR, IDEA_REUSE_THRESHOLD
+
+INDEX_VERSION = 1
+# 60 MinHash values split into 20 LSH bands of 3: ideas sharing any band become candidates.
+# With this banding a pair at 0.6 similarity is a candidate 99% of the time, at 0.2 only 15%.
+NUM_PERM = 60
+BANDS = 20
+ROWS = NUM_PERM // BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+
+WORD_PATTERN = re.compile(r'[a-z0-9+#]+(?:-[a-z0-9+#]+)*')
+# Short hyphenated prefixes that are part of the word: to-do, e-commerce, e-mail
+JOINED_PREFIXES = {"to", "e", "re", "co", "pre", "multi", "non"}
+# Words that say nothing about what the app does
+FILLER_WORDS = {
+    "a", "an", "and", "app", "application", "are", "as", "at", "based", "be", "build", "by",
+    "can", "create", "for", "from", "has", "i", "in", "is", "it", "its", "let", "lets", "like",
+    "make", "me", "my", "of", "on", "or", "our", "simple", "so", "some", "that", "the", "their",
+    "them", "this", "to", "tool", "want", "we", "which", "who", "will", "with", "would", "you", "your"
+}
+
+def _seeds():
+    """Fixed (a, b) pairs for the NUM_PERM hash functions h(x) = (a * x + b) mod p."""
+    seeds = []
+    for index in range(NUM_PERM):
+        digest = hashlib.blake2b(f"minhash-{index}".encode("ascii"), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "little") % MERSENNE_PRIME or 1
+        b = int.from_bytes(digest[8:], "little") % MERSENNE_PRIME
+        seeds.append((a, b))
+    return seeds
+
+SEEDS = _seeds()
+
+def shingles(idea):
+    """
+    Normalize an idea description into its set of word shingles.
+
+    Words are lowercased, filler words dropped and plurals folded ("reminders" and
+    "reminder" match). Hyphenated words are split into their parts, except for short
+    prefixes like "to-do". Single words are used rather than word n-grams, because
+    rewordings of the same idea mostly change word order, which n-grams would punish.
+    """
+    words = set()
+    for match in WORD_PATTERN.findall(idea.lower()):
+        parts = match.split("-")
+        if parts[0] in JOINED_PREFIXES and len(parts) == 2:
+            parts = ["".join(parts)]
+        for word in parts:
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            if word and word not in FILLER_WORDS:
+                words.add(word)
+    return words
+
+def minhash(words):
+    """MinHash signature of a shingle set: the minimum of each hash function over the set."""
+    hashes = [int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little") for word in words]
+    if not hashes:
+        return [MERSENNE_PRIME] * NUM_PERM
+    return [min((a * value + b) % MERSENNE_PRIME for value in hashes) for a, b in SEEDS]
+
+def jaccard(first, second):
+    """Jaccard similarity of two shingle sets."""
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+def _band_keys(signature):
+    return [f"{band}:" + ",".join(str(value) for value in signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+class IdeaMatch:
+    """A previously generated idea similar to the one being generated, with its roadmap."""
+    def __init__(self, entry_id, idea, roadmap, similarity):
+        self.id = entry_id
+        self.idea = idea
+        self.roadmap = roadmap
+        self.similarity = similarity
+
+class IdeaIndex:
+    """
+    MinHash/LSH index of previously generated ideas and their initial roadmaps.
+
+    find() returns the most similar stored idea at or above the similarity
+    threshold, so its roadmap can be reused instead of paying for another initial
+    generation. LSH only narrows the search to candidate ideas; candidates are then
+    scored by the exact Jaccard similarity of their shingles. Matches are only
+    offered for roadmaps generated by the same model and profile, since a fast
+    profile's roadmap is shorter and unplanned next to a thorough one's.
+
+    The index is <ideas_dir>/index.json and each roadmap is <ideas_dir>/<id>.md.
+
+    Args:
+        ideas_dir: Where ideas and roadmaps are stored (defaults to IDEAS_DIR)
+        threshold: Minimum similarity (0-1) for a stored idea to be reused
+        confirm: Optional callable receiving an IdeaMatch and returning True to reuse
+            it; without one every match is reused automatically
+    """
+
+    def __init__(self, ideas_dir=None, threshold=IDEA_REUSE_THRESHOLD, confirm=None):
+        self.ideas_dir = ideas_dir or IDEAS_DIR
+        self.index_path = os.path.join(self.ideas_dir, "index.json")
+        self.threshold = threshold
+        self.confirm = confirm
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.declined = 0
+        self._entries = None
+        self._buckets = None
+
+    def _load(self):
+        """Read the index and rebuild the LSH buckets from the stored signatures."""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entries = data["entries"] if data.get("version") == INDEX_VERSION else {}
+        except (OSError, ValueError, KeyError):
+            entries = {}
+
+        buckets = {}
+        for entry_id, entry in entries.items():
+            for key in _band_keys(entry["signature"]):
+                buckets.setdefault(key, []).append(entry_id)
+        self._entries, self._buckets = entries, buckets
+
+    def find(self, idea, model=None, profile=None):
+        """
+        Return the IdeaMatch most similar to idea, or None if none reaches the threshold.
+
+        Args:
+            idea: The idea description about to be generated
+            model: Only match roadmaps generated by this model, if given
+            profile: Only match roadmaps generated with this model profile, if given
+        """
+        words = shingles(idea)
+        with self.lock:
+            if self._entries is None:
+                self._load()
+            candidates = {entry_id for key in _band_keys(minhash(words)) for entry_id in self._buckets.get(key, ())}
+
+            best_id, best_similarity = None, -1.0
+            for entry_id in sorted(candidates):
+                entry = self._entries[entry_id]
+                if model is not None and entry.get("model") != model:
+                    continue
+                if profile is not None and entry.get("profile") != profile:
+                    continue
+                similarity = jaccard(words, set(entry["shingles"]))
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+        if best_id is not None and best_similarity >= self.threshold:
+            try:
+                with open(os.path.join(self.ideas_dir, f"{best_id}.md"), "r", encoding="utf-8") as f:
+                    roadmap = f.read()
+                return IdeaMatch(best_id, self._entries[best_id]["idea"], roadmap, best_similarity)
+            except OSError:
+                pass
+        self.misses += 1
+        return None
+
+    def accept(self, match):
+        """Ask the confirm callback whether to reuse match, and count the outcome."""
+        if self.confirm is not None and not self.confirm(match):
+            self.declined += 1
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def add(self, idea, roadmap, model=None, profile=None):
+        """Store a freshly generated roadmap for idea so later similar ideas can reuse it."""
+        words = shingles(idea)
+        if not words:
+            return
+        entry_id = uuid.uuid4().hex[:12]
+        os.makedirs(self.ideas_dir, exist_ok=True)
+        _write_atomic(os.path.join(self.ideas_dir, f"{entry_id}.md"), roadmap)
+
+        with self.lock:
+            # Reload first so entries added by other processes since our last read are kept
+            self._load()
+            self._entries[entry_id] = {
+                "idea": idea,
+                "shingles": sorted(words),
+                "signature": minhash(words),
+                "model": model,
+                "profile": profile,
+                "created": time.time()
+            }
+            for key in _band_keys(self._entries[entry_id]["signature"]):
+                self._buckets.setdefault(key, []).append(entry_id)
+            _write_atomic(self.index_path, json.dumps({"version": INDEX_VERSION, "entries": self._entries}))
+
+    def stats_message(self):
+        """Human-readable summary of similar-idea reuse for this run."""
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        message = f"Similar ideas: {self.hits} roadmap(s) reused, {self.misses} generated ({rate:.0%} hit rate)"
+        if self.declined:
+            message += f" ({self.declined} match(es) declined)"
+        return message
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -1,8 +1,10 @@
 import sys
 import time
+import asyncio
+import shutil
 import threading
-import itertools
 from enum import Enum
+import telemetry
 
 class AnimationType(Enum):
     SPINNER = 1
@@ -10,127 +12,170 @@ class AnimationType(Enum):
     BAR = 3
     TYPING = 4
 
+SPINNER_FRAMES = ['-', '/', '|', '\\']
+# Redraw at most this often, however fast deltas arrive
+REDRAW_INTERVAL = 0.1
+# While no deltas arrive (e.g. before the first token), the elapsed time is refreshed this often
+IDLE_REFRESH_INTERVAL = 0.5
+# Streaming time needed before the token rate (and so the time left) means anything
+MIN_RATE_WINDOW = 0.5
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
 class LoadingAnimation:
-    def __init__(self, message="Processing", animation_type=AnimationType.SPINNER, max_time=None):
+    """
+    One-line progress display for a pipeline stage, driven by the stream itself.
+    
+    While running, it follows the telemetry progress events of the matching stages:
+    every streamed delta redraws the line with the tokens received, the token rate,
+    the elapsed time and the time left if the response used all of its max_tokens
+    (an upper bound). There is no animation thread: the stream does the redrawing,
+    throttled to REDRAW_INTERVAL, and inside an event loop a call_later timer keeps
+    the elapsed time moving while waiting for the first token. stop() is immediate.
+    
+    The animation type only changes the indicator: a spinner or dots advancing with
+    every redraw, a bar filled to the share of max_tokens used, or the message typed
+    out as tokens arrive. With animation_type None nothing is shown, e.g. when the
+    pipeline runs in a server.
+    """
+    def __init__(self, message="Processing", animation_type=AnimationType.SPINNER, stages=None, output=None):
+        """
+        Args:
+            message: Text shown before the progress figures
+            animation_type: Indicator style, or None to show nothing
+            stages: Stage names (or prefixes, e.g. "phase_") whose calls count toward
+                this display; None follows every call
+            output: Stream to draw on; defaults to sys.stdout
+        """
         self.message = message
         self.animation_type = animation_type
-        self.max_time = max_time
+        self.stages = tuple(stages) if stages else None
+        self.output = output or sys.stdout
         self.is_running = False
-        self.thread = None
-    
-    def _spinner_animation(self):
-        spinner = itertools.cycle(['-', '/', '|', '\\'])
-        while self.is_running:
-            if self.message:
-                sys.stdout.write(f"\r{self.message} {next(spinner)} ")
-            else:
-                sys.stdout.write(f"\r{next(spinner)} ")
-            sys.stdout.flush()
-            time.sleep(0.1)
-    
-    def _dots_animation(self):
-        dots = 0
-        max_dots = 3
-        while self.is_running:
-            dots = (dots + 1) % (max_dots + 1)
-            if self.message:
-                sys.stdout.write(f"\r{self.message}" + "." * dots + " " * (max_dots - dots))
-            else:
-                sys.stdout.write("\r" + "." * dots + " " * (max_dots - dots))
-            sys.stdout.flush()
-            time.sleep(0.5)
-    
-    def _bar_animation(self):
-        bar_width = 20
-        position = 0
-        direction = 1  # 1 for right, -1 for left
-        
-        while self.is_running:
-            # Update position
-            position += direction
-            if position >= bar_width - 1:
-                direction = -1
-            elif position <= 0:
-                direction = 1
-                
-            # Draw bar
-            bar = "[" + " " * position + "=" + " " * (bar_width - position - 1) + "]"
-            if self.message:
-                sys.stdout.write(f"\r{self.message} {bar}")
-            else:
-                sys.stdout.write(f"\r{bar}")
-            sys.stdout.flush()
-            time.sleep(0.1)
-    
-    def _typing_animation(self):
-        original_message = self.message
-        if not original_message:
-            # If no message, use a simple dot animation instead
-            return self._dots_animation()
-            
-        while self.is_running:
-            for i in range(len(original_message) + 1):
-                if not self.is_running:
-                    break
-                sys.stdout.write(f"\r{original_message[:i]}")
-                sys.stdout.flush()
-                time.sleep(0.1)
-            time.sleep(0.7)  # Pause at the end
-            if self.is_running:
-                sys.stdout.write("\r" + " " * len(original_message))
-                sys.stdout.flush()
-                time.sleep(0.3)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.frame = 0
+        self.started = None
+        self.last_draw = 0.0
+        self.line_length = 0
+        self.loop = None
+        self.timer = None
     
     def start(self):
+        if self.animation_type is None:
+            return
         self.is_running = True
-        
-        if self.animation_type == AnimationType.SPINNER:
-            self.thread = threading.Thread(target=self._spinner_animation)
-        elif self.animation_type == AnimationType.DOTS:
-            self.thread = threading.Thread(target=self._dots_animation)
-        elif self.animation_type == AnimationType.BAR:
-            self.thread = threading.Thread(target=self._bar_animation)
-        elif self.animation_type == AnimationType.TYPING:
-            self.thread = threading.Thread(target=self._typing_animation)
-        
-        self.thread.daemon = True
-        self.thread.start()
-        
-        if self.max_time:
-            time.sleep(self.max_time)
-            self.stop()
+        self.started = time.perf_counter()
+        telemetry.add_progress_listener(self.update)
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None
+        self._draw(time.perf_counter())
+        self._schedule_refresh()
     
     def stop(self):
+        if not self.is_running:
+            return
         self.is_running = False
-        if self.thread:
-            self.thread.join(timeout=1)
-        # Clear the line
-        sys.stdout.write("\r" + " " * (len(self.message) + 10))
-        sys.stdout.write("\r")
-        sys.stdout.flush()
-
-# Example usage
-if __name__ == "__main__":
-    print("Starting demo of loading animations...")
+        telemetry.remove_progress_listener(self.update)
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        with self.lock:
+            # Clear the line
+            self.output.write("\r" + " " * self.line_length + "\r")
+            self.output.flush()
+            self.line_length = 0
     
-    # Spinner demo
-    print("\nSpinner animation:")
-    spinner = LoadingAnimation("Generating roadmap based on your idea", AnimationType.SPINNER, 3)
-    spinner.start()
+    def update(self, metrics):
+        """Progress listener: record a call's latest metrics and redraw if it's time to."""
+        if not self.is_running or (self.stages and not metrics.stage.startswith(self.stages)):
+            return
+        self.calls[id(metrics)] = metrics
+        now = time.perf_counter()
+        if now - self.last_draw >= REDRAW_INTERVAL:
+            self._draw(now)
     
-    # Dots demo
-    print("\nDots animation:")
-    dots = LoadingAnimation("Starting reflection process to improve the roadmap", AnimationType.DOTS, 3)
-    dots.start()
+    def _schedule_refresh(self):
+        if self.loop is not None and self.is_running:
+            self.timer = self.loop.call_later(IDLE_REFRESH_INTERVAL, self._refresh)
     
-    # Bar demo
-    print("\nBar animation:")
-    bar = LoadingAnimation("Processing your request", AnimationType.BAR, 3)
-    bar.start()
+    def _refresh(self):
+        now = time.perf_counter()
+        if self.is_running and now - self.last_draw >= IDLE_REFRESH_INTERVAL:
+            self._draw(now)
+        self._schedule_refresh()
     
-    # Typing demo
-    print("\nTyping animation:")
-    typing = LoadingAnimation("Generating roadmap based on your idea", AnimationType.TYPING, 5)
-    typing.start()
+    def _progress(self, now):
+        """Return (tokens, tokens_per_second, seconds_left) over the followed calls; rate and time left may be None."""
+        calls = list(self.calls.values())
+        tokens = sum(metrics.streamed_tokens for metrics in calls)
+        first_deltas = [metrics.first_delta for metrics in calls if metrics.first_delta is not None]
+        if not tokens or not first_deltas or now - min(first_deltas) < MIN_RATE_WINDOW:
+            return tokens, None, None
+        rate = tokens / (now - min(first_deltas))
+        active = [metrics for metrics in calls if metrics.end is None]
+        remaining = sum(max(0, metrics.max_tokens - metrics.streamed_tokens) for metrics in active)
+        return tokens, rate, remaining / rate if active else None
     
-    print("\nAnimation demos complete!") 
\ No newline at end of file
+    def _indicator(self, tokens):
+        self.frame += 1
+        if self.animation_type == AnimationType.DOTS:
+            dots = self.frame % 4
+            return f"{self.message}{'.' * dots}{' ' * (3 - dots)}"
+        if self.animation_type == AnimationType.BAR:
+            max_tokens = sum(metrics.max_tokens for metrics in self.calls.values()) or 1
+            filled = min(20, int(20 * tokens / max_tokens))
+            return f"{self.message} [{'=' * filled}{' ' * (20 - filled)}]"
+        if self.animation_type == AnimationType.TYPING:
+            return self.message[:min(len(self.message), self.frame * 4)]
+        return f"{self.message} {SPINNER_FRAMES[self.frame % len(SPINNER_FRAMES)]}"
+    
+    def _draw(self, now):
+        with self.lock:
+            if not self.is_running:
+                return
+            self.last_draw = now
+            tokens, rate, seconds_left = self._progress(now)
+            elapsed = _format_duration(now - self.started)
+            if not tokens:
+                figures = f"waiting for the first token · {elapsed}"
+            elif rate is None:
+                figures = f"{tokens:,} tokens · {elapsed}"
+            else:
+                figures = f"{tokens:,} tokens · {rate:.0f} tok/s · {elapsed}"
+                if seconds_left is not None:
+                    figures += f" · up to {_format_duration(seconds_left)} left"
+            # Stay on one terminal line so the carriage return can redraw it
+            line = f"{self._indicator(tokens)} {figures}"[:shutil.get_terminal_size().columns - 1]
+            padding = " " * max(0, self.line_length - len(line))
+            self.output.write(f"\r{line}{padding}")
+            self.output.flush()
+            self.line_length = len(line)
+
+# Example usage
+if __name__ == "__main__":
+    from telemetry import StageMetrics
+
+    class Delta:
+        def __init__(self, text):
+            self.type = "content_block_delta"
+            self.delta = type("TextDelta", (), {"text": text})()
+
+    print("Starting demo of loading animations on a simulated stream...")
+    for animation_type in AnimationType:
+        print(f"\n{animation_type.name.title()} animation:")
+        animation = LoadingAnimation("Generating roadmap based on your idea", animation_type)
+        animation.start()
+        metrics = StageMetrics("initial", "demo", 2000, None)
+        time.sleep(0.5)
+        for _ in range(150):
+            metrics.observe(Delta("word " * 8))
+            time.sleep(0.02)
+        metrics.finish()
+        animation.stop()
+
+    print("\nAnimation demos complete!")
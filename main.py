@@ -1,16 +1,51 @@
 # main.py
 import typer
-from roadmap_generator import generate_roadmap, generate_roadmap_with_questions
-import asyncio
-from rich.console import Console
-from rich.markdown import Markdown
-from config import APP_NAME, APP_VERSION
-from loading_animation import LoadingAnimation, AnimationType
-import threading
+from config import APP_NAME, APP_VERSION, HTTP_PREWARM, METRICS_FILE, RUNS_MAX_AGE_DAYS, REFLECTION_MODE, REFLECTION_MODES, REFINE_MAX_PASSES, REFINE_MIN_CHANGE, GENERATION_MODE, GENERATION_MODES, IDEA_REUSE, IDEA_REUSE_MODES, PROFILE, PROFILES, SERVE_WORKERS, SERVE_MAX_QUEUE, JOBS_MAX_AGE_DAYS, STORE_VERSIONS
 import os
+import sys
+import time
+
+# Only typer and config are imported at startup. Everything else, above all the
+# pipeline with the anthropic SDK and its HTTP stack, is imported inside the
+# commands that need it, so --help, argument errors and the local commands
+# (runs, search, show) start fast. benchmarks/startup.py guards this.
+
+class LazyConsole:
+    """rich Console created on first use, so paths that print nothing never import rich."""
+    def __init__(self):
+        self._console = None
+    
+    def __getattr__(self, name):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console()
+        return getattr(self._console, name)
 
 app = typer.Typer()
-console = Console()
+console = LazyConsole()
+
+@app.callback()
+def cli(
+    ctx: typer.Context,
+    prewarm: bool = typer.Option(HTTP_PREWARM, help="Open the API connection at startup, before the first request needs it"),
+    debug: bool = typer.Option(False, "--debug", help="Print connection reuse statistics when the command finishes"),
+    metrics_file: str = typer.Option(METRICS_FILE, help="Append per-stage latency and token metrics to this file as JSON lines")
+):
+    """Generate detailed coding roadmaps with Claude."""
+    if metrics_file:
+        import telemetry
+        telemetry.add_hook(telemetry.JsonLinesWriter(metrics_file))
+    if prewarm:
+        import connection_pool
+        connection_pool.prewarm()
+    if debug:
+        def report_connection_stats():
+            import connection_pool
+            from single_flight import flights, async_flights
+            console.print(f"[dim]{connection_pool.stats.summary()}[/dim]")
+            if flights.coalesced or async_flights.coalesced:
+                console.print(f"[dim]Coalesced requests: {flights.coalesced + async_flights.coalesced} call(s) shared an identical request already in flight[/dim]")
+        ctx.call_on_close(report_connection_stats)
 
 def status_callback(message):
     """Callback function to receive status updates from the roadmap generator."""
@@ -19,6 +54,8 @@ def status_callback(message):
     # Don't print "Starting reflection process" since animation will show this
     if message == "Starting reflection process with your input...":
         return  # Skip this message as it's shown in the animation
+    elif "⚡" in message or "⏱" in message:
+        console.print(f"[bold cyan]{message}[/bold cyan]")
     elif "✅" in message:
         console.print(f"[bold green]{message}[/bold green]")
     elif "Starting" in message:
@@ -26,128 +63,798 @@ def status_callback(message):
     else:
         console.print(f"[yellow]{message}[/yellow]")
 
+def animation_type_for(animation):
+    """Map an --animation name to its AnimationType, defaulting to the spinner."""
+    from loading_animation import AnimationType
+    animation_map = {
+        'spinner': AnimationType.SPINNER,
+        'dots': AnimationType.DOTS,
+        'bar': AnimationType.BAR,
+        'typing': AnimationType.TYPING
+    }
+    return animation_map.get(animation, AnimationType.SPINNER)
+
+def build_cache(no_cache, cache_dir):
+    """Create the response cache for a command, or None when caching is disabled."""
+    if no_cache:
+        return None
+    from response_cache import ResponseCache
+    return ResponseCache(cache_dir=cache_dir)
+
+def report_cache_stats(cache, ideas=None):
+    """Print how many API calls were replayed from the response cache and how many roadmaps were reused."""
+    if cache is not None and (cache.hits or cache.misses):
+        console.print(f"[cyan]{cache.stats_message()}[/cyan]")
+    if ideas is not None and (ideas.hits or ideas.misses):
+        console.print(f"[cyan]{ideas.stats_message()}[/cyan]")
+
+def check_choice(value, choices, option):
+    """Return an option's value normalized, or exit with an error if it isn't one of choices."""
+    if value.lower() not in choices:
+        console.print(f"[bold red]Error: invalid {option} '{value}'; choose from {', '.join(choices)}[/bold red]")
+        raise typer.Exit(code=1)
+    return value.lower()
+
+def build_idea_index(reuse_similar):
+    """Create the similar-idea index for a reuse mode (ask, auto or off), or None when off."""
+    if reuse_similar not in ("ask", "auto"):
+        return None
+    from idea_index import IdeaIndex
+    return IdeaIndex(confirm=confirm_reuse if reuse_similar == "ask" else None)
+
+def build_store():
+    """Create the versioned roadmap store, or None when ROADMAP_STORE_VERSIONS is off."""
+    if not STORE_VERSIONS:
+        return None
+    from roadmap_store import RoadmapStore
+    return RoadmapStore()
+
+def confirm_reuse(match):
+    """Offer the roadmap of a similar earlier idea; never reuse without asking when there is no terminal."""
+    if not sys.stdin.isatty():
+        return False
+    from rich.markup import escape
+    console.print(f"[cyan]A roadmap was already generated for a similar idea ({match.similarity:.0%} similar):[/cyan] {escape(match.idea)}")
+    return typer.confirm("Use it as the initial roadmap instead of generating a new one?", default=True)
+
+def index_saved_roadmap(file_path):
+    """Add a freshly written roadmap to its directory's search index."""
+    from roadmap_index import RoadmapIndex
+    try:
+        RoadmapIndex(os.path.dirname(file_path) or '.').add_file(file_path)
+    except OSError as e:
+        console.print(f"[yellow]Could not update the roadmap index: {e}[/yellow]")
+
+PROFILE_HELP = f"Model profile setting each stage's model, max tokens and thinking budget: {', '.join(PROFILES)}"
+
+def check_profile(profile):
+    """Return the profile name normalized, or exit with an error if there is no such profile."""
+    if profile.lower() not in PROFILES:
+        console.print(f"[bold red]Error: unknown profile '{profile}'; choose from {', '.join(PROFILES)}[/bold red]")
+        raise typer.Exit(code=1)
+    return profile.lower()
+
+ANSWERS_HELP = "JSON/YAML file or saved profile (see save-answers) answering the customization questions up front; the roadmap is customized in one request, without questions or reflection"
+
+def load_answers_option(answers):
+    """Return the answers an --answers option names, None without the option, or exit with an error."""
+    if not answers:
+        return None
+    from answer_profiles import load_answers
+    try:
+        return load_answers(answers)
+    except (OSError, ValueError) as e:
+        console.print(f"[bold red]Error: {e}[/bold red]")
+        raise typer.Exit(code=1)
+
+def generate_with_answers(idea, answers, animation_type, on_text, run, generation, profile, cache, store):
+    """Run the single-pass pipeline of an --answers run, with a progress line until the roadmap starts streaming."""
+    from roadmap_generator import generate_customized_roadmap
+    from loading_animation import LoadingAnimation
+    from stream_output import stop_animation_first
+    from connection_pool import run as run_async
+    console.print(f"[yellow]Customizing the roadmap to {len(answers)} known answer(s) in a single request...[/yellow]")
+    roadmap_animation = LoadingAnimation("Generating your customized roadmap", animation_type)
+    roadmap_animation.start()
+    try:
+        return run_async(generate_customized_roadmap(
+            idea, answers, status_callback, cache=cache, on_text=stop_animation_first(roadmap_animation, on_text),
+            run=run, generation_mode=generation, profile=profile, store=store
+        ))
+    finally:
+        roadmap_animation.stop()
+
+def report_resume_hint(run):
+    """Tell the user how to continue a run that stopped before finishing."""
+    if run is not None and not run.completed:
+        console.print(f"[yellow]Progress saved. Continue with: python main.py resume {run.run_id}[/yellow]")
+
 @app.command()
 def generate(
     idea: str = typer.Argument(..., help="Your app idea description"),
     animation: str = typer.Option("spinner", help="Loading animation type (spinner, dots, bar, typing)"),
-    interactive: bool = typer.Option(True, help="Use interactive mode with customization questions")
+    interactive: bool = typer.Option(True, help="Use interactive mode with customization questions"),
+    pipelined: bool = typer.Option(False, "--pipelined", help="Overlap stages: prepare questions while the roadmap streams and warm up the final request while you answer"),
+    generation: str = typer.Option(GENERATION_MODE, help="Initial roadmap: single (one stream) or parallel (skeleton first, then all phases at once)"),
+    reflection: str = typer.Option(REFLECTION_MODE, help="Customization step: full (rewrite the roadmap) or patch (edit only the affected sections)"),
+    passes: int = typer.Option(REFINE_MAX_PASSES, min=0, help="With --no-interactive: most self-critique passes over the initial roadmap (0 keeps it as is)"),
+    min_change: float = typer.Option(REFINE_MIN_CHANGE, min=0.0, max=1.0, help="With --no-interactive: stop refining once a pass changes less than this share of the roadmap"),
+    reuse_similar: str = typer.Option(IDEA_REUSE, help="Reuse the initial roadmap of a similar earlier idea: ask, auto or off"),
+    profile: str = typer.Option(PROFILE, help=PROFILE_HELP),
+    answers: str = typer.Option(None, help=ANSWERS_HELP),
+    stream: bool = typer.Option(True, help="Show the roadmap as it streams in instead of after generation completes"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the API instead of replaying cached responses"),
+    cache_dir: str = typer.Option(None, help="Directory for the response cache (defaults to ROADMAP_CACHE_DIR or ~/.cache/roadmap-generator)")
 ):
     """Generate a roadmap directly from the command line."""
+    from roadmap_generator import generate_roadmap, generate_roadmap_with_questions
+    from loading_animation import LoadingAnimation
+    from run_store import RunStore
+    from stream_output import MarkdownStreamRenderer, stop_animation_first
+    from connection_pool import run as run_async
+    from rich.markdown import Markdown
     console.print(f"[bold cyan]{APP_NAME} v{APP_VERSION}[/bold cyan]")
     
-    # Map animation string to enum
-    animation_map = {
-        'spinner': AnimationType.SPINNER,
-        'dots': AnimationType.DOTS,
-        'bar': AnimationType.BAR,
-        'typing': AnimationType.TYPING
-    }
-    animation_type = animation_map.get(animation, AnimationType.SPINNER)
+    animation_type = animation_type_for(animation)
+    cache = build_cache(no_cache, cache_dir)
+    reuse_similar = check_choice(reuse_similar, IDEA_REUSE_MODES, "--reuse-similar")
+    reflection = check_choice(reflection, REFLECTION_MODES, "--reflection")
+    generation = check_choice(generation, GENERATION_MODES, "--generation")
+    ideas = build_idea_index(reuse_similar)
+    profile = check_profile(profile)
+    store = build_store()
+    known_answers = load_answers_option(answers)
+    
+    # Render the final roadmap block by block as it streams in
+    renderer = MarkdownStreamRenderer(console, header="\n[bold green]Roadmap generated:[/bold green]\n") if stream else None
+    on_text = renderer.feed if renderer else None
+    mode = "answered" if known_answers else "interactive" if interactive else "direct"
+    run = RunStore().create(idea, mode, {"pipelined": pipelined, "reflection_mode": reflection, "generation_mode": generation, "reuse_similar": reuse_similar, "profile": profile, "answers": known_answers, "max_passes": passes, "min_change": min_change})
     
     try:
-        if interactive:
+        if known_answers:
+            roadmap = generate_with_answers(idea, known_answers, animation_type, on_text, run, generation, profile, cache, store)
+        elif interactive:
             # For interactive mode, the loading animations are handled within the generate_roadmap_with_questions function
             console.print("[yellow]Starting interactive roadmap generation process...[/yellow]")
-            roadmap = asyncio.run(generate_roadmap_with_questions(idea, animation_type, status_callback))
+            roadmap = run_async(generate_roadmap_with_questions(idea, animation_type, status_callback, cache=cache, pipelined=pipelined, on_text=on_text, run=run, reflection_mode=reflection, generation_mode=generation, ideas=ideas, profile=profile, store=store))
         else:
-            # Start loading animation in a background thread
+            # The progress line is redrawn by the stream itself
             roadmap_animation = LoadingAnimation("Generating roadmap based on your idea", animation_type)
-            animation_thread = threading.Thread(target=roadmap_animation.start)
-            animation_thread.daemon = True
-            animation_thread.start()
+            roadmap_animation.start()
             
             # Run the generation in an event loop
-            roadmap = asyncio.run(generate_roadmap(idea, status_callback))
+            roadmap = run_async(generate_roadmap(idea, status_callback, cache=cache, on_text=stop_animation_first(roadmap_animation, on_text), run=run, generation_mode=generation, ideas=ideas, profile=profile, store=store, max_passes=passes, min_change=min_change))
             
             # Stop the animation
-            roadmap_animation.stop()
+            if roadmap_animation.is_running:
+                roadmap_animation.stop()
         
-        console.print("\n[bold green]Roadmap generated:[/bold green]\n")
-        console.print(Markdown(roadmap))
-    except Exception as e:
+        if renderer:
+            renderer.finish()
+            report_cache_stats(cache, ideas)
+        else:
+            report_cache_stats(cache, ideas)
+            console.print("\n[bold green]Roadmap generated:[/bold green]\n")
+            console.print(Markdown(roadmap))
+    except (Exception, KeyboardInterrupt) as e:
         # Ensure animation is stopped in case of error
-        if not interactive and 'roadmap_animation' in locals():
+        if 'roadmap_animation' in locals():
             roadmap_animation.stop()
-        console.print(f"[bold red]Error: {str(e)}[/bold red]")
+        console.print(f"[bold red]Error: {str(e) or 'interrupted'}[/bold red]")
+        report_resume_hint(run)
 
 @app.command()
 def interactive(
     idea: str = typer.Argument(..., help="Your app idea description"),
-    animation: str = typer.Option("spinner", help="Loading animation type (spinner, dots, bar, typing)")
+    animation: str = typer.Option("spinner", help="Loading animation type (spinner, dots, bar, typing)"),
+    pipelined: bool = typer.Option(False, "--pipelined", help="Overlap stages: prepare questions while the roadmap streams and warm up the final request while you answer"),
+    generation: str = typer.Option(GENERATION_MODE, help="Initial roadmap: single (one stream) or parallel (skeleton first, then all phases at once)"),
+    reflection: str = typer.Option(REFLECTION_MODE, help="Customization step: full (rewrite the roadmap) or patch (edit only the affected sections)"),
+    reuse_similar: str = typer.Option(IDEA_REUSE, help="Reuse the initial roadmap of a similar earlier idea: ask, auto or off"),
+    profile: str = typer.Option(PROFILE, help=PROFILE_HELP),
+    answers: str = typer.Option(None, help=ANSWERS_HELP),
+    stream: bool = typer.Option(True, help="Show the roadmap as it streams in instead of after generation completes"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the API instead of replaying cached responses"),
+    cache_dir: str = typer.Option(None, help="Directory for the response cache (defaults to ROADMAP_CACHE_DIR or ~/.cache/roadmap-generator)")
 ):
     """Generate a roadmap with interactive customization questions."""
+    from roadmap_generator import generate_roadmap_with_questions
+    from run_store import RunStore
+    from stream_output import MarkdownStreamRenderer
+    from connection_pool import run as run_async
+    from rich.markdown import Markdown
     console.print(f"[bold cyan]{APP_NAME} v{APP_VERSION}[/bold cyan]")
     
-    # Map animation string to enum
-    animation_map = {
-        'spinner': AnimationType.SPINNER,
-        'dots': AnimationType.DOTS,
-        'bar': AnimationType.BAR,
-        'typing': AnimationType.TYPING
-    }
-    animation_type = animation_map.get(animation, AnimationType.SPINNER)
+    animation_type = animation_type_for(animation)
+    cache = build_cache(no_cache, cache_dir)
+    reuse_similar = check_choice(reuse_similar, IDEA_REUSE_MODES, "--reuse-similar")
+    reflection = check_choice(reflection, REFLECTION_MODES, "--reflection")
+    generation = check_choice(generation, GENERATION_MODES, "--generation")
+    ideas = build_idea_index(reuse_similar)
+    profile = check_profile(profile)
+    store = build_store()
+    known_answers = load_answers_option(answers)
+    
+    # Render the customized roadmap block by block as it streams in
+    renderer = MarkdownStreamRenderer(console, header="\n[bold green]Customized roadmap generated:[/bold green]\n") if stream else None
+    run = RunStore().create(idea, "answered" if known_answers else "interactive", {"pipelined": pipelined, "reflection_mode": reflection, "generation_mode": generation, "reuse_similar": reuse_similar, "profile": profile, "answers": known_answers})
     
     try:
-        # Loading animations are handled within the generate_roadmap_with_questions function
-        console.print("[yellow]Starting interactive roadmap generation process...[/yellow]")
-        
-        # Run the interactive generation in an event loop
-        roadmap = asyncio.run(generate_roadmap_with_questions(idea, animation_type, status_callback))
+        if known_answers:
+            roadmap = generate_with_answers(idea, known_answers, animation_type, renderer.feed if renderer else None, run, generation, profile, cache, store)
+        else:
+            # Loading animations are handled within the generate_roadmap_with_questions function
+            console.print("[yellow]Starting interactive roadmap generation process...[/yellow]")
+            
+            # Run the interactive generation in an event loop
+            roadmap = run_async(generate_roadmap_with_questions(
+                idea, animation_type, status_callback, cache=cache, pipelined=pipelined,
+                on_text=renderer.feed if renderer else None, run=run, reflection_mode=reflection,
+                generation_mode=generation, ideas=ideas, profile=profile, store=store
+            ))
         
-        console.print("\n[bold green]Customized roadmap generated:[/bold green]\n")
-        console.print(Markdown(roadmap))
-    except Exception as e:
-        console.print(f"[bold red]Error: {str(e)}[/bold red]")
+        if renderer:
+            renderer.finish()
+            report_cache_stats(cache, ideas)
+        else:
+            report_cache_stats(cache, ideas)
+            console.print("\n[bold green]Customized roadmap generated:[/bold green]\n")
+            console.print(Markdown(roadmap))
+    except (Exception, KeyboardInterrupt) as e:
+        console.print(f"[bold red]Error: {str(e) or 'interrupted'}[/bold red]")
+        report_resume_hint(run)
 
 @app.command()
 def save(
     idea: str = typer.Argument(..., help="Your app idea description"),
     output_file: str = typer.Option("roadmap.md", help="Output file name"),
     animation: str = typer.Option("spinner", help="Loading animation type (spinner, dots, bar, typing)"),
-    interactive: bool = typer.Option(True, help="Use interactive mode with customization questions")
+    interactive: bool = typer.Option(True, help="Use interactive mode with customization questions"),
+    pipelined: bool = typer.Option(False, "--pipelined", help="Overlap stages: prepare questions while the roadmap streams and warm up the final request while you answer"),
+    generation: str = typer.Option(GENERATION_MODE, help="Initial roadmap: single (one stream) or parallel (skeleton first, then all phases at once)"),
+    reflection: str = typer.Option(REFLECTION_MODE, help="Customization step: full (rewrite the roadmap) or patch (edit only the affected sections)"),
+    passes: int = typer.Option(REFINE_MAX_PASSES, min=0, help="With --no-interactive: most self-critique passes over the initial roadmap (0 keeps it as is)"),
+    min_change: float = typer.Option(REFINE_MIN_CHANGE, min=0.0, max=1.0, help="With --no-interactive: stop refining once a pass changes less than this share of the roadmap"),
+    reuse_similar: str = typer.Option(IDEA_REUSE, help="Reuse the initial roadmap of a similar earlier idea: ask, auto or off"),
+    profile: str = typer.Option(PROFILE, help=PROFILE_HELP),
+    answers: str = typer.Option(None, help=ANSWERS_HELP),
+    stream: bool = typer.Option(True, help="Write the roadmap to disk as it streams in instead of after generation completes"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the API instead of replaying cached responses"),
+    cache_dir: str = typer.Option(None, help="Directory for the response cache (defaults to ROADMAP_CACHE_DIR or ~/.cache/roadmap-generator)")
 ):
     """Generate a roadmap and save it to a file."""
+    from roadmap_generator import generate_roadmap, generate_roadmap_with_questions
+    from loading_animation import LoadingAnimation
+    from run_store import RunStore
+    from stream_output import IncrementalFileWriter
+    from connection_pool import run as run_async
     console.print(f"[bold cyan]{APP_NAME} v{APP_VERSION}[/bold cyan]")
     
-    # Map animation string to enum
-    animation_map = {
-        'spinner': AnimationType.SPINNER,
-        'dots': AnimationType.DOTS,
-        'bar': AnimationType.BAR,
-        'typing': AnimationType.TYPING
-    }
-    animation_type = animation_map.get(animation, AnimationType.SPINNER)
+    animation_type = animation_type_for(animation)
+    cache = build_cache(no_cache, cache_dir)
+    reuse_similar = check_choice(reuse_similar, IDEA_REUSE_MODES, "--reuse-similar")
+    reflection = check_choice(reflection, REFLECTION_MODES, "--reflection")
+    generation = check_choice(generation, GENERATION_MODES, "--generation")
+    ideas = build_idea_index(reuse_similar)
+    profile = check_profile(profile)
+    store = build_store()
+    known_answers = load_answers_option(answers)
+    file_path = os.path.join('roadmaps', output_file)
+    mode = "answered" if known_answers else "interactive" if interactive else "direct"
+    run = RunStore().create(idea, mode, {"pipelined": pipelined, "reflection_mode": reflection, "generation_mode": generation, "reuse_similar": reuse_similar, "profile": profile, "answers": known_answers, "max_passes": passes, "min_change": min_change, "output_file": os.path.abspath(file_path)})
+    
+    # Write the final roadmap to disk as it streams in, so a failed run leaves a partial file
+    writer = None
     
     try:
-        if interactive:
+        if stream:
+            writer = IncrementalFileWriter(file_path)
+        on_text = writer.write if writer else None
+        
+        if known_answers:
+            roadmap = generate_with_answers(idea, known_answers, animation_type, on_text, run, generation, profile, cache, store)
+        elif interactive:
             # For interactive mode, the loading animations are handled within the generate_roadmap_with_questions function
             console.print("[yellow]Starting interactive roadmap generation process...[/yellow]")
-            roadmap = asyncio.run(generate_roadmap_with_questions(idea, animation_type, status_callback))
+            roadmap = run_async(generate_roadmap_with_questions(idea, animation_type, status_callback, cache=cache, pipelined=pipelined, on_text=on_text, run=run, reflection_mode=reflection, generation_mode=generation, ideas=ideas, profile=profile, store=store))
         else:
-            # Start loading animation in a background thread
+            # The progress line is redrawn by the stream itself
             roadmap_animation = LoadingAnimation("Generating roadmap based on your idea", animation_type)
-            animation_thread = threading.Thread(target=roadmap_animation.start)
-            animation_thread.daemon = True
-            animation_thread.start()
+            roadmap_animation.start()
             
             # Run the generation in an event loop
-            roadmap = asyncio.run(generate_roadmap(idea, status_callback))
+            roadmap = run_async(generate_roadmap(idea, status_callback, cache=cache, on_text=on_text, run=run, generation_mode=generation, ideas=ideas, profile=profile, store=store, max_passes=passes, min_change=min_change))
             
             # Stop the animation
             roadmap_animation.stop()
         
-        # Save to file in the roadmaps directory
-        os.makedirs('roadmaps', exist_ok=True)  # Ensure the directory exists
-        file_path = os.path.join('roadmaps', output_file)
-        with open(file_path, "w") as f:
-            f.write(roadmap)
+        if writer:
+            writer.close()
+        else:
+            # Save to file in the roadmaps directory
+            os.makedirs('roadmaps', exist_ok=True)  # Ensure the directory exists
+            with open(file_path, "w") as f:
+                f.write(roadmap)
+        index_saved_roadmap(file_path)
         
+        report_cache_stats(cache, ideas)
         console.print(f"\n[bold green]Roadmap saved to {file_path}[/bold green]")
-    except Exception as e:
+    except (Exception, KeyboardInterrupt) as e:
         # Ensure animation is stopped in case of error
         if 'roadmap_animation' in locals():
             roadmap_animation.stop()
+        console.print(f"[bold red]Error: {str(e) or 'interrupted'}[/bold red]")
+        if writer:
+            writer.abort()
+            if writer.bytes_written:
+                console.print(f"[yellow]Partial roadmap kept at {writer.partial_path}[/yellow]")
+        report_resume_hint(run)
+
+@app.command()
+def resume(
+    run_id: str = typer.Argument(..., help="Id of the run to continue (see the runs command)"),
+    animation: str = typer.Option("spinner", help="Loading animation type (spinner, dots, bar, typing)"),
+    stream: bool = typer.Option(True, help="Show or write the roadmap as it streams in instead of after generation completes"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the API instead of replaying cached responses"),
+    cache_dir: str = typer.Option(None, help="Directory for the response cache (defaults to ROADMAP_CACHE_DIR or ~/.cache/roadmap-generator)")
+):
+    """Continue an interrupted or failed run from its last finished stage."""
+    from roadmap_generator import generate_roadmap, generate_roadmap_with_questions, generate_customized_roadmap
+    from run_store import RunStore
+    from stream_output import MarkdownStreamRenderer, IncrementalFileWriter
+    from connection_pool import run as run_async
+    from rich.markdown import Markdown
+    console.print(f"[bold cyan]{APP_NAME} v{APP_VERSION}[/bold cyan]")
+    
+    try:
+        run = RunStore().get(run_id)
+    except KeyError as e:
+        console.print(f"[bold red]Error: {e.args[0]}[/bold red]")
+        raise typer.Exit(code=1)
+    
+    animation_type = animation_type_for(animation)
+    cache = build_cache(no_cache, cache_dir)
+    options = run.metadata["options"]
+    ideas = build_idea_index(options.get("reuse_similar", "off"))
+    store = build_store()
+    file_path = options.get("output_file")
+    
+    if run.completed:
+        # A finished run is shown from its checkpoint, without going through the pipeline
+        roadmap = run.load("final_roadmap")
+        if roadmap is not None:
+            console.print(f"[green]Run {run.run_id} already finished; showing its roadmap.[/green]")
+            if file_path:
+                console.print(f"[green]It was saved to {file_path}[/green]")
+            console.print("\n[bold green]Roadmap generated:[/bold green]\n")
+            console.print(Markdown(roadmap))
+            return
+        console.print(f"[yellow]Run {run.run_id} finished but its final roadmap is missing; generating it again.[/yellow]")
+    else:
+        console.print(f"[yellow]Resuming run {run.run_id} after stage: {run.metadata['stage'] or 'none'}[/yellow]")
+    
+    # Saved runs go back to their output file; the others are shown in the terminal
+    writer = None
+    renderer = None
+    try:
+        if stream and file_path:
+            writer = IncrementalFileWriter(file_path)
+        elif stream:
+            renderer = MarkdownStreamRenderer(console, header="\n[bold green]Roadmap generated:[/bold green]\n")
+        on_text = writer.write if writer else renderer.feed if renderer else None
+        
+        if run.metadata["mode"] == "answered":
+            roadmap = run_async(generate_customized_roadmap(
+                run.idea, options["answers"], status_callback, cache=cache, on_text=on_text, run=run,
+                generation_mode=options.get("generation_mode"), profile=options.get("profile"), store=store
+            ))
+        elif run.metadata["mode"] == "interactive":
+            roadmap = run_async(generate_roadmap_with_questions(
+                run.idea, animation_type, status_callback, cache=cache,
+                pipelined=options.get("pipelined", False), on_text=on_text, run=run,
+                reflection_mode=options.get("reflection_mode"), generation_mode=options.get("generation_mode"),
+                ideas=ideas, profile=options.get("profile"), store=store
+            ))
+        else:
+            roadmap = run_async(generate_roadmap(
+                run.idea, status_callback, cache=cache, on_text=on_text, run=run,
+                generation_mode=options.get("generation_mode"), ideas=ideas, profile=options.get("profile"),
+                store=store, max_passes=options.get("max_passes"), min_change=options.get("min_change")
+            ))
+        
+        if writer:
+            writer.close()
+        elif file_path:
+            os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+            with open(file_path, "w") as f:
+                f.write(roadmap)
+        if file_path:
+            index_saved_roadmap(file_path)
+        
+        report_cache_stats(cache, ideas)
+        if file_path:
+            console.print(f"\n[bold green]Roadmap saved to {file_path}[/bold green]")
+        elif renderer:
+            renderer.finish()
+        else:
+            console.print("\n[bold green]Roadmap generated:[/bold green]\n")
+            console.print(Markdown(roadmap))
+    except (Exception, KeyboardInterrupt) as e:
+        console.print(f"[bold red]Error: {str(e) or 'interrupted'}[/bold red]")
+        if writer:
+            writer.abort()
+        report_resume_hint(run)
+
+@app.command()
+def runs():
+    """List checkpointed runs, most recent first."""
+    from run_store import RunStore
+    from rich.table import Table
+    store = RunStore()
+    saved_runs = store.list()
+    if not saved_runs:
+        console.print(f"[yellow]No runs in {store.runs_dir}[/yellow]")
+        return
+    
+    table = Table(title="Runs")
+    table.add_column("Run id", no_wrap=True)
+    table.add_column("Status")
+    table.add_column("Last stage")
+    table.add_column("Updated")
+    table.add_column("Profile")
+    table.add_column("Idea")
+    for run in saved_runs:
+        status = run.metadata["status"]
+        style = "green" if status == "completed" else "yellow" if status in ("running", "interrupted") else "red"
+        table.add_row(
+            run.run_id,
+            f"[{style}]{status}[/{style}]",
+            run.metadata["stage"] or "-",
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(run.metadata["updated"])),
+            run.metadata["options"].get("profile") or "-",
+            run.idea[:60]
+        )
+    console.print(table)
+
+@app.command()
+def prune_runs(
+    older_than_days: float = typer.Option(RUNS_MAX_AGE_DAYS, help="Delete runs not updated for this many days"),
+    include_unfinished: bool = typer.Option(False, "--include-unfinished", help="Also delete runs that could still be resumed")
+):
+    """Delete old checkpointed runs."""
+    from run_store import RunStore
+    removed = RunStore().prune(older_than_days, include_unfinished)
+    console.print(f"[green]Removed {len(removed)} run(s)[/green]")
+
+@app.command()
+def save_answers(
+    name: str = typer.Argument(..., help="Profile name, e.g. the team's name"),
+    answers_file: str = typer.Argument(..., help="JSON or YAML file mapping question keys or topics to answers")
+):
+    """Save a team's answers as a named profile for --answers runs."""
+    from answer_profiles import load_answers_file, save_profile
+    try:
+        path = save_profile(name, load_answers_file(answers_file))
+    except (OSError, ValueError) as e:
+        console.print(f"[bold red]Error: {e}[/bold red]")
+        raise typer.Exit(code=1)
+    console.print(f"[green]Saved answers profile {name!r} to {path}; use it with --answers {name}[/green]")
+
+@app.command()
+def list_answers():
+    """List the saved answers profiles."""
+    from answer_profiles import list_profiles
+    from config import ANSWERS_DIR
+    from rich.table import Table
+    profiles = list_profiles()
+    if not profiles:
+        console.print(f"[yellow]No saved answers profiles in {ANSWERS_DIR}[/yellow]")
+        return
+    
+    table = Table(title="Answers profiles")
+    table.add_column("Name", no_wrap=True)
+    table.add_column("Answers")
+    for profile in profiles:
+        if profile["answers"] is None:
+            table.add_row(profile["name"], f"[red]could not be read: {profile['path']}[/red]")
+        else:
+            table.add_row(profile["name"], "\n".join(f"{key}: {value}" for key, value in profile["answers"].items()))
+    console.print(table)
+
+@app.command()
+def batch(
+    input_file: str = typer.Argument(..., help="JSONL or CSV file with one idea per entry"),
+    concurrency: int = typer.Option(4, help="Maximum number of roadmaps generated at once"),
+    output_dir: str = typer.Option("roadmaps", help="Directory the finished roadmaps are written to"),
+    reuse_similar: str = typer.Option(IDEA_REUSE, help="Reuse the initial roadmap of a similar earlier idea: ask, auto or off (a batch can't ask, so ask means off)"),
+    profile: str = typer.Option(PROFILE, help=PROFILE_HELP + " (entries can name their own)"),
+    answers: str = typer.Option(None, help="JSON/YAML file or saved profile (see save-answers) used for entries without answers of their own"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the API instead of replaying cached responses"),
+    cache_dir: str = typer.Option(None, help="Directory for the response cache (defaults to ROADMAP_CACHE_DIR or ~/.cache/roadmap-generator)")
+):
+    """Generate roadmaps for many ideas concurrently without prompting for answers."""
+    from batch import load_batch_file, run_batch
+    from roadmap_index import RoadmapIndex
+    from connection_pool import run as run_async
+    from rich.table import Table
+    console.print(f"[bold cyan]{APP_NAME} v{APP_VERSION}[/bold cyan]")
+    reuse_similar = check_choice(reuse_similar, IDEA_REUSE_MODES, "--reuse-similar")
+    cache = build_cache(no_cache, cache_dir)
+    # Nobody is there to confirm a match, so only auto reuses
+    ideas = build_idea_index("auto" if reuse_similar == "auto" else "off")
+    profile = check_profile(profile)
+    store = build_store()
+    known_answers = load_answers_option(answers)
+    
+    try:
+        items = load_batch_file(input_file)
+    except (OSError, ValueError) as e:
         console.print(f"[bold red]Error: {str(e)}[/bold red]")
+        raise typer.Exit(code=1)
+    for item in items:
+        if item["profile"]:
+            item["profile"] = check_profile(item["profile"])
+        if not item["answers"] and known_answers:
+            item["answers"] = known_answers
+    
+    console.print(f"[yellow]Generating {len(items)} roadmaps with concurrency {concurrency}...[/yellow]")
+    
+    def on_result(result):
+        if result["status"] == "ok":
+            console.print(f"[green]✅ {result['file']} ({result['latency']:.1f}s)[/green]")
+        else:
+            console.print(f"[red]❌ {result['idea'][:60]}: {result['error']}[/red]")
+    
+    batch_start = time.perf_counter()
+    results = run_async(run_batch(items, concurrency, output_dir, cache=cache, on_result=on_result, ideas=ideas, profile=profile, store=store))
+    total_time = time.perf_counter() - batch_start
+    RoadmapIndex(output_dir).update()
+    
+    # Summarize per-idea latency and failures
+    table = Table(title="Batch summary")
+    table.add_column("Idea")
+    table.add_column("Status")
+    table.add_column("Profile")
+    table.add_column("Latency", justify="right")
+    table.add_column("Output")
+    for result in results:
+        status = "[green]ok[/green]" if result["status"] == "ok" else "[red]failed[/red]"
+        if result["cached"]:
+            status += " (cached)"
+        elif result["reused"]:
+            status += " (reused similar)"
+        table.add_row(result["idea"][:60], status, result["profile"], f"{result['latency']:.1f}s", result["file"] or result["error"])
+    console.print(table)
+    
+    failures = sum(1 for result in results if result["status"] != "ok")
+    console.print(f"[bold]{len(results) - failures} succeeded, {failures} failed in {total_time:.1f}s[/bold]")
+    report_cache_stats(cache, ideas)
+    if failures:
+        raise typer.Exit(code=1)
+
+@app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", help="Address to listen on"),
+    port: int = typer.Option(8000, help="Port to listen on"),
+    workers: int = typer.Option(SERVE_WORKERS, help="Maximum number of jobs run at once"),
+    max_queue: int = typer.Option(SERVE_MAX_QUEUE, help="Jobs allowed to wait for a worker before submissions are refused"),
+    jobs_dir: str = typer.Option(None, help="Directory for the persistent job queue (defaults to ROADMAP_JOBS_DIR)"),
+    job_max_age_days: float = typer.Option(JOBS_MAX_AGE_DAYS, help="Forget finished jobs after this many days (0 keeps them)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the API instead of replaying cached responses"),
+    cache_dir: str = typer.Option(None, help="Directory for the response cache (defaults to ROADMAP_CACHE_DIR or ~/.cache/roadmap-generator)")
+):
+    """Serve the roadmap pipeline as a local HTTP API with a queued worker pool."""
+    from server import JobQueue, create_server
+    console.print(f"[bold cyan]{APP_NAME} v{APP_VERSION}[/bold cyan]")
+    job_queue = JobQueue(jobs_dir=jobs_dir, workers=workers, max_queue=max_queue, cache=build_cache(no_cache, cache_dir), store=build_store(), max_age_days=job_max_age_days)
+    try:
+        server = create_server(host, port, job_queue)
+    except OSError as e:
+        console.print(f"[bold red]Error: cannot listen on {host}:{port} ({e})[/bold red]")
+        raise typer.Exit(code=1)
+    requeued = job_queue.start()
+    if requeued:
+        console.print(f"[yellow]Requeued {requeued} unfinished job(s) from {job_queue.jobs_dir}[/yellow]")
+    console.print(f"[green]Serving on http://{host}:{port} with {workers} worker(s); press Ctrl-C to stop[/green]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("[yellow]Stopped; unfinished jobs resume on the next start[/yellow]")
+    finally:
+        server.server_close()
+
+@app.command()
+def search(
+    query: str = typer.Argument(..., help="Keywords that must all appear in a roadmap"),
+    section: str = typer.Option(None, help="Only match sections whose phase or sub-task heading contains this text"),
+    directory: str = typer.Option("roadmaps", "--dir", help="Directory of saved roadmaps"),
+    limit: int = typer.Option(10, help="Maximum number of roadmaps listed")
+):
+    """Search saved roadmaps by keyword, optionally within matching sections."""
+    from roadmap_index import RoadmapIndex
+    from rich.table import Table
+    start = time.perf_counter()
+    index = RoadmapIndex(directory)
+    index.update()
+    results = index.search(query, section=section, limit=limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    
+    if not results:
+        console.print(f"[yellow]No roadmaps match {query!r} ({elapsed:.1f} ms)[/yellow]")
+        return
+    
+    table = Table(title=f"Roadmaps matching {query!r}")
+    table.add_column("File", no_wrap=True)
+    table.add_column("Title")
+    table.add_column("Matching sections")
+    for result in results:
+        sections = result["sections"][:3]
+        more = len(result["sections"]) - len(sections)
+        table.add_row(result["file"], result["title"], "\n".join(sections) + (f"\n(+{more} more)" if more > 0 else ""))
+    console.print(table)
+    console.print(f"[dim]{len(results)} result(s) in {elapsed:.1f} ms[/dim]")
+
+@app.command()
+def show(
+    file_name: str = typer.Argument(..., help="Saved roadmap file name, e.g. roadmap.md"),
+    section: str = typer.Option(None, help="Show the steps of the phases or sub-tasks whose heading contains this text"),
+    directory: str = typer.Option("roadmaps", "--dir", help="Directory of saved roadmaps")
+):
+    """Show a saved roadmap's outline, or the steps of selected sections."""
+    from roadmap_index import RoadmapIndex
+    from rich.markup import escape
+    index = RoadmapIndex(directory)
+    index.update()
+    try:
+        tree = index.tree(os.path.basename(file_name))
+    except KeyError as e:
+        console.print(f"[bold red]Error: {e.args[0]}[/bold red]")
+        raise typer.Exit(code=1)
+    
+    console.print(f"[bold cyan]{tree['title'] or file_name}[/bold cyan]")
+    wanted = section.lower() if section else None
+    shown = 0
+    for phase in tree["phases"]:
+        rows = [(phase["title"], phase["steps"], phase["title"], "")]
+        rows += [(subtask["title"], subtask["steps"], f"{phase['title']} > {subtask['title']}", "  ") for subtask in phase["subtasks"]]
+        for title, steps, path, indent in rows:
+            if wanted is None:
+                heading = escape(title) if indent else f"[bold]{escape(title)}[/bold]"
+                console.print(f"{indent}{heading} [dim]({len(steps)} steps)[/dim]")
+            elif wanted in path.lower():
+                shown += 1
+                console.print(f"\n[bold]{escape(path)}[/bold]")
+                for number, text in steps:
+                    console.print(f"  {number}. {escape(text)}")
+    if wanted is not None and not shown:
+        console.print(f"[yellow]No section heading contains {section!r}[/yellow]")
+
+def format_size(size):
+    """Human-readable byte count, e.g. 12.3 KB."""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def open_store_idea(idea):
+    """Return the roadmap store and the id of the stored idea a reference names, or exit with an error."""
+    from roadmap_store import RoadmapStore
+    store = RoadmapStore()
+    try:
+        return store, store.resolve(idea)
+    except KeyError as e:
+        console.print(f"[bold red]Error: {e.args[0]}[/bold red]")
+        raise typer.Exit(code=1)
+
+@app.command()
+def history(
+    idea: str = typer.Argument(None, help="Idea id (or a unique prefix of it) or the idea's description; omit to list every stored idea")
+):
+    """List the stored ideas, or every stored version of one idea."""
+    from roadmap_store import RoadmapStore
+    from rich.table import Table
+    if idea is None:
+        store = RoadmapStore()
+        ideas = store.ideas()
+        if not ideas:
+            console.print(f"[yellow]No roadmap versions in {store.store_dir}[/yellow]")
+            return
+        table = Table(title="Stored ideas")
+        table.add_column("Idea id", no_wrap=True)
+        table.add_column("Versions", justify="right")
+        table.add_column("Updated")
+        table.add_column("Idea")
+        for entry in ideas:
+            table.add_row(entry["id"], str(entry["versions"]), time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["updated"])), entry["idea"][:60])
+        console.print(table)
+        return
+    
+    store, iid = open_store_idea(idea)
+    record = store.history(iid)
+    table = Table(title=f"Versions of {iid}: {record['idea'][:60]}")
+    table.add_column("Version", justify="right")
+    table.add_column("Kind")
+    table.add_column("Profile")
+    table.add_column("Parent", justify="right")
+    table.add_column("Created")
+    table.add_column("Run id", no_wrap=True)
+    table.add_column("Size", justify="right")
+    table.add_column("Stored", justify="right")
+    for version in record["versions"]:
+        table.add_row(
+            str(version["version"]),
+            version["kind"],
+            version.get("profile") or "-",
+            str(version["parent"] or "-"),
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(version["created"])),
+            version["run_id"] or "-",
+            format_size(version["bytes"]),
+            format_size(version["stored"])
+        )
+    console.print(table)
+    total = sum(version["bytes"] for version in record["versions"])
+    stored = sum(version["stored"] for version in record["versions"])
+    console.print(f"[cyan]{len(record['versions'])} version(s), {format_size(total)} of roadmaps stored in {format_size(stored)}[/cyan]")
+
+@app.command()
+def diff(
+    idea: str = typer.Argument(..., help="Idea id (or a unique prefix of it) or the idea's description"),
+    old: str = typer.Argument(None, help="Older version: a number, latest or a kind (initial, regenerated, reflected); defaults to the version before NEW"),
+    new: str = typer.Argument("latest", help="Newer version, like OLD"),
+    stat: bool = typer.Option(False, "--stat", help="Only list the changed sections with their added and removed line counts")
+):
+    """Show what changed between two stored versions of an idea's roadmap, section by section."""
+    import difflib
+    from rich.markup import escape
+    store, iid = open_store_idea(idea)
+    try:
+        new_number = store.version(iid, new)["version"]
+        old_number = store.version(iid, old)["version"] if old is not None else new_number - 1
+        if old_number < 1:
+            raise KeyError(f"Version {new_number} is the first version of {iid}; name the version to compare it with")
+        changes = store.diff(iid, old_number, new_number)
+    except KeyError as e:
+        console.print(f"[bold red]Error: {e.args[0]}[/bold red]")
+        raise typer.Exit(code=1)
+    
+    if not changes:
+        console.print(f"[green]Versions {old_number} and {new_number} are identical[/green]")
+        return
+    console.print(f"[bold cyan]{iid}: version {old_number} → {new_number}, {len(changes)} section(s) changed[/bold cyan]")
+    for title, old_text, new_text in changes:
+        lines = list(difflib.unified_diff(old_text.splitlines(), new_text.splitlines(), f"v{old_number}", f"v{new_number}", lineterm=""))[2:]
+        added = sum(1 for line in lines if line.startswith("+"))
+        removed = sum(1 for line in lines if line.startswith("-"))
+        state = "added" if not old_text else "removed" if not new_text else "changed"
+        console.print(f"\n[bold]{escape(title)}[/bold] [dim]({state}, [green]+{added}[/green] [red]-{removed}[/red])[/dim]")
+        if stat:
+            continue
+        for line in lines:
+            style = "green" if line.startswith("+") else "red" if line.startswith("-") else "cyan" if line.startswith("@@") else None
+            console.print(f"[{style}]{escape(line)}[/{style}]" if style else escape(line), highlight=False, soft_wrap=True)
+
+@app.command()
+def checkout(
+    idea: str = typer.Argument(..., help="Idea id (or a unique prefix of it) or the idea's description"),
+    version: str = typer.Argument("latest", help="Version: a number, latest or a kind (initial, regenerated, reflected)"),
+    output: str = typer.Option(None, "--output", "-o", help="Write the roadmap to this file instead of printing it")
+):
+    """Print or write out any stored version of an idea's roadmap."""
+    store, iid = open_store_idea(idea)
+    try:
+        markdown = store.checkout(iid, version)
+    except (KeyError, OSError) as e:
+        console.print(f"[bold red]Error: {e.args[0] if isinstance(e, KeyError) else e}[/bold red]")
+        raise typer.Exit(code=1)
+    if output is None:
+        # Raw markdown, so the output can be piped or redirected
+        sys.stdout.write(markdown)
+        return
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(markdown)
+    console.print(f"[green]Version {store.version(iid, version)['version']} of {iid} written to {output}[/green]")
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,120 @@
+# parallel_roadmap.py
+import re
+import threading
+from roadmap_patch import parse_sections
+
+# The phases every roadmap must contain, in order (see ClaudeClient.generate_initial_roadmap)
+PHASES = [
+    "Project Analysis & Requirements Engineering",
+    "System Architecture Design",
+    "Development Environment Setup",
+    "Implementation Plan",
+    "Testing Strategy",
+    "Refactoring & Optimization Guide",
+    "Deployment & Documentation"
+]
+
+STEP_PATTERN = re.compile(r'^(\d+)\.(\s)')
+PHASE_HEADING_PATTERN = re.compile(r'^(##\s+Phase\s+)\d+')
+SUBTASK_HEADING_PATTERN = re.compile(r'^(###\s+)\d+\.(\d+)')
+
+class Skeleton:
+    """A roadmap skeleton split into its header (title and intro) and one outline per phase."""
+    def __init__(self, header, phases):
+        self.header = header
+        # Each phase is (heading_line, outline_text), outline_text including the heading
+        self.phases = phases
+
+def split_skeleton(skeleton_text):
+    """
+    Split a skeleton into the text before the first H2 and one outline per H2 phase.
+
+    The H3 sub-task headings under a phase stay in that phase's outline.
+    """
+    header = []
+    phases = []
+    for section in parse_sections(skeleton_text):
+        if section.level == 2:
+            heading = section.text.splitlines()[0].strip()
+            phases.append([heading, section.text])
+        elif phases:
+            phases[-1][1] += section.text
+        else:
+            header.append(section.text)
+    return Skeleton("".join(header).rstrip("\n") + "\n\n", [tuple(phase) for phase in phases])
+
+class PhaseStitcher:
+    """
+    Join phase texts generated in parallel into one document, in phase order.
+
+    Text for the first unfinished phase is passed on as it arrives; text for later
+    phases is held back until every earlier phase is done, so on_text sees the
+    document in order. Numbered steps are renumbered sequentially across the whole
+    document, and "## Phase N" and "### N.M" headings get their phase's number.
+    Safe to feed from several threads.
+    """
+    def __init__(self, header, phase_count, on_text=None):
+        self.lock = threading.Lock()
+        self.on_text = on_text
+        self.buffers = [[] for _ in range(phase_count)]
+        self.finished = [False] * phase_count
+        self.current = 0
+        self.partial_line = ""
+        self.step = 0
+        self.in_fence = False
+        self.output = []
+        self._emit(header)
+
+    def feed(self, index, delta):
+        with self.lock:
+            self.buffers[index].append(delta)
+            self._flush()
+
+    def finish(self, index):
+        with self.lock:
+            self.finished[index] = True
+            self._flush()
+
+    def text(self):
+        return "".join(self.output).rstrip("\n") + "\n"
+
+    def _flush(self):
+        while self.current < len(self.buffers):
+            buffered = "".join(self.buffers[self.current])
+            self.buffers[self.current] = []
+            if buffered:
+                self._process(buffered)
+            if not self.finished[self.current]:
+                return
+            # End the phase on a complete line followed by a blank line
+            if self.partial_line:
+                self._emit_line(self.partial_line + "\n")
+                self.partial_line = ""
+            if not "".join(self.output[-2:]).endswith("\n\n"):
+                self._emit("\n")
+            self.current += 1
+            self.in_fence = False
+
+    def _process(self, text):
+        lines = (self.partial_line + text).split("\n")
+        self.partial_line = lines.pop()
+        for line in lines:
+            self._emit_line(line + "\n")
+
+    def _emit_line(self, line):
+        if line.lstrip().startswith("```"):
+            self.in_fence = not self.in_fence
+        elif not self.in_fence:
+            phase_number = str(self.current + 1)
+            if STEP_PATTERN.match(line):
+                self.step += 1
+                line = STEP_PATTERN.sub(lambda m: f"{self.step}.{m.group(2)}", line, count=1)
+            else:
+                line = PHASE_HEADING_PATTERN.sub(lambda m: m.group(1) + phase_number, line, count=1)
+                line = SUBTASK_HEADING_PATTERN.sub(lambda m: f"{m.group(1)}{phase_number}.{m.group(2)}", line, count=1)
+        self._emit(line)
+
+    def _emit(self, text):
+        self.output.append(text)
+        if self.on_text:
+            self.on_text(text)
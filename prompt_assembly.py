@@ -0,0 +1,116 @@
+# prompt_assembly.py
+import re
+import textwrap
+
+# Pieces a BPE tokenizer roughly splits text into: words, digit groups, whitespace runs and punctuation marks
+_PIECES = re.compile(r"[^\W\d_]+|\d{1,3}|\s+|[^\w\s]|_")
+# Token estimate of the marker left where text was trimmed
+_MARKER_TOKENS = 16
+
+class Prompt(str):
+    """
+    Prompt text built by compact() or join(), carrying how many input tokens
+    compaction saved compared with sending the template as written.
+    """
+    saved_tokens = 0
+
+def estimate_tokens(text):
+    """
+    Estimate the input tokens of a text locally, without an API call.
+
+    Every word counts as one token per 6 letters or part of it, every digit group
+    of up to 3 digits and every punctuation mark as one, and every whitespace run
+    other than the single space between words as one per 8 characters or part of
+    it. For English prose and markdown this lands close to the API's count; it
+    only has to be good enough to compare prompts and to check them against a
+    budget with some room to spare.
+    """
+    tokens = 0
+    for match in _PIECES.finditer(text):
+        piece = match.group()
+        if piece == " ":
+            continue
+        if piece[0].isspace():
+            tokens += (len(piece) + 7) // 8
+        elif piece[0].isalpha():
+            tokens += (len(piece) + 5) // 6
+        else:
+            tokens += 1
+    return tokens
+
+def compact(template, **values):
+    """
+    Build a prompt from an indented triple-quoted template.
+
+    The template is dedented, its lines are stripped of trailing whitespace, runs
+    of blank lines become a single one and the blank lines around it are dropped.
+    Only then are the values substituted (with str.format, so literal braces are
+    doubled as in an f-string), which keeps embedded text such as a roadmap
+    exactly as it is.
+
+    Returns a Prompt whose saved_tokens is the estimated saving against the
+    template as written.
+    """
+    text = "\n".join(line.rstrip() for line in textwrap.dedent(template).splitlines())
+    text = re.sub(r"\n{3,}", "\n\n", text).strip("\n")
+    prompt = Prompt(text.format(**values))
+    prompt.saved_tokens = max(0, estimate_tokens(template.format(**values)) - estimate_tokens(prompt))
+    return prompt
+
+def join(*parts):
+    """Join prompts with a blank line between them; the savings of the parts add up."""
+    prompt = Prompt("\n\n".join(parts))
+    prompt.saved_tokens = sum(getattr(part, "saved_tokens", 0) for part in parts)
+    return prompt
+
+def trim_middle(text, tokens):
+    """
+    Cut about tokens tokens out of the middle of text at line boundaries, leaving
+    a marker in their place.
+
+    The beginning and the end are kept in equal shares: in a prompt they hold the
+    idea and the instructions, while the middle is the bulk of an embedded roadmap.
+    """
+    lines = text.splitlines(keepends=True)
+    keep = max(0, estimate_tokens(text) - tokens - _MARKER_TOKENS) / 2
+    head, used = 0, 0
+    while head < len(lines) and used + estimate_tokens(lines[head]) <= keep:
+        used += estimate_tokens(lines[head])
+        head += 1
+    tail, used = len(lines), 0
+    while tail > head and used + estimate_tokens(lines[tail - 1]) <= keep:
+        used += estimate_tokens(lines[tail - 1])
+        tail -= 1
+    if tail == head:
+        return text
+    marker = f"\n[... {tail - head} lines omitted to fit the input token budget ...]\n\n"
+    return "".join(lines[:head]) + marker + "".join(lines[tail:])
+
+def fit_to_budget(prompt, system, budget, action):
+    """
+    Check a request's input against a token budget, trimming it if asked to.
+
+    Args:
+        prompt: The user message
+        system: Optional list of system content blocks
+        budget: Input tokens allowed; 0 or None disables the check
+        action: "warn" sends an oversized request as it is, "trim" cuts the
+            middle out of its largest part until it fits
+
+    Returns (prompt, system, estimated tokens, tokens trimmed), where the estimate
+    is of the input before trimming.
+    """
+    texts = [prompt] + [block["text"] for block in system or []]
+    estimate = sum(estimate_tokens(text) for text in texts)
+    if not budget or estimate <= budget or action != "trim":
+        return prompt, system, estimate, 0
+
+    largest = max(range(len(texts)), key=lambda index: len(texts[index]))
+    trimmed_text = trim_middle(texts[largest], estimate - budget)
+    trimmed = estimate_tokens(texts[largest]) - estimate_tokens(trimmed_text)
+    if largest == 0:
+        prompt = trimmed_text
+    else:
+        system = [dict(block) for block in system]
+        system[largest - 1]["text"] = trimmed_text
+    return prompt, system, estimate, trimmed
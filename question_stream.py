@@ -0,0 +1,123 @@
+# question_stream.py
+import json
+
+# Customization questions are requested as the input of this tool, so the response
+# is JSON following the schema rather than free text that has to be searched for JSON
+QUESTIONS_TOOL = {
+    "name": "ask_questions",
+    "description": "Ask the user questions that will customize the roadmap to their project, most important first.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "questions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "key": {"type": "string", "description": "Brief slug-like identifier, e.g. tech_stack"},
+                        "question": {"type": "string", "description": "The question, referring to specific roadmap content"}
+                    },
+                    "required": ["key", "question"]
+                }
+            }
+        },
+        "required": ["questions"]
+    }
+}
+
+# Fewer questions than this means the response is repaired rather than used as is
+MIN_QUESTIONS = 5
+
+# Only used when neither the response nor its repair yielded a single question
+DEFAULT_QUESTIONS = {
+    "target_platform": "What are your target platforms/environments?",
+    "timeline": "What is your expected timeline for this project?",
+    "team_size": "What is your team size and composition?",
+    "must_have_features": "What features do you consider must-haves for your MVP?",
+    "tech_stack": "Do you have preferred technologies or frameworks?",
+    "budget": "Do you have budget constraints that would impact the roadmap?",
+    "prior_experience": "What is your team's prior experience with similar projects?",
+    "deployment": "What are your deployment or distribution requirements?",
+    "scaling": "What are your scaling expectations (users, data volume, etc.)?",
+    "integration": "Are there existing systems you need to integrate with?"
+}
+
+class QuestionStreamParser:
+    """
+    Incremental parser that pulls questions out of a streamed JSON response.
+
+    feed() takes text deltas as they arrive and returns the questions they complete
+    as (key, question) pairs, so the first question can be asked while the rest are
+    still being generated. Every JSON object in the stream with non-empty string
+    "key" and "question" fields counts as a question, however deeply it is nested,
+    which covers the tool input ({"questions": [{"key": ..., "question": ...}]}) as
+    well as a model that wrote the JSON as text, in a code fence or after some prose.
+    Each key is returned once.
+
+    problem() describes what is wrong with the response once it has ended: JSON
+    that was cut off or invalid, or too few questions.
+    """
+    def __init__(self):
+        self.questions = {}
+        self.restart()
+
+    def restart(self):
+        """Start on a new response, keeping the questions already found so they aren't returned again."""
+        self.text = ""
+        self.errors = []
+        self.position = 0
+        self.object_starts = []
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, delta):
+        """Add a text delta; returns the (key, question) pairs completed by it."""
+        self.text += delta
+        found = []
+        for position in range(self.position, len(self.text)):
+            char = self.text[position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                # Strings only count inside an object; quotes in prose before the JSON are ignored
+                self.in_string = bool(self.object_starts)
+            elif char == "{":
+                self.object_starts.append(position)
+            elif char == "}" and self.object_starts:
+                question = self._question(self.text[self.object_starts.pop():position + 1])
+                if question is not None:
+                    found.append(question)
+        self.position = len(self.text)
+        return found
+
+    def _question(self, object_text):
+        try:
+            value = json.loads(object_text)
+        except json.JSONDecodeError as e:
+            self.errors.append(f"invalid JSON ({e.msg} at character {e.pos})")
+            return None
+        key, question = value.get("key"), value.get("question")
+        if not isinstance(key, str) or not isinstance(question, str) or not key.strip() or not question.strip():
+            return None
+        key = key.strip()
+        if key in self.questions:
+            return None
+        self.questions[key] = question.strip()
+        return key, self.questions[key]
+
+    def problem(self):
+        """Describe why the response can't be used as is, or return None if it can."""
+        if self.object_starts:
+            return "the JSON was cut off before it was complete"
+        if self.errors:
+            return self.errors[0]
+        if not self.questions:
+            return "no questions were found in the response"
+        if len(self.questions) < MIN_QUESTIONS:
+            return f"only {len(self.questions)} question(s) were returned, at least {MIN_QUESTIONS} are needed"
+        return None
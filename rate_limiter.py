@@ -0,0 +1,140 @@
+# rate_limiter.py
+import json
+import random
+import threading
+import time
+import anthropic
+import httpx
+from config import (
+    RATE_LIMIT_REQUESTS_PER_MINUTE, RATE_LIMIT_TOKENS_PER_MINUTE,
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+)
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, overload and server errors
+RETRYABLE_STATUSES = {408, 409, 429}
+# Error types the API sends in a mid-stream SSE error event that are worth retrying
+RETRYABLE_ERROR_TYPES = {"rate_limit_error", "overloaded_error", "api_error"}
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at per_minute / 60 per second.
+
+    reserve() takes its amount immediately, letting the bucket go into debt, and
+    returns how long the caller has to wait for that debt to be repaid. Callers
+    therefore queue up in the order they reserved instead of racing for capacity.
+    """
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        self._refill(now)
+        # A request larger than the whole bucket waits for a full bucket rather than forever
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount, now):
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class RequestScheduler:
+    """
+    Client-side pacing and retry policy shared by every API call in the process.
+
+    Requests are paced against a requests-per-minute and a tokens-per-minute
+    budget; a request's token cost is estimated up front from the prompt size plus
+    max_tokens and corrected with the real usage once the response is done. A
+    retry-after from the API pauses every caller, not only the one that got it.
+    A budget of 0 disables that limit.
+    """
+    def __init__(self, requests_per_minute=RATE_LIMIT_REQUESTS_PER_MINUTE, tokens_per_minute=RATE_LIMIT_TOKENS_PER_MINUTE,
+                 max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.lock = threading.Lock()
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.paused_until = 0.0
+
+    @staticmethod
+    def estimate_tokens(request):
+        """Estimate a request's token cost: about 4 characters per prompt token, plus max_tokens."""
+        prompt_size = len(json.dumps(request.get("messages", []))) + len(json.dumps(request.get("system", "")))
+        return prompt_size // 4 + request.get("max_tokens", 0)
+
+    def reserve(self, estimated_tokens):
+        """Claim capacity for one request and return how many seconds to wait before sending it."""
+        with self.lock:
+            now = time.monotonic()
+            delay = max(0.0, self.paused_until - now)
+            if self.requests:
+                delay = max(delay, self.requests.reserve(1, now))
+            if self.tokens:
+                delay = max(delay, self.tokens.reserve(estimated_tokens, now))
+            return delay
+
+    def settle(self, estimated_tokens, used_tokens):
+        """Give back the part of the estimate a finished request didn't use (or charge the excess)."""
+        if self.tokens:
+            with self.lock:
+                self.tokens.refund(estimated_tokens - used_tokens, time.monotonic())
+
+    def retry_delay(self, error, attempt):
+        """
+        Decide whether a failed attempt should be retried.
+
+        Returns the number of seconds to wait before the next attempt, or None if
+        the error isn't retryable or attempt (counting from 1) was the last one.
+        Waits use full jitter on an exponential backoff, and are never shorter than
+        the API's retry-after.
+        """
+        if attempt >= self.max_attempts or not is_retryable(error):
+            return None
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+            with self.lock:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        return delay
+
+def is_retryable(error):
+    """
+    True for rate limits, overload, server errors and dropped connections.
+
+    An error event sent in the middle of a stream is raised with the stream's 200
+    status, so for those the error type in the body decides.
+    """
+    if isinstance(error, (anthropic.APIConnectionError, httpx.TransportError)):
+        return True
+    if not isinstance(error, anthropic.APIError):
+        return False
+    if isinstance(error, anthropic.APIStatusError) and error.status_code >= 400:
+        return error.status_code in RETRYABLE_STATUSES or error.status_code >= 500
+    body = error.body if isinstance(error.body, dict) else {}
+    error_type = body.get("error", {}).get("type") if isinstance(body.get("error"), dict) else body.get("type")
+    return error_type in RETRYABLE_ERROR_TYPES
+
+def _retry_after(error):
+    """Seconds from the retry-after-ms or retry-after header of an error response, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        if "retry-after" in response.headers:
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+scheduler = RequestScheduler()
@@ -0,0 +1,124 @@
+# response_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from config import CACHE_DIR, CACHE_MAX_BYTES, CACHE_MAX_AGE_DAYS
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for Claude responses.
+
+    Each entry is stored under a SHA-256 hash of everything that determines the
+    response (model, max tokens, thinking budget and the fully built prompt), so
+    rerunning the same idea with the same settings replays the stored text instead
+    of paying for another API call. Entries are evicted least-recently-used first
+    once the cache grows past max_bytes, and any entry unused for longer than
+    max_age_days is dropped.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=CACHE_MAX_BYTES, max_age_days=CACHE_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model, max_tokens, thinking_budget, prompt):
+        """
+        Build the cache key for a request.
+
+        Args:
+            model: Model name the request is sent to
+            max_tokens: max_tokens for the request
+            thinking_budget: Thinking budget in tokens, or None if thinking is disabled
+            prompt: The fully built prompt (any JSON-serializable value)
+        """
+        payload = json.dumps({
+            "model": model,
+            "max_tokens": max_tokens,
+            "thinking_budget": thinking_budget,
+            "prompt": prompt
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        # Shard by the first two hex digits so no single directory grows too large
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached text for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            last_used = os.path.getmtime(path)
+            if time.time() - last_used > self.max_age_seconds:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # The modification time doubles as the LRU timestamp
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return entry["text"]
+
+    def put(self, key, text):
+        """Store text under key and evict old entries if the cache is over budget."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "text": text}, f)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        """Remove expired entries, then the least recently used ones until under max_bytes."""
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age_seconds:
+                    self._remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+
+    def stats_message(self):
+        """Human-readable summary of cache activity for this run."""
+        return f"Response cache: {self.hits} hit(s), {self.misses} miss(es)"
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,31 +1,129 @@
 # roadmap_generator.py
-from api_client import ClaudeClient
+from api_client import AsyncClaudeClient
+import asyncio
+import contextlib
 import time
 import argparse
 from loading_animation import LoadingAnimation, AnimationType
+from config import PIPELINE_QUESTIONS_AFTER_CHARS, REFINE_MAX_PASSES, REFINE_MIN_CHANGE
+from stream_output import stop_animation_first
+import telemetry
+from roadmap_store import idea_id
+from roadmap_patch import change_ratio
 
-async def generate_roadmap(idea_description, status_callback=None):
+# Stages of the initial roadmap: one stream, or a skeleton followed by the phases in parallel
+ROADMAP_STAGES = ["initial", "skeleton", "phase_"]
+
+def add_metrics_hook(hook):
+    """
+    Register a callable that receives a telemetry.StageMetrics for every API call.
+    
+    Metrics are emitted when a stage finishes, including failed and cached stages;
+    metrics.to_dict() gives a JSON-serializable record tagged with the run id.
+    """
+    telemetry.add_hook(hook)
+
+def remove_metrics_hook(hook):
+    """Unregister a hook added with add_metrics_hook."""
+    telemetry.remove_hook(hook)
+
+async def generate_roadmap(idea_description, status_callback=None, cache=None, on_text=None, run=None, generation_mode=None, ideas=None, profile=None, store=None, max_passes=None, min_change=None):
     """
     Generate a coding roadmap based on the user's idea description.
     
+    Without user answers to customize it, the initial roadmap is refined by
+    self-critique passes until one changes less than min_change of it.
+    
     Args:
         idea_description: Description of the app idea
         status_callback: Optional callback function to update UI about current progress
+        cache: Optional ResponseCache used to replay identical API requests
+        on_text: Optional callback receiving the final roadmap's text deltas as they stream in
+        run: Optional run_store.Run; finished stages are checkpointed to it and skipped
+            when it already holds them
+        generation_mode: "single" or "parallel" (skeleton first, then every phase
+            concurrently); defaults to GENERATION_MODE
+        ideas: Optional IdeaIndex; the initial roadmap of a similar, previously
+            generated idea is reused instead of generating a new one
+        profile: Name of the model profile (see config.PROFILES); defaults to PROFILE
+        store: Optional RoadmapStore; the initial and final roadmaps are recorded as
+            versions of the idea
+        max_passes: Most self-critique passes to run (0 keeps the initial roadmap);
+            defaults to REFINE_MAX_PASSES
+        min_change: Share of the roadmap (0-1) a pass has to change for another pass
+            to follow; defaults to REFINE_MIN_CHANGE
     """
-    client = ClaudeClient()
+    max_passes = REFINE_MAX_PASSES if max_passes is None else max_passes
+    min_change = REFINE_MIN_CHANGE if min_change is None else min_change
+    with _recording_failures(run):
+        telemetry.start_run(run.run_id if run else None)
+        client = AsyncClaudeClient(cache=cache, ideas=ideas, profile=profile)
+        
+        final_roadmap = _restore(run, "final_roadmap", status_callback)
+        if final_roadmap is not None:
+            if on_text:
+                on_text(final_roadmap)
+            return final_roadmap
+        
+        # Don't send standard generation messages via status_callback
+        # The animation will handle these messages
+        
+        initial_roadmap = _restore(run, "initial_roadmap", status_callback)
+        if initial_roadmap is None:
+            initial_roadmap = await _reuse_similar_roadmap(client, idea_description, run, status_callback)
+        if initial_roadmap is None:
+            initial_roadmap = await client.generate_initial_roadmap(idea_description, mode=generation_mode, reuse_similar=False)
+            _report_cache_hit(client, "Initial roadmap", status_callback)
+            _report_budget_warnings(client, status_callback)
+            _checkpoint(run, "initial_roadmap", initial_roadmap)
+        
+        final_roadmap = await _refine_roadmap(client, initial_roadmap, idea_description, run, max_passes, min_change, on_text, status_callback)
+        _checkpoint(run, "final_roadmap", final_roadmap)
+        _store_versions(store, idea_description, run, initial_roadmap, final_roadmap, client.profile, status_callback)
     
-    # Don't send standard generation messages via status_callback
-    # The animation will handle these messages
+    if status_callback:
+        status_callback("✅ Roadmap generation complete!")
+        _report_prompt_savings(client, status_callback)
     
-    initial_roadmap = client.generate_initial_roadmap(idea_description)
+    return final_roadmap
+
+async def generate_customized_roadmap(idea_description, answers, status_callback=None, cache=None, on_text=None, run=None, generation_mode=None, profile=None, store=None):
+    """
+    Generate a customized roadmap in a single request from answers known up front.
     
-    # Don't send standard reflection messages via status_callback
-    # The animation will handle these messages
+    The answers (e.g. a team's answers profile) are folded into the generation
+    prompt, so the question and reflection stages are skipped entirely.
     
-    final_roadmap = client.reflect_on_roadmap(initial_roadmap, idea_description)
+    Args:
+        idea_description: Description of the app idea
+        answers: Dictionary of answers keyed by question key or topic
+        status_callback: Optional callback function to update UI about current progress
+        cache: Optional ResponseCache used to replay identical API requests
+        on_text: Optional callback receiving the roadmap's text deltas as they stream in
+        run: Optional run_store.Run; the finished roadmap is checkpointed to it
+        generation_mode: "single" or "parallel"; defaults to GENERATION_MODE
+        profile: Name of the model profile (see config.PROFILES); defaults to PROFILE
+        store: Optional RoadmapStore; the roadmap is recorded as a version of the idea
+    """
+    with _recording_failures(run):
+        telemetry.start_run(run.run_id if run else None)
+        client = AsyncClaudeClient(cache=cache, profile=profile)
+        
+        final_roadmap = _restore(run, "final_roadmap", status_callback)
+        if final_roadmap is not None:
+            if on_text:
+                on_text(final_roadmap)
+            return final_roadmap
+        
+        final_roadmap = await client.generate_customized_roadmap(idea_description, answers, on_text=on_text, mode=generation_mode)
+        _report_cache_hit(client, "Customized roadmap", status_callback)
+        _report_budget_warnings(client, status_callback)
+        _checkpoint(run, "final_roadmap", final_roadmap)
+        _store_versions(store, idea_description, run, None, final_roadmap, client.profile, status_callback)
     
     if status_callback:
-        status_callback("✅ Roadmap generation complete!")
+        status_callback(f"✅ Roadmap customized to {len(answers)} answer(s) in a single pass, without questions or reflection")
+        _report_prompt_savings(client, status_callback)
     
     return final_roadmap
 
@@ -36,77 +134,445 @@ def format_roadmap(roadmap_text):
     """
     return roadmap_text
 
-async def generate_roadmap_with_questions(idea_description, animation_type=AnimationType.SPINNER, status_callback=None):
+async def generate_roadmap_with_questions(idea_description, animation_type=AnimationType.SPINNER, status_callback=None, cache=None, pipelined=False, on_text=None, run=None, reflection_mode=None, generation_mode=None, ideas=None, profile=None, ask=None, store=None):
     """
     Generate a roadmap with user customization questions.
     
     Args:
         idea_description: Description of the app idea
-        animation_type: Type of animation to display
+        animation_type: Type of animation to display, or None for no progress display
         status_callback: Optional callback function to update UI about current progress
+        cache: Optional ResponseCache used to replay identical API requests
+        pipelined: Overlap the stages: generate questions while the roadmap is still
+            streaming and warm up the reflection request while the user answers
+        on_text: Optional callback receiving the final roadmap's text deltas as they stream in
+        run: Optional run_store.Run; the initial roadmap, questions, each answer and the
+            final roadmap are checkpointed to it, and stages it already holds are skipped
+        reflection_mode: "full" or "patch" (section-level edits applied locally);
+            defaults to REFLECTION_MODE
+        generation_mode: "single" or "parallel" (skeleton first, then every phase
+            concurrently); defaults to GENERATION_MODE
+        ideas: Optional IdeaIndex; the initial roadmap of a similar, previously
+            generated idea is reused instead of generating a new one
+        profile: Name of the model profile (see config.PROFILES); defaults to PROFILE
+        ask: Optional async callable (number, question_key, question_text) returning
+            the answer, or "" to skip; defaults to asking in the terminal
+        store: Optional RoadmapStore; the initial and customized roadmaps are recorded
+            as versions of the idea
     """
-    client = ClaudeClient()
+    with _recording_failures(run):
+        return await _generate_roadmap_with_questions(
+            idea_description, animation_type, status_callback, cache, pipelined, on_text, run,
+            reflection_mode, generation_mode, ideas, profile, ask or terminal_asker(), store
+        )
+
+async def _generate_roadmap_with_questions(idea_description, animation_type, status_callback, cache, pipelined, on_text, run,
+                                           reflection_mode, generation_mode, ideas, profile, ask, store):
+    telemetry.start_run(run.run_id if run else None)
+    client = AsyncClaudeClient(cache=cache, ideas=ideas, profile=profile)
     
-    # Step 1: Generate initial roadmap with animation
-    roadmap_animation = LoadingAnimation("Generating roadmap based on your idea", animation_type)
-    roadmap_animation.start()
+    final_roadmap = _restore(run, "final_roadmap", status_callback)
+    if final_roadmap is not None:
+        if on_text:
+            on_text(final_roadmap)
+        return final_roadmap
     
-    initial_roadmap = client.generate_initial_roadmap(idea_description)
-    roadmap_animation.stop()
+    overlap_saved = 0.0
+    initial_roadmap = _restore(run, "initial_roadmap", status_callback)
+    questions = _restore(run, "questions", status_callback)
+    if initial_roadmap is None:
+        initial_roadmap = await _reuse_similar_roadmap(client, idea_description, run, status_callback)
     
-    if status_callback:
-        status_callback("✅ Initial roadmap generation complete!")
-    
-    # Generate questions animation
-    questions_animation = LoadingAnimation("Analyzing roadmap and generating customized questions", animation_type)
-    questions_animation.start()
+    roadmap_finished = None
+    if initial_roadmap is None and pipelined:
+        initial_roadmap, questions_stream, roadmap_finished = await _generate_roadmap_and_questions_pipelined(
+            client, idea_description, animation_type, status_callback, cache, run, generation_mode
+        )
+    else:
+        if initial_roadmap is None:
+            # Step 1: Generate initial roadmap with animation
+            roadmap_animation = LoadingAnimation("Generating roadmap based on your idea", animation_type, stages=ROADMAP_STAGES)
+            roadmap_animation.start()
+            
+            try:
+                initial_roadmap = await client.generate_initial_roadmap(idea_description, mode=generation_mode, reuse_similar=False)
+            finally:
+                roadmap_animation.stop()
+            _report_cache_hit(client, "Initial roadmap", status_callback)
+            _report_budget_warnings(client, status_callback)
+            _checkpoint(run, "initial_roadmap", initial_roadmap)
+            
+            if status_callback:
+                status_callback("✅ Initial roadmap generation complete!")
+        
+        # Generate questions based on the roadmap content; each is asked as soon as it arrives
+        if questions is None:
+            questions_stream = QuestionStream(client, initial_roadmap, idea_description, cache, run)
+        else:
+            questions_stream = QuestionStream.from_questions(questions)
     
-    # Generate questions based on the roadmap content
-    questions = generate_questions_from_roadmap(initial_roadmap, idea_description)
+    # Answers saved by an interrupted run, including skipped (empty) ones
+    answers = _restore(run, "answers", status_callback) or {}
+    asking = questions_stream.task is not None or any(key not in answers for key in questions_stream.questions)
     
-    questions_animation.stop()
+    # Warm up the reflection request while the user is still typing answers
+    if pipelined and asking:
+        warm_up_task = asyncio.create_task(client.warm_up(initial_roadmap, idea_description))
     
-    if status_callback:
-        status_callback("✅ Customized questions generated!")
+    # Ask questions and collect answers, the first one while the rest are still being generated
+    try:
+        number = 0
+        while True:
+            message = "Generating the next question" if number else "Analyzing roadmap and generating customized questions"
+            item = await questions_stream.next(animation_type, message)
+            if item is None:
+                break
+            number += 1
+            question_key, question_text = item
+            if question_key in answers:
+                continue
+            user_answer = await ask(number, question_key, question_text)
+            answers[question_key] = user_answer
+            if run:
+                run.save_answer(question_key, user_answer)
+        await questions_stream.wait()
+    finally:
+        questions_stream.cancel()
+    if run:
+        run.finish_answers(answers)
     
-    print("\nBased on the roadmap analysis, please answer these questions to help customize it further:")
-    print("(Press Enter to skip any question you don't know or don't care about)\n")
+    if questions_stream.client is not None:
+        _report_cache_hit(questions_stream.client, "Questions", status_callback)
+        _report_budget_warnings(questions_stream.client, status_callback)
+        _report_questions_repair(questions_stream.client, status_callback)
+        client.merge_usage(questions_stream.client)
+        if roadmap_finished is not None:
+            # Serially, the questions would have started when the roadmap finished
+            overlap_saved += max(0.0, min(questions_stream.finished, roadmap_finished) - questions_stream.started)
     
-    # Ask questions and collect answers
-    answers = {}
-    for i, (question_key, question_text) in enumerate(questions.items(), 1):
-        user_answer = input(f"{i}. {question_text}\n   > ")
-        if user_answer.strip():
-            answers[question_key] = user_answer
+    # The warm-up is an extra request the serial pipeline never makes, so its duration isn't
+    # time saved; what it saves the reflection call (connection setup, a cached prefix) is
+    # reported in that call's time to first token and the prompt cache totals
+    warmed_tokens = await warm_up_task if pipelined and asking else None
     
     # Step 2: Reflection process with animation - use the same style as initial generation
-    reflection_animation = LoadingAnimation("Starting reflection process with your input", animation_type)
+    reflection_animation = LoadingAnimation("Starting reflection process with your input", animation_type, stages=["reflection"])
     reflection_animation.start()
     
     # Package the answers with the roadmap for reflection
-    final_roadmap = client.reflect_on_roadmap_with_answers(initial_roadmap, idea_description, answers)
-    reflection_animation.stop()
+    try:
+        final_roadmap = await client.reflect_on_roadmap_with_answers(
+            initial_roadmap, idea_description,
+            {key: answer for key, answer in answers.items() if answer.strip()},
+            on_text=stop_animation_first(reflection_animation, on_text), mode=reflection_mode
+        )
+    finally:
+        if reflection_animation.is_running:
+            reflection_animation.stop()
+    _report_cache_hit(client, "Customized roadmap", status_callback)
+    _report_budget_warnings(client, status_callback)
+    _report_patch_result(client, status_callback)
+    _checkpoint(run, "final_roadmap", final_roadmap)
+    _store_versions(store, idea_description, run, initial_roadmap, final_roadmap, client.profile, status_callback)
     
     if status_callback:
         status_callback("✅ Roadmap customization complete!")
+        if pipelined:
+            status_callback(f"⏱ Pipelining saved about {overlap_saved:.1f}s of waiting by generating questions while the roadmap streamed")
+            if warmed_tokens:
+                status_callback(f"⏱ Warmed up the customization request while you answered ({warmed_tokens} prompt tokens prepared)")
+        prompt_cache_message = client.prompt_cache_message()
+        if prompt_cache_message:
+            status_callback(f"⚡ {prompt_cache_message}")
+        _report_prompt_savings(client, status_callback)
     
     return final_roadmap
 
-def generate_questions_from_roadmap(roadmap, idea_description):
+def terminal_asker():
+    """
+    Return an ask callable for generate_roadmap_with_questions that reads answers from the terminal.
+    
+    The instructions are printed before the first question. Answers are read off the
+    event loop so other tasks, like the question stream, keep running while the user types.
+    """
+    introduced = False
+    
+    async def ask(number, question_key, question_text):
+        nonlocal introduced
+        if not introduced:
+            print("\nBased on the roadmap analysis, please answer these questions to help customize it further:")
+            print("(Press Enter to skip any question you don't know or don't care about)\n")
+            introduced = True
+        return await asyncio.to_thread(input, f"{number}. {question_text}\n   > ")
+    
+    return ask
+
+async def _generate_roadmap_and_questions_pipelined(client, idea_description, animation_type, status_callback, cache, run=None, generation_mode=None):
+    """
+    Stream the initial roadmap and start question generation before it finishes.
+    
+    Question generation starts from the idea and the partial roadmap once
+    PIPELINE_QUESTIONS_AFTER_CHARS characters have streamed in (or from the full
+    roadmap if it is shorter), so the two requests overlap.
+    
+    Returns (initial_roadmap, questions_stream, roadmap_finished), where
+    questions_stream is the running QuestionStream and roadmap_finished the
+    perf_counter time the roadmap was done, to measure the overlap by.
+    """
+    partial_chunks = []
+    partial_length = 0
+    questions_stream = None
+    
+    def on_text(delta):
+        nonlocal partial_length, questions_stream
+        partial_chunks.append(delta)
+        partial_length += len(delta)
+        if questions_stream is None and partial_length >= PIPELINE_QUESTIONS_AFTER_CHARS:
+            partial_roadmap = "".join(partial_chunks)[:PIPELINE_QUESTIONS_AFTER_CHARS]
+            questions_stream = QuestionStream(client, partial_roadmap, idea_description, cache, run)
+    
+    roadmap_animation = LoadingAnimation("Generating roadmap based on your idea", animation_type, stages=ROADMAP_STAGES)
+    roadmap_animation.start()
+    try:
+        initial_roadmap = await client.generate_initial_roadmap(idea_description, on_text=on_text, mode=generation_mode, reuse_similar=False)
+        roadmap_finished = time.perf_counter()
+    except BaseException:
+        if questions_stream is not None:
+            questions_stream.cancel()
+        raise
+    finally:
+        roadmap_animation.stop()
+    _report_cache_hit(client, "Initial roadmap", status_callback)
+    _report_budget_warnings(client, status_callback)
+    _checkpoint(run, "initial_roadmap", initial_roadmap)
+    
+    if status_callback:
+        status_callback("✅ Initial roadmap generation complete!")
+    
+    if questions_stream is None:
+        questions_stream = QuestionStream(client, initial_roadmap, idea_description, cache, run)
+    return initial_roadmap, questions_stream, roadmap_finished
+
+class QuestionStream:
+    """
+    Customization questions generated in a background task and handed out as they arrive.
+    
+    next() returns each (key, question) pair as soon as the stream has completed it,
+    so the user answers the first question while the rest are still being written.
+    The questions are generated on their own client so per-call state doesn't
+    interleave with the main client's, and are checkpointed to the run once all of
+    them are in.
+    """
+    def __init__(self, client, roadmap, idea_description, cache=None, run=None):
+        """
+        Args:
+            client: The run's AsyncClaudeClient, whose profile the question client uses
+            roadmap: The (possibly partial) initial roadmap to ask about
+            idea_description: Description of the app idea
+            cache: Optional ResponseCache used to replay identical API requests
+            run: Optional run_store.Run the finished questions are checkpointed to
+        """
+        self.client = AsyncClaudeClient(cache=cache, profile=client.profile)
+        self.questions = {}
+        self.queue = asyncio.Queue()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.task = asyncio.create_task(self._run(roadmap, idea_description, run))
+    
+    @classmethod
+    def from_questions(cls, questions):
+        """A stream of questions that are already known, e.g. restored from a checkpoint."""
+        stream = cls.__new__(cls)
+        stream.client = None
+        stream.questions = dict(questions)
+        stream.queue = asyncio.Queue()
+        for item in stream.questions.items():
+            stream.queue.put_nowait(item)
+        stream.queue.put_nowait(None)
+        stream.started = stream.finished = None
+        stream.task = None
+        return stream
+    
+    async def _run(self, roadmap, idea_description, run):
+        try:
+            async for key, question in self.client.stream_questions(roadmap, idea_description):
+                self.questions[key] = question
+                self.queue.put_nowait((key, question))
+            _checkpoint(run, "questions", self.questions)
+        finally:
+            self.finished = time.perf_counter()
+            # Wake up next() even when the stream failed; wait() raises the error
+            self.queue.put_nowait(None)
+    
+    async def next(self, animation_type=AnimationType.SPINNER, message="Generating customized questions"):
+        """
+        Return the next (key, question) pair, or None once every question has been handed out.
+        
+        A progress line with the message is shown while waiting for a question that
+        hasn't arrived yet.
+        """
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        animation = LoadingAnimation(message, animation_type, stages=["questions"])
+        animation.start()
+        try:
+            return await self.queue.get()
+        finally:
+            animation.stop()
+    
+    async def wait(self):
+        """Wait for the stream to end, raising its error if it failed, and return every question."""
+        if self.task is not None:
+            await self.task
+        return self.questions
+    
+    def cancel(self):
+        """Stop generating questions, e.g. when the user interrupts the run."""
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+async def generate_questions_from_roadmap(roadmap, idea_description, client=None):
     """
     Generate relevant questions based on the roadmap content.
     Uses Claude to generate specific questions based on the roadmap content.
     
+    Args:
+        client: Optional AsyncClaudeClient to reuse; a new one is created if omitted
+    
     Returns a dictionary of question_key: question_text pairs
     """
-    # Create a new instance of ClaudeClient
-    client = ClaudeClient()
+    if client is None:
+        client = AsyncClaudeClient()
     
     # Use Claude to generate questions specific to this roadmap
-    questions = client.generate_questions_for_roadmap(roadmap, idea_description)
+    questions = await client.generate_questions_for_roadmap(roadmap, idea_description)
     
     return questions
 
+def _recording_failures(run):
+    """Context manager marking the run failed or interrupted on errors; a no-op without a run."""
+    return run.recording_failures() if run else contextlib.nullcontext()
+
+def _checkpoint(run, stage, value):
+    """Save a finished stage's output to the run, if there is one."""
+    if run:
+        run.save(stage, value)
+
+def _restore(run, stage, status_callback):
+    """Return a stage's output saved by an earlier attempt of the run, or None."""
+    value = run.load(stage) if run else None
+    if value is not None and status_callback and stage != "answers":
+        status_callback(f"↩ Restored {stage.replace('_', ' ')} from run {run.run_id}")
+    return value
+
+def _store_versions(store, idea_description, run, initial_roadmap, final_roadmap, profile, status_callback):
+    """
+    Record a run's initial and final roadmaps as versions of the idea, if there is a RoadmapStore.
+    
+    initial_roadmap is None for a single-pass run, whose only roadmap is the final one.
+    profile is the name of the model profile the run used, recorded with each version.
+    Storing versions is a side record: a failure to write them is reported but doesn't fail the run.
+    """
+    if store is None:
+        return
+    run_id = run.run_id if run else None
+    try:
+        initial_version = store.commit(idea_description, initial_roadmap, "initial", run_id=run_id, profile=profile) if initial_roadmap is not None else None
+        final_version = store.commit(idea_description, final_roadmap, "reflected", run_id=run_id, parent=initial_version, profile=profile)
+    except OSError as e:
+        if status_callback:
+            status_callback(f"Could not store the roadmap versions: {e}")
+        return
+    if status_callback:
+        versions = f"version {final_version}" if initial_version in (None, final_version) else f"versions {initial_version} and {final_version}"
+        status_callback(f"🗃  Stored as {versions} of idea {idea_id(idea_description)}")
+
+async def _refine_roadmap(client, roadmap, idea_description, run, max_passes, min_change, on_text, status_callback):
+    """
+    Improve a roadmap by self-critique until a pass barely changes it or max_passes have run.
+    
+    After each pass, change_ratio measures the share of the roadmap it rewrote; once
+    that falls below min_change the roadmap has converged and no further pass is paid
+    for. Only the last allowed pass streams to on_text, since an earlier one may still
+    be followed by another; a roadmap that converged sooner is handed over in one piece.
+    Every pass is checkpointed to the run, so a resumed run continues after the last one.
+    """
+    refinement = _restore(run, "refinement", status_callback) or {"roadmap": roadmap, "changes": []}
+    roadmap, changes = refinement["roadmap"], refinement["changes"]
+    streamed = False
+    while len(changes) < max_passes and not (changes and changes[-1] < min_change):
+        pass_number = len(changes) + 1
+        streamed = pass_number == max_passes
+        revised = await client.refine_roadmap(roadmap, idea_description, on_text=on_text if streamed else None, pass_number=pass_number)
+        _report_cache_hit(client, f"Refinement pass {pass_number}", status_callback)
+        _report_budget_warnings(client, status_callback)
+        if not revised.strip():
+            if status_callback:
+                status_callback(f"Refinement pass {pass_number} returned no roadmap; keeping the previous one")
+            streamed = False
+            break
+        change = change_ratio(roadmap, revised)
+        roadmap = revised
+        changes.append(round(change, 4))
+        _checkpoint(run, "refinement", {"roadmap": roadmap, "changes": changes})
+        if status_callback:
+            status_callback(f"🔁 Refinement pass {pass_number}/{max_passes} changed {change:.1%} of the roadmap")
+    
+    skipped = max_passes - len(changes)
+    if changes and changes[-1] < min_change and skipped and status_callback:
+        status_callback(f"⚡ Converged below {min_change:.0%} change after {len(changes)} pass(es); skipped {skipped} more")
+    if on_text and not streamed:
+        on_text(roadmap)
+    return roadmap
+
+async def _reuse_similar_roadmap(client, idea_description, run, status_callback):
+    """
+    Reuse the initial roadmap of a similar, previously generated idea, if the client has an IdeaIndex.
+    
+    Runs before the initial roadmap's animation starts, so an offer to reuse the
+    match can prompt the user. Returns the reused roadmap (checkpointed to the run),
+    or None to generate one.
+    """
+    roadmap = await client.reuse_similar_roadmap(idea_description)
+    if roadmap is None:
+        return None
+    if status_callback:
+        match = client.last_reused_idea
+        status_callback(f"⚡ Reused the initial roadmap of a similar idea ({match.similarity:.0%} similar): {match.idea}")
+    _checkpoint(run, "initial_roadmap", roadmap)
+    return roadmap
+
+def _report_patch_result(client, status_callback):
+    """Tell the UI whether a patch-mode reflection was applied or fell back to a full rewrite."""
+    if not status_callback:
+        return
+    if client.last_patch_operations is not None:
+        status_callback(f"⚡ Applied {client.last_patch_operations} section edit(s) instead of regenerating the roadmap")
+    elif client.last_patch_fallback:
+        status_callback(f"Section patch could not be applied ({client.last_patch_fallback}); regenerated the full roadmap")
+
+def _report_questions_repair(client, status_callback):
+    """Tell the UI when the question response was malformed and had to be repaired."""
+    if client.last_questions_repair and status_callback:
+        status_callback(f"Question response could not be used as is ({client.last_questions_repair}); asked the model to repair it")
+
+def _report_budget_warnings(client, status_callback):
+    """Tell the UI about prompts estimated over the input token budget."""
+    for warning in client.pop_budget_warnings():
+        if status_callback:
+            status_callback(f"⚠ {warning}")
+
+def _report_prompt_savings(client, status_callback):
+    """Tell the UI how many input tokens prompt compaction saved, stage by stage."""
+    prompt_savings_message = client.prompt_savings_message()
+    if prompt_savings_message:
+        status_callback(f"⚡ {prompt_savings_message}")
+
+def _report_cache_hit(client, stage_name, status_callback):
+    """Tell the UI when a stage was replayed from the response cache instead of the API."""
+    if client.last_call_cached and status_callback:
+        status_callback(f"⚡ {stage_name} replayed from cache (hit)")
+
 def main():
     parser = argparse.ArgumentParser(description='Generate a project roadmap with dynamic loading indicators')
     parser.add_argument('--animation', choices=['spinner', 'dots', 'bar', 'typing'], default='spinner',
@@ -147,5 +613,4 @@ def main():
         print("\n" + roadmap)
 
 if __name__ == "__main__":
-    import asyncio
     main()
\ No newline at end of file
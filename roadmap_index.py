@@ -0,0 +1,361 @@
+# roadmap_index.py
+import json
+import os
+import re
+import zlib
+from roadmap_patch import parse_sections
+
+INDEX_DIR_NAME = ".index"
+INDEX_VERSION = 2
+# Postings are split over this many files by term hash, so a query only loads the shards of its terms
+POSTING_SHARDS = 64
+# Files indexed since the last merge keep their postings in a segment file of their own; once
+# this many segments and superseded files pile up, they are merged into the shards
+MAX_SEGMENTS = 16
+
+STEP_PATTERN = re.compile(r'^\s*(\d+)\.\s+(.*\S)')
+# Words, keeping technology names like c++, c#, node.js and next.js in one piece
+TOKEN_PATTERN = re.compile(r'[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*')
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "this", "to", "was", "will", "with"
+}
+
+def tokenize(text):
+    """Lowercase search terms in text, without stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def parse_roadmap(markdown):
+    """
+    Parse a roadmap into a compact tree of phases, sub-tasks and numbered steps.
+
+    Returns {"title": str, "phases": [{"title", "steps", "subtasks": [{"title", "steps"}]}]}
+    where each step is a [number, text] pair. H1 is the title, H2 headings are phases
+    and H3 headings are sub-tasks; steps before the first sub-task of a phase belong
+    to the phase itself. Only numbered list items count as steps.
+    """
+    tree = {"title": "", "phases": []}
+    for section in parse_sections(markdown):
+        steps = _steps(section.text)
+        if section.level <= 1:
+            if section.level == 1 and not tree["title"]:
+                tree["title"] = section.title
+            if steps:
+                _phase(tree, "")["steps"].extend(steps)
+        elif section.level == 2:
+            tree["phases"].append({"title": section.title, "steps": steps, "subtasks": []})
+        else:
+            _phase(tree, "")["subtasks"].append({"title": section.title, "steps": steps})
+    return tree
+
+def _phase(tree, title):
+    """Return the last phase of the tree, creating an untitled one if there is none yet."""
+    if not tree["phases"]:
+        tree["phases"].append({"title": title, "steps": [], "subtasks": []})
+    return tree["phases"][-1]
+
+def _steps(text):
+    steps = []
+    in_fence = False
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else STEP_PATTERN.match(line)
+        if match:
+            steps.append([int(match.group(1)), match.group(2)])
+    return steps
+
+def _sections(markdown):
+    """
+    Yield (heading_path, text) for every section of a roadmap, in document order.
+
+    The path joins the phase and sub-task headings with " > ", so section queries can
+    match either level.
+    """
+    phase = ""
+    for section in parse_sections(markdown):
+        if section.level == 2:
+            phase = section.title
+            path = phase
+        elif section.level == 3:
+            path = f"{phase} > {section.title}" if phase else section.title
+        else:
+            path = section.title
+        yield path, section.text
+
+class RoadmapIndex:
+    """
+    Incremental on-disk inverted index over the roadmaps in a directory.
+
+    <directory>/.index/index.json records each file's title, section headings, size
+    and modification time, so update() only re-parses files that changed. The
+    postings, mapping every term to the files and sections it occurs in, are sharded
+    by term hash over .index/postings/, so a search only reads the shards of its own
+    terms. Each file's parsed tree is kept in .index/trees/, so show() never has to
+    read the markdown again.
+
+    A roadmap's terms land in nearly every shard, so indexing one file doesn't
+    rewrite them: its postings go to a segment of its own in .index/segments/, and
+    the shard postings of a changed or removed file are ignored from then on. Once
+    MAX_SEGMENTS segments and superseded files have piled up, save() merges the
+    segments into the shards and drops the superseded postings in one pass.
+    """
+
+    def __init__(self, directory="roadmaps"):
+        self.directory = directory
+        self.index_dir = os.path.join(directory, INDEX_DIR_NAME)
+        self.index_path = os.path.join(self.index_dir, "index.json")
+        self._data = None
+        self._shards = {}
+        self._dirty_shards = set()
+        self._segments = {}
+        self._dirty_segments = set()
+        self._removed_segments = set()
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        # stale counts the files whose shard postings were superseded since the last merge
+        return {"version": INDEX_VERSION, "files": {}, "stale": 0}
+
+    def _shard_path(self, shard):
+        return os.path.join(self.index_dir, "postings", f"{shard:02d}.json")
+
+    def _segment_path(self, name):
+        return os.path.join(self.index_dir, "segments", f"{name}.json")
+
+    @staticmethod
+    def _shard_of(term):
+        return zlib.crc32(term.encode("utf-8")) % POSTING_SHARDS
+
+    def _in_shards(self, name):
+        """Whether a file's current postings are the ones in the shards rather than in a segment."""
+        entry = self.data["files"].get(name)
+        return entry is not None and not entry["segment"]
+
+    def _postings(self, term):
+        """Return the {file: [section positions]} postings of a term, from its shard and the segments."""
+        postings = {name: positions for name, positions in self._load_shard(self._shard_of(term)).get(term, {}).items()
+                    if self._in_shards(name)}
+        for name, entry in self.data["files"].items():
+            if entry["segment"]:
+                positions = self._load_segment(name).get(term)
+                if positions is not None:
+                    postings[name] = positions
+        return postings
+
+    def _load_segment(self, name):
+        if name not in self._segments:
+            try:
+                with open(self._segment_path(name), "r", encoding="utf-8") as f:
+                    self._segments[name] = json.load(f)
+            except (OSError, ValueError):
+                self._segments[name] = {}
+        return self._segments[name]
+
+    def _load_shard(self, shard):
+        if shard not in self._shards:
+            try:
+                with open(self._shard_path(shard), "r", encoding="utf-8") as f:
+                    self._shards[shard] = json.load(f)
+            except (OSError, ValueError):
+                self._shards[shard] = {}
+        return self._shards[shard]
+
+    def save(self):
+        segments = sum(1 for entry in self.data["files"].values() if entry["segment"])
+        if segments + self.data["stale"] > MAX_SEGMENTS:
+            self._merge()
+        os.makedirs(os.path.join(self.index_dir, "postings"), exist_ok=True)
+        os.makedirs(os.path.join(self.index_dir, "segments"), exist_ok=True)
+        for shard in self._dirty_shards:
+            _write_json(self._shard_path(shard), self._shards[shard])
+        self._dirty_shards.clear()
+        for name in self._dirty_segments:
+            _write_json(self._segment_path(name), self._segments[name])
+        self._dirty_segments.clear()
+        # The file table is written after the postings, so a crash leaves files to be re-indexed
+        # rather than missing postings, and before old segments go, so it never points at one
+        _write_json(self.index_path, self.data)
+        for name in self._removed_segments:
+            try:
+                os.remove(self._segment_path(name))
+            except OSError:
+                pass
+        self._removed_segments.clear()
+
+    def _merge(self):
+        """Fold every segment into the shards and drop the superseded shard postings."""
+        for shard in range(POSTING_SHARDS):
+            postings = self._load_shard(shard)
+            for term in list(postings):
+                files = {name: positions for name, positions in postings[term].items() if self._in_shards(name)}
+                if files:
+                    postings[term] = files
+                else:
+                    del postings[term]
+            self._dirty_shards.add(shard)
+        for name, entry in self.data["files"].items():
+            if not entry["segment"]:
+                continue
+            for term, positions in self._load_segment(name).items():
+                self._load_shard(self._shard_of(term)).setdefault(term, {})[name] = positions
+            entry["segment"] = False
+            self._dirty_segments.discard(name)
+            self._removed_segments.add(name)
+        self._segments.clear()
+        self.data["stale"] = 0
+
+    def _tree_path(self, name):
+        return os.path.join(self.index_dir, "trees", f"{name}.json")
+
+    def update(self):
+        """
+        Bring the index up to date with the directory and save it if anything changed.
+
+        Returns (added_or_changed, removed) file counts.
+        """
+        try:
+            entries = {entry.name: entry.stat() for entry in os.scandir(self.directory)
+                       if entry.is_file() and entry.name.endswith(".md")}
+        except OSError:
+            entries = {}
+
+        changed = 0
+        for name, stat in entries.items():
+            known = self.data["files"].get(name)
+            if known is None or known["mtime"] != stat.st_mtime or known["size"] != stat.st_size:
+                self._add(name, stat)
+                changed += 1
+
+        removed = [name for name in self.data["files"] if name not in entries]
+        for name in removed:
+            self._remove(name)
+
+        if changed or removed:
+            self.save()
+        return changed, len(removed)
+
+    def add_file(self, path):
+        """Index (or re-index) one roadmap right after it was written, and save the index."""
+        name = os.path.basename(path)
+        self._add(name, os.stat(os.path.join(self.directory, name)))
+        self.save()
+
+    def _add(self, name, stat):
+        with open(os.path.join(self.directory, name), "r", encoding="utf-8", errors="replace") as f:
+            markdown = f.read()
+
+        if name in self.data["files"]:
+            self._remove(name)
+
+        tree = parse_roadmap(markdown)
+        os.makedirs(os.path.dirname(self._tree_path(name)), exist_ok=True)
+        _write_json(self._tree_path(name), tree)
+
+        sections = []
+        terms = {}
+        for position, (path, text) in enumerate(_sections(markdown)):
+            sections.append(path)
+            for term in set(tokenize(text)):
+                terms.setdefault(term, []).append(position)
+
+        self._segments[name] = terms
+        self._dirty_segments.add(name)
+        self._removed_segments.discard(name)
+        self.data["files"][name] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "title": tree["title"],
+            "sections": sections,
+            "segment": True
+        }
+
+    def _remove(self, name):
+        entry = self.data["files"].pop(name)
+        if entry["segment"]:
+            self._segments.pop(name, None)
+            self._dirty_segments.discard(name)
+            self._removed_segments.add(name)
+        else:
+            # Its shard postings stay until the next merge; _in_shards() ignores them
+            self.data["stale"] += 1
+        try:
+            os.remove(self._tree_path(name))
+        except OSError:
+            pass
+
+    def search(self, query, section=None, limit=10):
+        """
+        Find roadmaps containing every term of query.
+
+        Args:
+            query: Keywords; all of them must occur in a file (in the same file, not
+                necessarily the same section)
+            section: Optional text a matching section's heading path must contain,
+                e.g. "architecture" or "testing > unit"
+            limit: Maximum number of results
+
+        Returns a list of {"file", "title", "score", "sections"} dicts, best first;
+        sections lists the headings of the matching sections.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        section_filter = section.lower() if section else None
+
+        postings = {term: self._postings(term) for term in terms}
+        candidates = None
+        for term in terms:
+            files = set(postings[term])
+            candidates = files if candidates is None else candidates & files
+            if not candidates:
+                return []
+
+        results = []
+        for name in candidates:
+            headings = self.data["files"][name]["sections"]
+            hits = {}
+            for term in terms:
+                for position in postings[term][name]:
+                    if section_filter is None or section_filter in headings[position].lower():
+                        hits.setdefault(position, set()).add(term)
+            if section_filter is not None and set().union(*hits.values()) != set(terms):
+                continue
+            # Sections containing every term count double
+            score = sum(len(matched) * (2 if len(matched) == len(terms) else 1) for matched in hits.values())
+            best = sorted(hits, key=lambda position: (-len(hits[position]), position))
+            results.append({
+                "file": name,
+                "title": self.data["files"][name]["title"],
+                "score": score,
+                "sections": [headings[position] for position in best]
+            })
+
+        results.sort(key=lambda result: (-result["score"], result["file"]))
+        return results[:limit]
+
+    def tree(self, name):
+        """Return the parsed tree of an indexed roadmap; raises KeyError if it isn't indexed."""
+        if name not in self.data["files"]:
+            raise KeyError(f"{name} is not an indexed roadmap in {self.directory}")
+        with open(self._tree_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
@@ -0,0 +1,166 @@
+# roadmap_patch.py
+import difflib
+import json
+import re
+
+HEADING_PATTERN = re.compile(r'^(#{1,3})\s+(.+?)\s*#*\s*$')
+OPERATIONS = ("replace", "insert_after", "delete")
+
+class PatchError(ValueError):
+    """A section patch that can't be parsed or applied to the roadmap."""
+
+class Section:
+    """One H1/H2/H3 section of a roadmap: its heading line and the text up to the next heading."""
+    def __init__(self, section_id, level, title, text):
+        self.id = section_id
+        self.level = level
+        self.title = title
+        self.text = text
+
+def parse_sections(markdown):
+    """
+    Split a markdown roadmap into a flat list of sections at H1, H2 and H3 headings.
+
+    Text before the first heading becomes a level-0 preamble section. Headings inside
+    ``` fences are ignored. Section ids (S1, S2, ...) follow document order, and
+    joining the sections' text gives back the original document.
+    """
+    sections = []
+    current = []
+    level, title = 0, ""
+    in_fence = False
+
+    def close():
+        if current or sections:
+            sections.append(Section(f"S{len(sections) + 1}", level, title, "".join(current)))
+
+    for line in markdown.splitlines(keepends=True):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_PATTERN.match(line)
+        if match:
+            close()
+            current = []
+            level, title = len(match.group(1)), match.group(2)
+        current.append(line)
+    close()
+
+    # Drop an empty preamble so ids start at the first real section
+    if sections and sections[0].level == 0 and not sections[0].text.strip():
+        sections.pop(0)
+        for index, section in enumerate(sections, 1):
+            section.id = f"S{index}"
+    return sections
+
+def format_outline(sections):
+    """List section ids with their headings, indented by level, for the patch prompt."""
+    lines = []
+    for section in sections:
+        indent = "  " * max(0, section.level - 1)
+        title = section.title if section.level else "(text before the first heading)"
+        lines.append(f"{indent}[{section.id}] {'#' * section.level} {title}".rstrip())
+    return "\n".join(lines)
+
+def change_ratio(old, new):
+    """
+    Estimate how much of a roadmap changed between two versions, from 0.0 (same
+    text) to 1.0 (nothing in common).
+
+    The versions' sections are aligned by heading; aligned sections, and sections
+    whose heading was reworded in place, are compared word by word, while added
+    and removed sections count as changed in full. The result is the share of
+    words, across both versions, that are not part of a match.
+    """
+    old_sections, new_sections = parse_sections(old), parse_sections(new)
+    old_words = [section.text.split() for section in old_sections]
+    new_words = [section.text.split() for section in new_sections]
+    total = sum(map(len, old_words)) + sum(map(len, new_words))
+    if not total:
+        return 0.0
+
+    headings = difflib.SequenceMatcher(
+        None,
+        [(section.level, " ".join(section.title.lower().split())) for section in old_sections],
+        [(section.level, " ".join(section.title.lower().split())) for section in new_sections],
+        autojunk=False
+    )
+    matched = 0
+    for tag, old_start, old_end, new_start, new_end in headings.get_opcodes():
+        if tag not in ("equal", "replace"):
+            continue
+        for before, after in zip(old_words[old_start:old_end], new_words[new_start:new_end]):
+            if before == after:
+                matched += len(before)
+            else:
+                blocks = difflib.SequenceMatcher(None, before, after, autojunk=False).get_matching_blocks()
+                matched += sum(block.size for block in blocks)
+    return 1.0 - 2 * matched / total
+
+def parse_patch(response_text):
+    """
+    Extract the list of operations from the model's patch response.
+
+    Accepts the JSON object on its own or wrapped in a ```json fence.
+    """
+    fenced = re.search(r'```(?:json)?\s*(\{.*\})\s*```', response_text, re.DOTALL)
+    candidate = fenced.group(1) if fenced else response_text[response_text.find("{"):response_text.rfind("}") + 1]
+    try:
+        # strict=False accepts raw newlines inside strings, which models often emit in markdown content
+        patch = json.loads(candidate, strict=False)
+    except ValueError as e:
+        raise PatchError(f"patch is not valid JSON: {e}")
+
+    operations = patch.get("operations") if isinstance(patch, dict) else None
+    if not isinstance(operations, list):
+        raise PatchError("patch has no operations list")
+    return operations
+
+def apply_patch(sections, operations):
+    """
+    Apply section operations and return the patched document.
+
+    Each operation is {"op": "replace" | "insert_after" | "delete", "section": id,
+    "content": markdown}; content is required except for delete. A section can be
+    replaced or deleted at most once, and several insertions after the same section
+    keep their order. Any unknown id, unknown op or conflict raises PatchError so the
+    caller can fall back to regenerating the whole roadmap.
+    """
+    by_id = {section.id: section for section in sections}
+    replaced = {}
+    deleted = set()
+    inserted = {}
+
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise PatchError(f"operation is not an object: {operation!r}")
+        op = operation.get("op")
+        section_id = operation.get("section")
+        content = operation.get("content")
+        if op not in OPERATIONS:
+            raise PatchError(f"unknown operation {op!r}")
+        if not isinstance(section_id, str) or section_id not in by_id:
+            raise PatchError(f"unknown section {section_id!r}")
+        if op != "delete" and (not isinstance(content, str) or not content.strip()):
+            raise PatchError(f"{op} of {section_id} has no content")
+
+        if op == "insert_after":
+            inserted.setdefault(section_id, []).append(content)
+        elif section_id in replaced or section_id in deleted:
+            raise PatchError(f"section {section_id} is changed more than once")
+        elif op == "replace":
+            replaced[section_id] = content
+        else:
+            deleted.add(section_id)
+
+    parts = []
+    for section in sections:
+        if section.id in replaced:
+            parts.append(_as_block(replaced[section.id]))
+        elif section.id not in deleted:
+            parts.append(_as_block(section.text))
+        parts.extend(_as_block(content) for content in inserted.get(section.id, []))
+    return "".join(parts).rstrip("\n") + "\n"
+
+def _as_block(text):
+    """Normalize a section's text to end with exactly one blank line."""
+    return text.rstrip("\n") + "\n\n"
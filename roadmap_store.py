@@ -0,0 +1,337 @@
+# roadmap_store.py
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from config import STORE_DIR
+from roadmap_patch import HEADING_PATTERN, parse_sections
+
+STORE_VERSION = 1
+# The object table is split over this many files by hash, so a commit or checkout only reads the shards it needs
+OBJECT_SHARDS = 256
+# Longest chain of deltas a section is rebuilt through, so loading stays fast
+MAX_DELTA_DEPTH = 8
+# zlib only looks back this far, so a preset dictionary longer than this is wasted
+ZDICT_SIZE = 32 * 1024
+# Version kinds: "initial" for the first roadmap of an idea, "regenerated" for a later
+# initial roadmap of the same idea, "reflected" for a customized or critiqued one
+STAGES = ("initial", "reflected")
+
+def idea_id(idea):
+    """Stable id of an idea: a hash of its description with case and whitespace normalized."""
+    normalized = re.sub(r'\s+', ' ', idea).strip().lower()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=6).hexdigest()
+
+def object_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=10).hexdigest()
+
+def split_roadmap(markdown):
+    """Split a roadmap into section texts that join back into it exactly."""
+    texts = [section.text for section in parse_sections(markdown)]
+    # parse_sections drops a whitespace-only preamble, which still has to round-trip
+    missing = len(markdown) - sum(len(text) for text in texts)
+    if missing:
+        texts.insert(0, markdown[:missing])
+    return texts
+
+def heading(text):
+    """
+    Return a section's heading as "<level>:<title>", or "0:" for text before the first heading.
+
+    A changed section is stored as a delta against the section with the same
+    heading in the previous version.
+    """
+    match = HEADING_PATTERN.match(text.split("\n", 1)[0])
+    return f"{len(match.group(1))}:{match.group(2)}" if match else "0:"
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _write_json(path, data):
+    _write_atomic(path, json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+def _read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+class RoadmapStore:
+    """
+    Versioned, content-addressed store of every roadmap generated for an idea.
+
+    A version is a list of section hashes. Each distinct section is stored once,
+    whichever versions and ideas use it, so a customized roadmap only adds the
+    sections the customization changed. A new section is zlib-compressed with a
+    preset dictionary: the same section of the previous version when it exists, so
+    an edited section costs little more than its edit, or else the section before
+    it. Delta chains are cut after MAX_DELTA_DEPTH.
+
+    Layout of store_dir:
+        index.json            every idea with its description and version count
+        ideas/<idea id>.json  the idea's versions: kind, run id and section hashes
+        objects/<nn>.json     section hash -> [pack, offset, length, base hash, depth]
+        packs/<pack>.pack     the compressed sections added by one commit
+
+    Listing ideas and versions only reads index.json and one idea file; checkout
+    reads the object shards and packs of one version.
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir or STORE_DIR
+        self.lock = threading.Lock()
+
+    def _idea_path(self, iid):
+        return os.path.join(self.store_dir, "ideas", f"{iid}.json")
+
+    def _shard_path(self, shard):
+        return os.path.join(self.store_dir, "objects", f"{shard:02x}.json")
+
+    def _pack_path(self, pack):
+        return os.path.join(self.store_dir, "packs", f"{pack}.pack")
+
+    def _shard(self, hash_value):
+        return int(hash_value[:2], 16) % OBJECT_SHARDS
+
+    def _entries(self, hashes):
+        """Return the object table entries of hashes, reading each needed shard once."""
+        shards = {}
+        entries = {}
+        for hash_value in hashes:
+            shard = self._shard(hash_value)
+            if shard not in shards:
+                shards[shard] = _read_json(self._shard_path(shard), {})
+            if hash_value in shards[shard]:
+                entries[hash_value] = shards[shard][hash_value]
+        return entries
+
+    def ideas(self):
+        """Return every stored idea as {"id", "idea", "versions", "updated"}, most recently updated first."""
+        index = _read_json(os.path.join(self.store_dir, "index.json"), {})
+        ideas = [dict(entry, id=iid) for iid, entry in index.get("ideas", {}).items()]
+        ideas.sort(key=lambda entry: entry["updated"], reverse=True)
+        return ideas
+
+    def resolve(self, reference):
+        """
+        Return the id of the idea a reference names: an idea id, a unique prefix of
+        one, or the idea's description. Raises KeyError if none or several match.
+        """
+        index = _read_json(os.path.join(self.store_dir, "index.json"), {}).get("ideas", {})
+        if reference in index:
+            return reference
+        if idea_id(reference) in index:
+            return idea_id(reference)
+        matches = [iid for iid in index if iid.startswith(reference.lower())]
+        if len(matches) == 1:
+            return matches[0]
+        if matches:
+            raise KeyError(f"{reference!r} matches {len(matches)} ideas; use more of the id")
+        raise KeyError(f"No stored idea matches {reference!r} in {self.store_dir}")
+
+    def history(self, iid):
+        """Return an idea's record: {"idea", "versions": [...]}, oldest version first."""
+        record = _read_json(self._idea_path(iid), None)
+        if record is None:
+            raise KeyError(f"No stored idea {iid!r} in {self.store_dir}")
+        return record
+
+    def version(self, iid, spec="latest"):
+        """
+        Return the record of one version of an idea.
+
+        spec is a version number, "latest", or a kind ("initial", "regenerated",
+        "reflected") for the latest version of that kind. Raises KeyError if there
+        is no such version.
+        """
+        versions = self.history(iid)["versions"]
+        spec = str(spec).lower()
+        if spec == "latest" and versions:
+            return versions[-1]
+        for version in reversed(versions):
+            if str(version["version"]) == spec or version["kind"] == spec:
+                return version
+        raise KeyError(f"Idea {iid} has no version {spec!r}")
+
+    def commit(self, idea, markdown, stage, run_id=None, parent=None, profile=None):
+        """
+        Store a roadmap as the next version of an idea and return its version number.
+
+        A roadmap identical to the idea's latest version, or one already committed
+        for the same run and stage (e.g. by an earlier attempt of a resumed run),
+        is not stored again; that version's number is returned instead.
+
+        Args:
+            idea: The idea description
+            markdown: The roadmap
+            stage: "initial" for a freshly generated roadmap (stored as "regenerated"
+                if the idea already has versions) or "reflected" for a customized one
+            run_id: The run that produced the roadmap, if any
+            parent: Version number the roadmap was derived from; changed sections are
+                stored as deltas against it (defaults to the latest version)
+            profile: Name of the model profile that produced the roadmap, if known
+        """
+        if stage not in STAGES:
+            raise ValueError(f"stage must be one of {', '.join(STAGES)}")
+        iid = idea_id(idea)
+        sections = split_roadmap(markdown)
+        hashes = [object_hash(text) for text in sections]
+
+        with self.lock:
+            record = _read_json(self._idea_path(iid), None) or {"idea": idea, "versions": []}
+            versions = record["versions"]
+            for version in versions:
+                if run_id and version["run_id"] == run_id and (version["kind"] == "reflected") == (stage == "reflected"):
+                    return version["version"]
+            if versions and versions[-1]["sections"] == hashes:
+                return versions[-1]["version"]
+
+            base_version = next((version for version in versions if version["version"] == parent), None)
+            if base_version is None and versions:
+                base_version = versions[-1]
+            pack, stored = self._add_objects(sections, hashes, base_version)
+
+            version = {
+                "version": len(versions) + 1,
+                "kind": stage if stage == "reflected" or not versions else "regenerated",
+                "created": time.time(),
+                "run_id": run_id,
+                "profile": profile,
+                "parent": base_version["version"] if base_version else None,
+                "bytes": len(markdown.encode("utf-8")),
+                "stored": stored,
+                "pack": pack,
+                "sections": hashes
+            }
+            versions.append(version)
+            os.makedirs(os.path.dirname(self._idea_path(iid)), exist_ok=True)
+            _write_json(self._idea_path(iid), record)
+
+            # Reload first so ideas committed by other processes since our last read are kept
+            index_path = os.path.join(self.store_dir, "index.json")
+            index = _read_json(index_path, {"version": STORE_VERSION, "ideas": {}})
+            index["ideas"][iid] = {"idea": record["idea"], "versions": len(versions), "updated": version["created"]}
+            _write_json(index_path, index)
+        return version["version"]
+
+    def _add_objects(self, sections, hashes, base_version):
+        """
+        Compress and pack the sections not stored yet; returns (pack name or None, packed bytes).
+        """
+        # Entries of the base version's sections too, since changed sections are encoded against them
+        known = self._entries(hashes + (base_version["sections"] if base_version else []))
+        texts = dict(zip(hashes, sections))
+        memo = {}
+        base_by_heading = {}
+        if base_version and any(hash_value not in known for hash_value in hashes):
+            for hash_value in base_version["sections"]:
+                base_by_heading.setdefault(heading(self._text(hash_value, known, memo)), hash_value)
+        new = {}
+        data = bytearray()
+        pack = uuid.uuid4().hex[:12]
+        previous = None
+        for text, hash_value in zip(sections, hashes):
+            if hash_value not in known and hash_value not in new:
+                base = base_by_heading.get(heading(text), previous)
+                depth = known[base][4] if base in known else new[base][4] if base in new else None
+                encoded, base, depth = self._encode(text, base, depth, texts, known, memo)
+                new[hash_value] = [pack, len(data), len(encoded), base, depth]
+                data.extend(encoded)
+            previous = hash_value
+        if not new:
+            return None, 0
+
+        os.makedirs(os.path.join(self.store_dir, "packs"), exist_ok=True)
+        os.makedirs(os.path.join(self.store_dir, "objects"), exist_ok=True)
+        # The pack is written before the table points into it, so a crash never leaves dangling entries
+        _write_atomic(self._pack_path(pack), bytes(data))
+        by_shard = {}
+        for hash_value, entry in new.items():
+            by_shard.setdefault(self._shard(hash_value), {})[hash_value] = entry
+        for shard, entries in by_shard.items():
+            table = _read_json(self._shard_path(shard), {})
+            table.update(entries)
+            _write_json(self._shard_path(shard), table)
+        return pack, len(data)
+
+    def _encode(self, text, base, depth, texts, known, memo):
+        """Return (compressed bytes, base hash or None, delta depth) for a new section."""
+        raw = text.encode("utf-8")
+        plain = zlib.compress(raw, 9)
+        if base is None or depth is None or depth >= MAX_DELTA_DEPTH:
+            return plain, None, 0
+        base_text = texts[base] if base in texts else self._text(base, known, memo)
+        compressor = zlib.compressobj(9, zdict=base_text.encode("utf-8")[-ZDICT_SIZE:])
+        delta = compressor.compress(raw) + compressor.flush()
+        if len(delta) >= len(plain):
+            return plain, None, 0
+        return delta, base, depth + 1
+
+    def _text(self, hash_value, entries, memo):
+        """Decompress one section, following its delta chain; memo holds decoded sections and read packs."""
+        if hash_value in memo:
+            return memo[hash_value]
+        if hash_value not in entries:
+            entries.update(self._entries([hash_value]))
+        pack, offset, length, base, _ = entries[hash_value]
+        pack_key = f"pack:{pack}"
+        if pack_key not in memo:
+            with open(self._pack_path(pack), "rb") as f:
+                memo[pack_key] = f.read()
+        data = memo[pack_key][offset:offset + length]
+        if base is None:
+            raw = zlib.decompress(data)
+        else:
+            decompressor = zlib.decompressobj(zdict=self._text(base, entries, memo).encode("utf-8")[-ZDICT_SIZE:])
+            raw = decompressor.decompress(data) + decompressor.flush()
+        memo[hash_value] = raw.decode("utf-8")
+        return memo[hash_value]
+
+    def checkout(self, iid, spec="latest"):
+        """Return the markdown of one version of an idea (see version() for spec)."""
+        return self._join(self.version(iid, spec)["sections"])
+
+    def _join(self, hashes, memo=None):
+        memo = {} if memo is None else memo
+        entries = self._entries(hashes)
+        return "".join(self._text(hash_value, entries, memo) for hash_value in hashes)
+
+    def diff(self, iid, old_spec, new_spec):
+        """
+        Compare two versions of an idea section by section.
+
+        Sections are compared by hash first, so unchanged ones are never
+        decompressed. Returns a list of (heading, old_text, new_text) for the
+        sections that were changed, added (old_text "") or removed (new_text "").
+        """
+        old, new = self.version(iid, old_spec), self.version(iid, new_spec)
+        matcher = difflib.SequenceMatcher(None, old["sections"], new["sections"], autojunk=False)
+        pairs = []
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            old_range, new_range = range(old_start, old_end), range(new_start, new_end)
+            for offset in range(max(len(old_range), len(new_range))):
+                old_index = old_range[offset] if offset < len(old_range) else None
+                new_index = new_range[offset] if offset < len(new_range) else None
+                pairs.append((old_index, new_index))
+
+        needed = [old["sections"][i] for i, _ in pairs if i is not None] + [new["sections"][j] for _, j in pairs if j is not None]
+        entries = self._entries(needed)
+        memo = {}
+        changes = []
+        for old_index, new_index in pairs:
+            old_text = self._text(old["sections"][old_index], entries, memo) if old_index is not None else ""
+            new_text = self._text(new["sections"][new_index], entries, memo) if new_index is not None else ""
+            title = heading(new_text or old_text).split(":", 1)[1]
+            changes.append((title or "(text before the first heading)", old_text, new_text))
+        return changes
@@ -0,0 +1,197 @@
+# run_store.py
+import contextlib
+import json
+import os
+import shutil
+import time
+import uuid
+from config import RUNS_DIR
+
+# Stage outputs in pipeline order, with the file each one is checkpointed to
+STAGE_FILES = {
+    "initial_roadmap": "initial_roadmap.md",
+    "refinement": "refinement.json",
+    "questions": "questions.json",
+    "answers": "answers.json",
+    "final_roadmap": "final_roadmap.md"
+}
+
+def _write_atomic(path, text):
+    """Write text to path through a temporary file so a crash never leaves a torn checkpoint."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+class Run:
+    """
+    Checkpoint directory for one roadmap generation run.
+
+    Each stage's output is written to its own file as soon as the stage completes,
+    and metadata.json records the idea, the options needed to continue, and which
+    stage finished last. Answers are saved one at a time, so a run interrupted
+    while the user is answering resumes at the next unanswered question, and
+    refinement passes are checkpointed one at a time as well.
+    """
+
+    def __init__(self, path, metadata):
+        self.path = path
+        self.metadata = metadata
+
+    @property
+    def run_id(self):
+        return self.metadata["run_id"]
+
+    @property
+    def idea(self):
+        return self.metadata["idea"]
+
+    @property
+    def completed(self):
+        return self.metadata["status"] == "completed"
+
+    def _stage_path(self, stage):
+        return os.path.join(self.path, STAGE_FILES[stage])
+
+    def _save_metadata(self):
+        self.metadata["updated"] = time.time()
+        _write_atomic(os.path.join(self.path, "metadata.json"), json.dumps(self.metadata, indent=2))
+
+    def load(self, stage):
+        """Return a stage's saved output, or None if the stage hasn't completed."""
+        try:
+            with open(self._stage_path(stage), "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        return text if stage.endswith("roadmap") else json.loads(text)
+
+    def save(self, stage, value):
+        """Checkpoint a stage's output and record it as the last finished stage."""
+        text = value if stage.endswith("roadmap") else json.dumps(value, indent=2)
+        _write_atomic(self._stage_path(stage), text)
+        if stage != "answers":
+            self.metadata["stage"] = stage
+        if stage == "final_roadmap":
+            self.metadata["status"] = "completed"
+        self._save_metadata()
+
+    def save_answer(self, question_key, answer):
+        """Add a single answer to the answers checkpoint."""
+        answers = self.load("answers") or {}
+        answers[question_key] = answer
+        self.save("answers", answers)
+
+    def finish_answers(self, answers):
+        """Record that every question has been asked, including skipped ones."""
+        self.save("answers", answers)
+        self.metadata["stage"] = "answers"
+        self._save_metadata()
+
+    def mark_failed(self, error):
+        """Record why the run stopped; its checkpoints are kept for resume."""
+        self.metadata["status"] = "interrupted" if error is None else "failed"
+        self.metadata["error"] = error
+        self._save_metadata()
+
+    @contextlib.contextmanager
+    def recording_failures(self):
+        """
+        Mark the run failed or interrupted if the wrapped block raises.
+
+        A completed run stays completed when the block only replays its saved
+        final roadmap.
+        """
+        previous_status = self.metadata["status"]
+        self.metadata["status"] = "running"
+        self.metadata["error"] = None
+        self._save_metadata()
+        try:
+            yield self
+        except Exception as e:
+            self.mark_failed(str(e) or type(e).__name__)
+            raise
+        except BaseException:
+            # Ctrl-C or task cancellation
+            self.mark_failed(None)
+            raise
+        if self.metadata["status"] == "running" and previous_status == "completed":
+            self.metadata["status"] = "completed"
+            self._save_metadata()
+
+class RunStore:
+    """Directory of checkpointed runs, one subdirectory per run id."""
+
+    def __init__(self, runs_dir=None):
+        self.runs_dir = runs_dir or RUNS_DIR
+
+    def create(self, idea, mode, options=None):
+        """
+        Start a new run.
+
+        Args:
+            idea: The app idea description
+            mode: "interactive" for the questions pipeline, "direct" for generate_roadmap,
+                "answered" for generate_customized_roadmap
+            options: JSON-serializable settings to reuse on resume, e.g. the output file
+        """
+        run_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        path = os.path.join(self.runs_dir, run_id)
+        os.makedirs(path, exist_ok=True)
+        now = time.time()
+        run = Run(path, {
+            "run_id": run_id,
+            "idea": idea,
+            "mode": mode,
+            "options": options or {},
+            "created": now,
+            "updated": now,
+            "stage": None,
+            "status": "running",
+            "error": None
+        })
+        run._save_metadata()
+        return run
+
+    def get(self, run_id):
+        """Load a run by id; raises KeyError if it doesn't exist."""
+        path = os.path.join(self.runs_dir, run_id)
+        try:
+            with open(os.path.join(path, "metadata.json"), "r", encoding="utf-8") as f:
+                return Run(path, json.load(f))
+        except (OSError, ValueError):
+            raise KeyError(f"No run with id {run_id!r} in {self.runs_dir}")
+
+    def list(self):
+        """Return all runs, most recently updated first."""
+        try:
+            names = os.listdir(self.runs_dir)
+        except OSError:
+            return []
+
+        runs = []
+        for name in names:
+            try:
+                runs.append(self.get(name))
+            except KeyError:
+                continue
+        runs.sort(key=lambda run: run.metadata["updated"], reverse=True)
+        return runs
+
+    def prune(self, older_than_days, include_unfinished=False):
+        """
+        Delete runs not updated for older_than_days days and return their ids.
+
+        Unfinished runs are kept unless include_unfinished is set, since they can
+        still be resumed.
+        """
+        cutoff = time.time() - older_than_days * 24 * 60 * 60
+        removed = []
+        for run in self.list():
+            if run.metadata["updated"] > cutoff:
+                continue
+            if not run.completed and not include_unfinished:
+                continue
+            shutil.rmtree(run.path, ignore_errors=True)
+            removed.append(run.run_id)
+        return removed
@@ -0,0 +1,632 @@
+# server.py
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import connection_pool
+from config import GENERATION_MODE, GENERATION_MODES, JOBS_DIR, JOBS_MAX_AGE_DAYS, PROFILE, PROFILES, REFINE_MAX_PASSES, REFINE_MIN_CHANGE, REFLECTION_MODE, REFLECTION_MODES, SERVE_ANSWER_TIMEOUT, SERVE_MAX_QUEUE, SERVE_WORKERS
+from roadmap_generator import generate_roadmap, generate_roadmap_with_questions, generate_customized_roadmap
+from run_store import RunStore
+
+# Jobs in these states never run again; the others are requeued when the server restarts
+FINISHED_STATES = {"completed", "failed", "cancelled"}
+# An SSE comment is sent this often while a job is quiet, so proxies don't close the stream
+KEEPALIVE_INTERVAL = 15
+# Streamed text is sent as one token event per this many seconds rather than one per delta
+TOKEN_FLUSH_INTERVAL = 0.1
+# How often finished jobs older than the retention period are looked for, in seconds
+PRUNE_INTERVAL = 3600
+# Stands in for a finished job's token events: /result serves the text, and event ids stay put
+DROPPED_TOKEN = ("token", None)
+JOB_PATH = re.compile(r'^/jobs/([A-Za-z0-9-]+)(/events|/answers|/result)?$')
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while max_queue jobs are already waiting."""
+
+class JobFinished(Exception):
+    """Raised when answers are posted to a job that has already finished."""
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+class Job:
+    """
+    A roadmap generation submitted to the server.
+
+    record is what is persisted to <jobs_dir>/<id>.json: the idea, the options, the
+    status and the answers posted so far. events is the in-memory log of everything
+    the job emitted, replayed to every event stream from the position it asks for.
+    Streamed text is coalesced into a token event per TOKEN_FLUSH_INTERVAL, and once
+    the job is done its token events are dropped from the log.
+    The job id is the id of its checkpointed run, which the pipeline resumes from
+    after a restart.
+    """
+
+    def __init__(self, record):
+        self.record = record
+        self.events = []
+        # Text deltas waiting to go out as one token event, and when the last one went out
+        self.pending_text = []
+        self.last_flush = 0.0
+        self.condition = threading.Condition()
+        # question key -> future resolved by the next answer posted for it
+        self.pending_answers = {}
+        self.task = None
+        # Set by the "done" event, the last one a job emits
+        self.closed = False
+
+    @property
+    def id(self):
+        return self.record["id"]
+
+    @property
+    def status(self):
+        return self.record["status"]
+
+    @property
+    def finished(self):
+        return self.record["status"] in FINISHED_STATES
+
+    def emit(self, event, data):
+        """Append an event to the log and wake up the streams waiting for it."""
+        with self.condition:
+            self._flush_text()
+            self.events.append((event, data))
+            self.closed = event == "done"
+            if self.closed:
+                self.events = [DROPPED_TOKEN if name == "token" else (name, value) for name, value in self.events]
+            self.condition.notify_all()
+
+    def emit_text(self, delta):
+        """Add a streamed text delta; deltas arriving within TOKEN_FLUSH_INTERVAL share a token event."""
+        with self.condition:
+            self.pending_text.append(delta)
+            if time.monotonic() - self.last_flush >= TOKEN_FLUSH_INTERVAL:
+                self._flush_text()
+                self.condition.notify_all()
+
+    def _flush_text(self):
+        # Called with the condition held
+        if self.pending_text:
+            self.events.append(("token", {"text": "".join(self.pending_text)}))
+            self.pending_text = []
+        self.last_flush = time.monotonic()
+
+    def events_after(self, position, timeout):
+        """
+        Return the events from position on, waiting up to timeout seconds for one.
+
+        Returns an empty list on timeout, or None once the job has finished and every
+        event was returned.
+        """
+        with self.condition:
+            if position >= len(self.events):
+                if self.closed:
+                    return None
+                if self.pending_text:
+                    # Held-back text goes out when its interval is up, even if the stream has stalled
+                    self.condition.wait(max(0.0, self.last_flush + TOKEN_FLUSH_INTERVAL - time.monotonic()))
+                    if position >= len(self.events):
+                        self._flush_text()
+                else:
+                    self.condition.wait(timeout)
+            return self.events[position:]
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "idea": self.record["idea"],
+            "created": self.record["created"],
+            "updated": self.record["updated"]
+        }
+
+class JobQueue:
+    """
+    Persistent queue of roadmap jobs, run by a bounded pool of worker coroutines.
+
+    Submitting a job only writes it to disk and queues it. The workers take jobs off
+    the queue in order, at most one each, so a burst of submissions waits its turn
+    instead of opening that many concurrent API streams. Beyond max_queue waiting jobs,
+    submit() raises QueueFull. Jobs still queued or running when the server stops
+    are queued again on start() and resume from their run's checkpoints. Finished
+    jobs are forgotten, in memory and on disk, max_age_days after they last changed.
+
+    The workers run on the process-wide event loop from connection_pool, so every
+    job shares the same API connection pool and rate limiter.
+
+    Args:
+        jobs_dir: Where job records are stored (defaults to JOBS_DIR)
+        workers: Number of jobs run at once
+        max_queue: Number of waiting jobs accepted before submissions are refused
+        answer_timeout: Seconds a job waits for an answer before skipping the question
+        cache: Optional ResponseCache shared by every job
+        run_store: RunStore the jobs checkpoint to (defaults to RUNS_DIR)
+        store: Optional RoadmapStore each job's roadmaps are recorded in as versions
+        max_age_days: Days finished jobs are kept (defaults to JOBS_MAX_AGE_DAYS); 0 keeps them
+    """
+
+    def __init__(self, jobs_dir=None, workers=SERVE_WORKERS, max_queue=SERVE_MAX_QUEUE,
+                 answer_timeout=SERVE_ANSWER_TIMEOUT, cache=None, run_store=None, store=None, max_age_days=None):
+        self.jobs_dir = jobs_dir or JOBS_DIR
+        self.workers = workers
+        self.max_queue = max_queue
+        self.answer_timeout = answer_timeout
+        self.cache = cache
+        self.run_store = run_store or RunStore()
+        self.store = store
+        self.max_age_days = JOBS_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.queue = None
+
+    def start(self):
+        """Load the persisted jobs, requeue the unfinished ones and start the workers."""
+        self.loop = connection_pool.get_loop()
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        records = []
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), "r", encoding="utf-8") as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        records.sort(key=lambda record: record["created"])
+
+        requeued = []
+        for record in records:
+            job = Job(record)
+            self.jobs[job.id] = job
+            if not job.finished:
+                self._set_status(job, "queued")
+                requeued.append(job.id)
+            else:
+                job.emit("status", {"status": job.status})
+                job.emit("done", {"status": job.status, "error": record["error"]})
+        self.prune()
+
+        async def start_workers():
+            self.queue = asyncio.Queue()
+            for job_id in requeued:
+                self.queue.put_nowait(job_id)
+            for _ in range(self.workers):
+                asyncio.create_task(self._worker())
+            if self.max_age_days:
+                asyncio.create_task(self._prune_periodically())
+
+        asyncio.run_coroutine_threadsafe(start_workers(), self.loop).result()
+        return len(requeued)
+
+    def prune(self, older_than_days=None):
+        """
+        Forget finished jobs not updated for older_than_days (defaults to max_age_days),
+        in memory and on disk; returns how many were removed.
+
+        Their runs stay in the run store until prune-runs removes them.
+        """
+        older_than_days = self.max_age_days if older_than_days is None else older_than_days
+        if not older_than_days:
+            return 0
+        cutoff = time.time() - older_than_days * 86400
+        with self.lock:
+            expired = [job for job in self.jobs.values() if job.finished and job.record["updated"] < cutoff]
+            for job in expired:
+                del self.jobs[job.id]
+                try:
+                    os.remove(os.path.join(self.jobs_dir, f"{job.id}.json"))
+                except OSError:
+                    pass
+        return len(expired)
+
+    async def _prune_periodically(self):
+        while True:
+            await asyncio.sleep(PRUNE_INTERVAL)
+            # The job files are removed off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.prune)
+
+    def _save(self, job):
+        job.record["updated"] = time.time()
+        _write_atomic(os.path.join(self.jobs_dir, f"{job.id}.json"), json.dumps(job.record, indent=2))
+
+    def _set_status(self, job, status, error=None):
+        with self.lock:
+            job.record["status"] = status
+            job.record["error"] = error
+            self._save(job)
+        job.emit("status", {"status": status})
+
+    def count(self, status):
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if job.status == status)
+
+    def submit(self, request):
+        """
+        Validate a job request, persist it and queue it.
+
+        Args:
+            request: Dict with "idea" and the optional "interactive" (default true),
+                "answers" (question_key: answer, used instead of asking), "single_pass"
+                (fold the answers into one generation request instead), "profile",
+                "generation", "reflection", "pipelined" and, for non-interactive jobs,
+                "passes" and "min_change" (self-critique refinement) fields
+
+        Returns the Job. Raises ValueError for an invalid request and QueueFull when
+        max_queue jobs are already waiting.
+        """
+        idea = request.get("idea")
+        if not isinstance(idea, str) or not idea.strip():
+            raise ValueError("idea must be a non-empty string")
+        answers = request.get("answers") or {}
+        if not isinstance(answers, dict) or not all(isinstance(value, str) for value in answers.values()):
+            raise ValueError("answers must be an object of question_key: answer strings")
+        options = {
+            "interactive": bool(request.get("interactive", True)),
+            "pipelined": bool(request.get("pipelined", False)),
+            "single_pass": bool(request.get("single_pass", False)),
+            "profile": str(request.get("profile") or PROFILE).lower(),
+            "generation_mode": str(request.get("generation") or GENERATION_MODE).lower(),
+            "reflection_mode": str(request.get("reflection") or REFLECTION_MODE).lower(),
+            "max_passes": request.get("passes", REFINE_MAX_PASSES),
+            "min_change": request.get("min_change", REFINE_MIN_CHANGE)
+        }
+        if options["profile"] not in PROFILES:
+            raise ValueError(f"unknown profile {options['profile']!r}; choose from {', '.join(PROFILES)}")
+        if options["generation_mode"] not in GENERATION_MODES:
+            raise ValueError(f"generation must be one of {', '.join(GENERATION_MODES)}")
+        if options["reflection_mode"] not in REFLECTION_MODES:
+            raise ValueError(f"reflection must be one of {', '.join(REFLECTION_MODES)}")
+        if isinstance(options["max_passes"], bool) or not isinstance(options["max_passes"], int) or options["max_passes"] < 0:
+            raise ValueError("passes must be a non-negative integer")
+        if isinstance(options["min_change"], bool) or not isinstance(options["min_change"], (int, float)) or not 0 <= options["min_change"] <= 1:
+            raise ValueError("min_change must be a number from 0 to 1")
+        if options["single_pass"] and not answers:
+            raise ValueError("single_pass needs answers")
+        if self.count("queued") >= self.max_queue:
+            raise QueueFull(f"{self.max_queue} jobs are already waiting")
+
+        mode = "answered" if options["single_pass"] else "interactive" if options["interactive"] else "direct"
+        run = self.run_store.create(idea.strip(), mode, {
+            "pipelined": options["pipelined"],
+            "reflection_mode": options["reflection_mode"],
+            "generation_mode": options["generation_mode"],
+            "reuse_similar": "off",
+            "profile": options["profile"],
+            "answers": answers if options["single_pass"] else None,
+            "max_passes": options["max_passes"],
+            "min_change": options["min_change"]
+        })
+        now = time.time()
+        job = Job({
+            "id": run.run_id,
+            "idea": run.idea,
+            "options": options,
+            "answers": answers,
+            "questions": [],
+            "status": "queued",
+            "error": None,
+            "created": now,
+            "updated": now
+        })
+        with self.lock:
+            self.jobs[job.id] = job
+            self._save(job)
+        job.emit("status", {"status": "queued"})
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, job.id)
+        return job
+
+    def get(self, job_id):
+        """Return a job by id; raises KeyError if there is none."""
+        with self.lock:
+            return self.jobs[job_id]
+
+    def list(self):
+        """Return every job, most recently created first."""
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda job: job.record["created"], reverse=True)
+
+    def post_answers(self, job_id, answers):
+        """
+        Record answers for a job's questions, keyed by question key.
+
+        Answers to questions the job is waiting on unblock it; answers to questions
+        not asked yet are used when they come up. Raises KeyError for an unknown job,
+        ValueError for invalid answers and JobFinished if the job has finished.
+        """
+        if not isinstance(answers, dict) or not all(isinstance(value, str) for value in answers.values()):
+            raise ValueError("answers must be an object of question_key: answer strings")
+        job = self.get(job_id)
+        with self.lock:
+            if job.finished:
+                raise JobFinished(f"job {job_id} is already {job.status}")
+            job.record["answers"].update(answers)
+            self._save(job)
+
+        def deliver():
+            for key, answer in answers.items():
+                future = job.pending_answers.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_result(answer)
+
+        self.loop.call_soon_threadsafe(deliver)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job; raises KeyError for an unknown job.
+
+        A queued job is cancelled right away; a running one once its task has
+        unwound, which the job's "done" event reports.
+        """
+        job = self.get(job_id)
+
+        async def cancel_on_loop():
+            # On the loop, so a worker can't start the job between the check and the cancellation
+            if job.task is not None:
+                job.task.cancel()
+            elif not job.finished:
+                self._finish(job, "cancelled")
+
+        asyncio.run_coroutine_threadsafe(cancel_on_loop(), self.loop).result()
+        return job
+
+    def _finish(self, job, status, error=None):
+        self._set_status(job, status, error)
+        job.emit("done", {"status": status, "error": error})
+
+    async def _worker(self):
+        while True:
+            job_id = await self.queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != "queued":
+                continue
+            job.task = asyncio.create_task(self._run(job))
+            # asyncio.wait rather than await, so cancelling the job doesn't cancel the worker
+            await asyncio.wait([job.task])
+            job.task = None
+
+    async def _run(self, job):
+        run = self.run_store.get(job.id)
+        options = job.record["options"]
+        self._set_status(job, "running")
+
+        def status_callback(message):
+            job.emit("message", {"message": message})
+
+        def on_text(delta):
+            job.emit_text(delta)
+
+        try:
+            if options.get("single_pass"):
+                roadmap = await generate_customized_roadmap(
+                    job.record["idea"], job.record["answers"], status_callback, cache=self.cache, on_text=on_text, run=run,
+                    generation_mode=options["generation_mode"], profile=options["profile"], store=self.store
+                )
+            elif options["interactive"]:
+                roadmap = await generate_roadmap_with_questions(
+                    job.record["idea"], animation_type=None, status_callback=status_callback, cache=self.cache,
+                    pipelined=options["pipelined"], on_text=on_text, run=run,
+                    reflection_mode=options["reflection_mode"], generation_mode=options["generation_mode"],
+                    profile=options["profile"], ask=self._asker(job), store=self.store
+                )
+            else:
+                roadmap = await generate_roadmap(
+                    job.record["idea"], status_callback, cache=self.cache, on_text=on_text, run=run,
+                    generation_mode=options["generation_mode"], profile=options["profile"], store=self.store,
+                    max_passes=options.get("max_passes"), min_change=options.get("min_change")
+                )
+        except asyncio.CancelledError:
+            self._finish(job, "cancelled")
+            raise
+        except Exception as e:
+            self._finish(job, "failed", str(e) or type(e).__name__)
+            return
+        job.emit("result", {"characters": len(roadmap)})
+        self._finish(job, "completed")
+
+    def _asker(self, job):
+        """Return the ask callable that sends a job's questions to its clients and waits for answers."""
+        async def ask(number, question_key, question_text):
+            with self.lock:
+                # A resumed job asks its unanswered questions again
+                if all(question["key"] != question_key for question in job.record["questions"]):
+                    job.record["questions"].append({"number": number, "key": question_key, "question": question_text})
+                    self._save(job)
+            job.emit("question", {"number": number, "key": question_key, "question": question_text})
+            if question_key in job.record["answers"]:
+                return job.record["answers"][question_key]
+
+            future = asyncio.get_running_loop().create_future()
+            job.pending_answers[question_key] = future
+            self._set_status(job, "waiting_for_answer")
+            try:
+                return await asyncio.wait_for(future, self.answer_timeout)
+            except asyncio.TimeoutError:
+                # Treated like an answer skipped in the terminal
+                return ""
+            finally:
+                job.pending_answers.pop(question_key, None)
+                self._set_status(job, "running")
+
+        return ask
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API over a JobQueue (set as the server's job_queue attribute).
+
+    POST /jobs                 submit a job; 202 with the job, 503 when the queue is full
+    GET  /jobs                 list jobs
+    GET  /jobs/<id>            job status, questions asked and answers
+    GET  /jobs/<id>/events     Server-Sent Events: status, message, question, token, result, done
+    POST /jobs/<id>/answers    {"answers": {question_key: answer}}
+    GET  /jobs/<id>/result     the finished roadmap as markdown
+    DELETE /jobs/<id>          cancel the job
+    """
+    server_version = "RoadmapGenerator"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def jobs(self):
+        return self.server.job_queue
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {"error": message}, headers)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise ValueError(f"invalid JSON body ({e})")
+        if not isinstance(data, dict):
+            raise ValueError("the body must be a JSON object")
+        return data
+
+    def _route(self):
+        """Return (job id or None, sub-resource or None), or None for an unknown path."""
+        path = urlparse(self.path).path.rstrip("/")
+        if path == "/jobs":
+            return None, None
+        match = JOB_PATH.match(path)
+        if match is None:
+            return None
+        return match.group(1), match.group(2)
+
+    def _job(self, job_id):
+        try:
+            return self.jobs.get(job_id)
+        except KeyError:
+            self._send_error(404, f"no job with id {job_id}")
+            return None
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self._send_json(200, {
+                "workers": self.jobs.workers,
+                "queued": self.jobs.count("queued"),
+                "running": self.jobs.count("running") + self.jobs.count("waiting_for_answer")
+            })
+            return
+        route = self._route()
+        if route is None:
+            self._send_error(404, "not found")
+            return
+        job_id, resource = route
+        if job_id is None:
+            self._send_json(200, {"jobs": [job.summary() for job in self.jobs.list()]})
+            return
+        job = self._job(job_id)
+        if job is None:
+            return
+        if resource is None:
+            self._send_json(200, job.record)
+        elif resource == "/events":
+            self._stream_events(job)
+        elif resource == "/result":
+            self._send_result(job)
+        else:
+            self._send_error(405, "use POST to send answers")
+
+    def do_POST(self):
+        route = self._route()
+        if route is None:
+            self._send_error(404, "not found")
+            return
+        job_id, resource = route
+        try:
+            body = self._read_json()
+            if job_id is None:
+                job = self.jobs.submit(body)
+                self._send_json(202, job.record, {"Location": f"/jobs/{job.id}"})
+            elif resource == "/answers":
+                if self._job(job_id) is not None:
+                    self._send_json(200, self.jobs.post_answers(job_id, body.get("answers")).record)
+            else:
+                self._send_error(405, "not allowed")
+        except QueueFull as e:
+            self._send_error(503, str(e), {"Retry-After": "30"})
+        except JobFinished as e:
+            self._send_error(409, str(e))
+        except ValueError as e:
+            self._send_error(400, str(e))
+
+    def do_DELETE(self):
+        route = self._route()
+        if route is None or route[0] is None or route[1] is not None:
+            self._send_error(404, "not found")
+            return
+        job = self._job(route[0])
+        if job is not None:
+            self._send_json(200, self.jobs.cancel(job.id).record)
+
+    def _send_result(self, job):
+        if job.status != "completed":
+            self._send_error(409, f"job {job.id} is {job.status}")
+            return
+        roadmap = self.jobs.run_store.get(job.id).load("final_roadmap") or ""
+        body = roadmap.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/markdown; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, job):
+        """
+        Stream a job's events as Server-Sent Events until it finishes.
+
+        Every event's id is its position in the job's log, so a client reconnecting
+        with Last-Event-ID continues where it left off.
+        """
+        try:
+            position = int(self.headers.get("Last-Event-ID")) + 1
+        except (TypeError, ValueError):
+            position = 0
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        # HTTP/1.0 without a Content-Length: the stream ends when the connection closes
+        self.close_connection = True
+        try:
+            while True:
+                events = job.events_after(position, KEEPALIVE_INTERVAL)
+                if events is None:
+                    return
+                if not events:
+                    self.wfile.write(b": keep-alive\n\n")
+                for event, data in events:
+                    if data is not None:
+                        self.wfile.write(f"id: {position}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                    position += 1
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def create_server(host, port, job_queue):
+    """Return an HTTP server for job_queue's API; call job_queue.start() before serving."""
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.job_queue = job_queue
+    return server
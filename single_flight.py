@@ -0,0 +1,176 @@
+# single_flight.py
+import asyncio
+import json
+import threading
+
+# Published between the events of two attempts when the upstream request is retried
+NEW_ATTEMPT = object()
+
+def flight_key(client, request):
+    """
+    Key identical requests share a flight under: the fully built request and the
+    anthropic client (so the endpoint and API key) it is sent with.
+    """
+    return f"{id(client)}:{json.dumps(request, sort_keys=True, default=str)}"
+
+class Flight:
+    """
+    One upstream streaming request shared by every identical concurrent call (thread version).
+
+    The producer publishes each stream event as a (chunk, text delta) pair, or
+    NEW_ATTEMPT before a retry. Every waiter follows the flight from its first
+    event, so a caller that joins late still gets the whole response, and then
+    receives the rest as it arrives. When the last waiter leaves before the stream
+    is done, the flight is abandoned: its response is closed and the producer stops.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.items = []
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self.abandoned = False
+        # The producer's current response, closed if the flight is abandoned
+        self.response = None
+        self.condition = threading.Condition()
+
+    def publish(self, item):
+        with self.condition:
+            self.items.append(item)
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    def abandon(self):
+        self.abandoned = True
+        response = self.response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+    def follow(self):
+        """Yield every published item from the first one on; raises the producer's error at the end."""
+        position = 0
+        while True:
+            with self.condition:
+                while position >= len(self.items) and not self.done:
+                    self.condition.wait()
+                items = self.items[position:]
+                done = self.done
+            yield from items
+            position += len(items)
+            # finish() comes after the last publish(), so a done snapshot holds every item
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+class AsyncFlight(Flight):
+    """
+    Flight whose waiters are asyncio tasks on the producer's event loop.
+
+    Abandoning it cancels the producer task, which closes the response.
+    """
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.task = None
+        self.changed = asyncio.Event()
+
+    def _wake(self):
+        # Every wait() in progress was on the old event, so swapping it in wakes them all
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, item):
+        self.items.append(item)
+        self._wake()
+
+    def finish(self, error=None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def abandon(self):
+        self.abandoned = True
+        if self.task is not None:
+            self.task.cancel()
+
+    async def follow(self):
+        """Async version of Flight.follow."""
+        position = 0
+        while True:
+            while position < len(self.items):
+                yield self.items[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self.changed.wait()
+
+class SingleFlight:
+    """
+    Registry of the flights in progress, so identical concurrent requests share one.
+
+    join() returns the flight for a key and whether the caller leads it, i.e. has
+    to start its producer. A flight leaves the registry when it is done or
+    abandoned, so later identical requests start a new one (or hit the response
+    cache).
+    """
+
+    def __init__(self, flight_class):
+        self.flight_class = flight_class
+        self.lock = threading.Lock()
+        self.flights = {}
+        # Calls that joined a flight another call had started
+        self.coalesced = 0
+
+    def join(self, key):
+        """Return (flight, leader) for a request key, counting the caller as a waiter."""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = self.flight_class(key)
+            else:
+                self.coalesced += 1
+            flight.waiters += 1
+        return flight, leader
+
+    def leave(self, flight):
+        """
+        Stop waiting on a flight; returns True if the caller was its last waiter.
+
+        The last waiter leaving before the flight is done abandons it, aborting the
+        upstream request.
+        """
+        with self.lock:
+            flight.waiters -= 1
+            last = flight.waiters == 0
+            abandon = last and not flight.done
+            if abandon:
+                self._remove(flight)
+        if abandon:
+            flight.abandon()
+        return last
+
+    def finish(self, flight, error=None):
+        """Called by the producer when the upstream stream ended or failed."""
+        with self.lock:
+            self._remove(flight)
+        flight.finish(error)
+
+    def _remove(self, flight):
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+
+flights = SingleFlight(Flight)
+async_flights = SingleFlight(AsyncFlight)
@@ -0,0 +1,112 @@
+# stream_output.py
+import os
+from rich.markdown import Markdown
+
+class MarkdownStreamRenderer:
+    """
+    Render streamed markdown to the terminal block by block.
+    
+    Text deltas are buffered only until a block is complete (a blank line outside a
+    fenced code block), then that block is rendered and dropped, so the first heading
+    appears within seconds and memory stays bounded by the size of one block.
+    """
+    def __init__(self, console, header=None):
+        """
+        Args:
+            console: rich Console to render to
+            header: Optional rich markup printed once, just before the first block
+        """
+        self.console = console
+        self.header = header
+        self.block_lines = []
+        self.partial_line = ""
+        self.in_code_block = False
+    
+    def feed(self, delta):
+        """Accept a text delta and render any blocks it completes."""
+        lines = (self.partial_line + delta).split("\n")
+        
+        # Only the last (possibly incomplete) line stays pending between deltas
+        self.partial_line = lines.pop()
+        for line in lines:
+            if line.lstrip().startswith("```"):
+                self.in_code_block = not self.in_code_block
+            self.block_lines.append(line)
+            if not line.strip() and not self.in_code_block:
+                self._render(self.block_lines)
+                self.block_lines = []
+    
+    def finish(self):
+        """Render whatever is left in the buffer."""
+        self._render(self.block_lines + [self.partial_line])
+        self.block_lines = []
+        self.partial_line = ""
+    
+    def _render(self, block):
+        text = "\n".join(block)
+        if text.strip():
+            if self.header:
+                self.console.print(self.header)
+                self.header = None
+            self.console.print(Markdown(text))
+            self.console.print()
+
+class IncrementalFileWriter:
+    """
+    Write streamed text straight to disk.
+    
+    Deltas go to "<path>.partial" and are flushed as they arrive, so a run that dies
+    part way still leaves the text received so far on disk. close() moves the
+    finished file into place; abort() keeps the partial file for inspection.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.partial_path = f"{path}.partial"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.partial_path, "w", encoding="utf-8")
+        self.bytes_written = 0
+    
+    def write(self, delta):
+        self.file.write(delta)
+        self.file.flush()
+        self.bytes_written += len(delta)
+    
+    def close(self):
+        """Finish the file and move it to its final path."""
+        if not self.file.closed:
+            self.file.close()
+            os.replace(self.partial_path, self.path)
+    
+    def abort(self):
+        """Stop writing and leave the partial file on disk (if anything was written)."""
+        if not self.file.closed:
+            self.file.close()
+            if not self.bytes_written:
+                os.remove(self.partial_path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def stop_animation_first(animation, on_text):
+    """
+    Wrap on_text so a running LoadingAnimation is cleared before the first delta is shown.
+    
+    Returns None when on_text is None so callers can pass the result straight through.
+    """
+    if on_text is None:
+        return None
+    
+    def wrapper(delta):
+        if animation.is_running:
+            animation.stop()
+        on_text(delta)
+    
+    return wrapper
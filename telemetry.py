@@ -0,0 +1,217 @@
+# telemetry.py
+import contextvars
+import json
+import threading
+import time
+import uuid
+
+# The run and stage the current task is working on; both follow asyncio tasks and threads
+current_run_id = contextvars.ContextVar("current_run_id", default=None)
+current_stage = contextvars.ContextVar("current_stage", default=None)
+
+_hooks = []
+# Called with a StageMetrics on every streamed delta, for live progress displays
+_progress_listeners = []
+
+class StageMetrics:
+    """
+    Timing and token counts for one API call (one pipeline stage).
+    
+    Input-side usage (including prompt cache reads and writes) comes from the
+    message_start event, output tokens from message_delta. The API reports thinking
+    as part of output tokens, so thinking_tokens is estimated from the streamed
+    thinking text at about 4 characters per token.
+    """
+    def __init__(self, stage, model, max_tokens, thinking_budget, profile=None):
+        self.run_id = current_run_id.get()
+        self.stage = stage
+        self.profile = profile
+        self.model = model
+        self.max_tokens = max_tokens
+        self.thinking_budget = thinking_budget
+        self.timestamp = time.time()
+        self.start = time.perf_counter()
+        self.first_delta = None
+        self.first_text = None
+        self.end = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.text_characters = 0
+        self.thinking_characters = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.retries = 0
+        # Local estimates of the prompt: its input tokens as sent, and the tokens
+        # prompt compaction and trimming to the input budget took off
+        self.prompt_tokens_estimate = 0
+        self.prompt_tokens_saved = 0
+        self.prompt_tokens_trimmed = 0
+        # Usage of earlier attempts when a stream was retried or continued
+        self._previous = {"input_tokens": 0, "output_tokens": 0, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        self.cache_hit = False
+        # Set when the call shared its upstream request with identical concurrent calls
+        # and another of them reports the usage, so totals count the request once
+        self.coalesced = False
+        self.error = None
+    
+    def observe(self, chunk):
+        """Update the metrics from one stream event."""
+        chunk_type = getattr(chunk, 'type', None)
+        if chunk_type == "message_start":
+            usage = getattr(chunk.message, 'usage', None)
+            for field in self._previous:
+                setattr(self, field, self._previous[field] + (getattr(usage, field, None) or 0))
+        elif chunk_type == "message_delta":
+            usage = getattr(chunk, 'usage', None)
+            output_tokens = getattr(usage, 'output_tokens', None)
+            if output_tokens:
+                self.output_tokens = self._previous["output_tokens"] + output_tokens
+        elif chunk_type == "content_block_delta":
+            now = time.perf_counter()
+            if self.first_delta is None:
+                self.first_delta = now
+            delta = chunk.delta
+            # Tool input JSON counts as text: it is the response's content
+            text = getattr(delta, 'text', None) or getattr(delta, 'partial_json', None)
+            if text:
+                if self.first_text is None:
+                    self.first_text = now
+                self.text_characters += len(text)
+            elif getattr(delta, 'thinking', None):
+                self.thinking_characters += len(delta.thinking)
+            if _progress_listeners:
+                _notify_progress(self)
+    
+    def new_attempt(self):
+        """Keep the usage counted so far when the request is sent again after a failure."""
+        self.retries += 1
+        self._previous = {field: getattr(self, field) for field in self._previous}
+    
+    def text_received(self, text):
+        """Record text that didn't come from a stream, such as a response cache hit."""
+        now = time.perf_counter()
+        if self.first_delta is None:
+            self.first_delta = now
+        if self.first_text is None:
+            self.first_text = now
+        self.text_characters += len(text)
+        if _progress_listeners:
+            _notify_progress(self)
+    
+    def finish(self):
+        self.end = time.perf_counter()
+        if _progress_listeners:
+            _notify_progress(self)
+    
+    @property
+    def wall_time(self):
+        return (self.end or time.perf_counter()) - self.start
+    
+    @property
+    def ttft(self):
+        """Seconds until the first visible text token."""
+        return None if self.first_text is None else self.first_text - self.start
+    
+    @property
+    def billed_tokens(self):
+        """Input, cache write and output tokens counted against the tokens-per-minute budget."""
+        return self.input_tokens + self.cache_creation_input_tokens + self.output_tokens
+    
+    @property
+    def thinking_tokens(self):
+        return self.thinking_characters // 4
+    
+    @property
+    def streamed_tokens(self):
+        """Output tokens received so far; estimated from the streamed text until the final count arrives."""
+        return max(self.output_tokens, (self.text_characters + self.thinking_characters) // 4)
+    
+    @property
+    def tokens_per_second(self):
+        """Output tokens per second, measured from the first streamed delta."""
+        if self.first_delta is None or not self.output_tokens:
+            return None
+        streaming_time = (self.end or time.perf_counter()) - self.first_delta
+        return self.output_tokens / streaming_time if streaming_time > 0 else None
+    
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "stage": self.stage,
+            "timestamp": self.timestamp,
+            "profile": self.profile,
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "thinking_budget": self.thinking_budget,
+            "wall_time": self.wall_time,
+            "ttft": self.ttft,
+            "tokens_per_second": self.tokens_per_second,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "thinking_tokens": self.thinking_tokens,
+            "cache_creation_input_tokens": self.cache_creation_input_tokens,
+            "cache_read_input_tokens": self.cache_read_input_tokens,
+            "prompt_tokens_estimate": self.prompt_tokens_estimate,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+            "prompt_tokens_trimmed": self.prompt_tokens_trimmed,
+            "retries": self.retries,
+            "cache_hit": self.cache_hit,
+            "coalesced": self.coalesced,
+            "error": self.error
+        }
+
+def add_hook(hook):
+    """Register a callable that receives every finished StageMetrics."""
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+def emit(metrics):
+    """Pass finished metrics to every registered hook; hook failures never break a run."""
+    for hook in list(_hooks):
+        try:
+            hook(metrics)
+        except Exception:
+            pass
+
+def add_progress_listener(listener):
+    """
+    Register a callable that receives the StageMetrics of a running call on every
+    streamed delta, and once more when the call finishes.
+    
+    Listeners run inside the stream loop, so they must be quick.
+    """
+    if listener not in _progress_listeners:
+        _progress_listeners.append(listener)
+
+def remove_progress_listener(listener):
+    if listener in _progress_listeners:
+        _progress_listeners.remove(listener)
+
+def _notify_progress(metrics):
+    for listener in list(_progress_listeners):
+        try:
+            listener(metrics)
+        except Exception:
+            pass
+
+def start_run(run_id=None):
+    """Tag everything the current task does from now on with a run id, and return it."""
+    run_id = run_id or uuid.uuid4().hex[:12]
+    current_run_id.set(run_id)
+    return run_id
+
+class JsonLinesWriter:
+    """Metrics hook that appends each StageMetrics to a file as one JSON line."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+    
+    def __call__(self, metrics):
+        line = json.dumps(metrics.to_dict())
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")